@@ -1,70 +1,318 @@
+"""
+Clean a raw Telegram channel export into a dump for `manage.py import_videos`.
+
+    python clean_data.py [raw_data.json] [cleaned_data.json] [--format json|ndjson]
+                         [--workers N] [--batch-size N] [--max-memory MB]
+
+The input is read incrementally (trailing commas tolerated), records are
+normalized in a process pool, and output is written as it is produced, so
+memory stays flat however large the export is. The duplicate filter keeps
+about 16 bytes per unique record in memory up to --max-memory; past that it
+moves what it has seen to a sorted file in the temp directory and looks
+older records up there.
+"""
+import argparse
+import bisect
+import hashlib
+import heapq
 import json
-import re
+import mmap
+import os
+import shutil
+import sys
+import tempfile
+import textwrap
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
-def clean_json(input_file, output_file):
-    try:
-        with open(input_file, 'r', encoding='utf-8') as f:
-            # Read raw content to handle potential trailing commas or syntax errors manually if needed
-            # But json.load usually fails on trailing commas. 
-            # Let's try standard load first, if it fails, we might need a more robust parser or regex fix.
-            content = f.read()
-            
-        # Fix trailing commas in arrays/objects (simple regex approach)
-        content = re.sub(r',(\s*[\}\]])', r'\1', content)
-        
-        data = json.loads(content)
-        
-        if not isinstance(data, list):
-            print("Error: Root element is not a list.")
-            return
-
-        cleaned_data = []
-        seen_entries = set()
-
-        for item in data:
-            # 1. Ensure non-empty fields
-            if not item.get('word') or not item.get('telegram_file_id'):
-                continue
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
 
-            # 2. Normalize fields
-            word = item['word'].strip()
-            category = item.get('category', 'Uncategorized').strip()
-            # Unify apostrophes (e.g. ’ to ')
-            category = category.replace("’", "'").replace("`", "'")
-            definition = item.get('definition', '').strip()
-            file_id = item['telegram_file_id'].strip()
+# Run from any directory: videos/ lives next to this script.
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from videos.jsonstream import iter_records  # noqa: E402
+
+# Bytes the duplicate filter may hold in memory
+DEFAULT_MAX_MEMORY = 512 << 20
+# Fingerprints sorted at a time when spilling to disk
+SPILL_SORT_SIZE = 1 << 16
+
+
+def normalize(item):
+    """Return the cleaned record for one raw item, or None to drop it."""
+    if not isinstance(item, dict):
+        return None
+    word = item.get('word')
+    file_id = item.get('telegram_file_id')
+    # 1. Ensure non-empty fields
+    if not isinstance(word, str) or not isinstance(file_id, str) or not word.strip() or not file_id.strip():
+        return None
+
+    # 2. Normalize fields
+    word = word.strip()
+    category = item.get('category', 'Uncategorized')
+    category = category.strip() if isinstance(category, str) else 'Uncategorized'
+    # Unify apostrophes (e.g. ’ to ')
+    category = category.replace("’", "'").replace("`", "'")
+    definition = item.get('definition', '')
+    definition = definition.strip() if isinstance(definition, str) else ''
+    file_id = file_id.strip()
+
+    return {
+        "word": word,
+        "category": category,
+        "telegram_file_id": file_id,
+        "definition": definition
+    }
+
+
+def fingerprint(record):
+    """64-bit hash of the duplicate key (title and file_id); never 0."""
+    key = f"{record['word'].lower()}\0{record['telegram_file_id']}".encode('utf-8')
+    value = int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'little')
+    return value or 1
+
+
+def process_batch(items, output_format):
+    """Normalize and serialize a batch; runs in a worker process."""
+    results = []
+    for item in items:
+        record = normalize(item)
+        if record is None:
+            results.append(None)
+            continue
+        if output_format == 'ndjson':
+            text = json.dumps(record, ensure_ascii=False)
+        else:
+            # Matches json.dump(list, indent=2) item layout.
+            text = textwrap.indent(json.dumps(record, indent=2, ensure_ascii=False), '  ')
+        results.append((fingerprint(record), text))
+    return results
+
+
+class FingerprintSet:
+    """
+    Set of non-zero 64-bit ints: an open-addressing table in a flat array
+    (8 bytes per slot) of at most max_memory bytes, backed by one sorted file
+    of the values that did not fit.
+    """
+
+    def __init__(self, max_memory=DEFAULT_MAX_MEMORY, capacity=1 << 16):
+        # Growing holds the old table (half the size) next to the new one.
+        self.max_capacity = 1 << max(4, (max_memory // 12).bit_length() - 1)
+        self.slots = array('Q', bytes(8 * min(capacity, self.max_capacity)))
+        self.mask = len(self.slots) - 1
+        self.size = 0
+        self.spill_dir = None
+        self.spilled = None  # sorted fingerprints on disk, as a memoryview
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self.spilled is not None:
+            self._unmap()
+        if self.spill_dir is not None:
+            shutil.rmtree(self.spill_dir, ignore_errors=True)
+            self.spill_dir = None
+
+    def __len__(self):
+        return self.size + (len(self.spilled) if self.spilled is not None else 0)
+
+    def add(self, value):
+        """Add value; return False if it was already present."""
+        slots, mask = self.slots, self.mask
+        i = value & mask
+        while True:
+            current = slots[i]
+            if current == value:
+                return False
+            if current == 0:
+                break
+            i = (i + 1) & mask
+        if self.spilled is not None:
+            j = bisect.bisect_left(self.spilled, value)
+            if j < len(self.spilled) and self.spilled[j] == value:
+                return False
+        slots[i] = value
+        self.size += 1
+        if self.size * 2 > len(slots):
+            if len(slots) < self.max_capacity:
+                self._grow()
+            else:
+                self._spill()
+        return True
+
+    def _grow(self):
+        old = self.slots
+        self.slots = array('Q', bytes(16 * len(old)))
+        self.mask = len(self.slots) - 1
+        self.size = 0
+        for value in old:
+            if value:
+                self.add(value)
+
+    def _spill(self):
+        """Merge the table into the sorted file and empty it."""
+        if self.spill_dir is None:
+            self.spill_dir = tempfile.mkdtemp(prefix='clean_data.')
+        runs = []
+        values = (value for value in self.slots if value)
+        for piece in batched(values, SPILL_SORT_SIZE):
+            runs.append(self._write_run(sorted(piece)))
+        old = None
+        if self.spilled is not None:
+            old = self._unmap()
+            runs.append(old)
+        merged = self._write_run(heapq.merge(*(self._read_run(path) for path in runs)))
+        for path in runs:
+            os.unlink(path)
+        self._map(merged)
+
+        capacity = len(self.slots)
+        self.slots = None
+        self.slots = array('Q', bytes(8 * capacity))
+        self.size = 0
+
+    def _write_run(self, values):
+        fd, path = tempfile.mkstemp(dir=self.spill_dir, suffix='.run')
+        with os.fdopen(fd, 'wb') as f:
+            for piece in batched(values, SPILL_SORT_SIZE):
+                array('Q', piece).tofile(f)
+        return path
+
+    @staticmethod
+    def _read_run(path):
+        with open(path, 'rb') as f:
+            while chunk := f.read(8 * SPILL_SORT_SIZE):
+                yield from array('Q', chunk)
+
+    def _map(self, path):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._spill_path = path
+        self.spilled = memoryview(self._mmap).cast('Q')
+
+    def _unmap(self):
+        self.spilled.release()
+        self._mmap.close()
+        self.spilled = None
+        return self._spill_path
+
+
+def batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def clean_json(input_file, output_file, output_format='json', workers=None, batch_size=1000,
+               max_memory=DEFAULT_MAX_MEMORY):
+    workers = workers or os.cpu_count() or 1
+    counts = {'read': 0, 'kept': 0, 'dropped': 0}
+    try:
+        with open(input_file, 'r', encoding='utf-8') as f_in:
+            out_dir = os.path.dirname(os.path.abspath(output_file))
+            fd, tmp_path = tempfile.mkstemp(dir=out_dir, prefix='.clean_data.', suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f_out:
+                    write_records(f_in, f_out, output_format, workers, batch_size, counts, max_memory)
+                os.replace(tmp_path, output_file)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
 
-            # 3. Remove duplicates (based on title and file_id)
-            unique_key = (word.lower(), file_id)
-            if unique_key in seen_entries:
-                continue
-            
-            seen_entries.add(unique_key)
-
-            cleaned_data.append({
-                "word": word,
-                "category": category,
-                "telegram_file_id": file_id,
-                "definition": definition
-            })
-
-        # 4. Output cleaned JSON
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(cleaned_data, f, indent=2, ensure_ascii=False)
-            
         print(f"✅ Successfully cleaned data. Saved to {output_file}")
-        print(f"Original count: {len(data)}")
-        print(f"Cleaned count: {len(cleaned_data)}")
+        print(f"Original count: {counts['read']}")
+        print(f"Cleaned count: {counts['kept']}")
+        print(f"Dropped count: {counts['dropped']}")
+        if resource is not None:
+            # ru_maxrss is in KB on Linux and in bytes on macOS.
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            print(f"Peak memory: {peak / (1 << 20 if sys.platform == 'darwin' else 1 << 10):.0f} MB")
+        return counts
 
     except json.JSONDecodeError as e:
         print(f"❌ JSON Syntax Error: {e}")
     except Exception as e:
         print(f"❌ Error: {e}")
 
+
+def write_records(f_in, f_out, output_format, workers, batch_size, counts, max_memory=DEFAULT_MAX_MEMORY):
+    with FingerprintSet(max_memory) as seen_entries:
+        _write_records(f_in, f_out, output_format, workers, batch_size, counts, seen_entries)
+
+
+def _write_records(f_in, f_out, output_format, workers, batch_size, counts, seen_entries):
+    first = True
+
+    def write(results):
+        nonlocal first
+        counts['read'] += len(results)
+        for result in results:
+            # 3. Remove duplicates (based on title and file_id)
+            if result is None or not seen_entries.add(result[0]):
+                counts['dropped'] += 1
+                continue
+            counts['kept'] += 1
+            if output_format == 'ndjson':
+                f_out.write(result[1] + '\n')
+            else:
+                f_out.write(('[\n' if first else ',\n') + result[1])
+            first = False
+
+    # Raw exports are hand-edited and may have trailing commas.
+    batches = batched(iter_records(f_in, tolerate_trailing_commas=True), batch_size)
+    if workers == 1:
+        for batch in batches:
+            write(process_batch(batch, output_format))
+    else:
+        # Keep a bounded window of batches in flight and collect them in
+        # submission order, so output order matches input order and memory
+        # does not grow with the file.
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = deque()
+            for batch in batches:
+                pending.append(pool.submit(process_batch, batch, output_format))
+                if len(pending) >= workers * 2:
+                    write(pending.popleft().result())
+            while pending:
+                write(pending.popleft().result())
+
+    # 4. Close the output
+    if output_format == 'json':
+        f_out.write('[]' if first else '\n]')
+
+
 if __name__ == "__main__":
-    # Create a dummy raw_data.json if it doesn't exist for demonstration
-    import os
-    if not os.path.exists('raw_data.json'):
-        print("ℹ️ 'raw_data.json' not found. Please create it with your data.")
+    parser = argparse.ArgumentParser(description="Clean a raw dictionary export.")
+    parser.add_argument('input_file', nargs='?', default='raw_data.json')
+    parser.add_argument('output_file', nargs='?', default='cleaned_data.json')
+    parser.add_argument('--format', choices=['json', 'ndjson'], default='json', dest='output_format')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Records per worker task')
+    parser.add_argument(
+        '--max-memory', type=int, default=DEFAULT_MAX_MEMORY >> 20,
+        help='MB the duplicate filter keeps in memory before spilling to disk',
+    )
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input_file):
+        print(f"ℹ️ '{args.input_file}' not found. Please create it with your data.")
     else:
-        clean_json('raw_data.json', 'cleaned_data.json')
+        clean_json(
+            args.input_file, args.output_file, args.output_format, args.workers, args.batch_size,
+            args.max_memory << 20,
+        )
@@ -0,0 +1,54 @@
+"""
+Gunicorn settings for the web process (`web: gunicorn --log-file -`).
+
+SERVER_MODE chooses how Django is served:
+
+- wsgi (default): ishoratech_backend.wsgi on sync workers. A worker serves
+  one request at a time, so WEB_CONCURRENCY is the number of requests in
+  flight, and a slow query holds a whole worker.
+- asgi: ishoratech_backend.asgi on uvicorn workers. Each worker runs an event
+  loop and the video list is an async view, so a worker keeps accepting
+  requests while its queries and cache reads are pending. The other views
+  are sync. Django gives each request its own thread-sensitive context, and
+  asgiref a thread of its own, so a worker runs sync views concurrently,
+  one thread per request in flight, with no fixed limit. Telegram webhook
+  mode (TELEGRAM_WEBHOOK_URL) needs this mode.
+
+asgi pays off when requests mostly wait on a remote database or cache. When
+they are CPU bound (cache hits, a local database) sync workers serve more
+requests per second: under ASGI every sync middleware hook costs a thread
+switch. Compare both on real data with `manage.py bench_serving`.
+
+WEB_CONCURRENCY: worker processes. Defaults to 2 x CPUs + 1 for wsgi and to
+    the CPU count for asgi, where one process already overlaps many requests.
+    Always 1 in webhook mode: the bot's conversation state lives in the
+    process, and updates spread over several workers would lose it.
+WEB_TIMEOUT: seconds before a worker that stopped responding is restarted.
+
+Every worker keeps its own database connections (CONN_MAX_AGE), so the
+database must accept at least WEB_CONCURRENCY times the connections one
+worker opens. Under asgi a worker can hold one per sync request in flight.
+"""
+import multiprocessing
+import os
+import sys
+
+server_mode = os.environ.get('SERVER_MODE', 'wsgi')
+if server_mode not in ('wsgi', 'asgi'):
+    raise RuntimeError(f"SERVER_MODE must be 'wsgi' or 'asgi', not {server_mode!r}")
+
+cpus = multiprocessing.cpu_count()
+if server_mode == 'asgi':
+    wsgi_app = 'ishoratech_backend.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+    workers = int(os.environ.get('WEB_CONCURRENCY', cpus))
+else:
+    wsgi_app = 'ishoratech_backend.wsgi:application'
+    worker_class = 'sync'
+    workers = int(os.environ.get('WEB_CONCURRENCY', cpus * 2 + 1))
+
+if os.environ.get('TELEGRAM_WEBHOOK_URL') and workers != 1:
+    print(f"TELEGRAM_WEBHOOK_URL is set: serving with 1 worker instead of {workers}.", file=sys.stderr)
+    workers = 1
+
+timeout = int(os.environ.get('WEB_TIMEOUT', '30'))
@@ -3,14 +3,47 @@ ASGI config for ishoratech_backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+With TELEGRAM_WEBHOOK_URL set, the same application also receives Telegram
+bot updates on that URL's path (see videos.webhook). Serve it with a single
+worker, since bot conversation state lives in process:
+
+    SERVER_MODE=asgi WEB_CONCURRENCY=1 gunicorn
+
+See gunicorn.conf.py for the worker settings.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
 """
 
 import os
+from urllib.parse import urlparse
 
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ishoratech_backend.settings')
 
 application = get_asgi_application()
+
+
+def wrap_telegram_webhook(django_app):
+    from django.conf import settings
+    from django.core.exceptions import ImproperlyConfigured
+
+    if not settings.TELEGRAM_WEBHOOK_URL:
+        return django_app
+    if not settings.TELEGRAM_WEBHOOK_SECRET:
+        raise ImproperlyConfigured('TELEGRAM_WEBHOOK_SECRET is required when TELEGRAM_WEBHOOK_URL is set.')
+
+    from videos.management.commands.run_bot import build_webhook_application
+    from videos.webhook import TelegramWebhookRouter
+
+    return TelegramWebhookRouter(
+        django_app,
+        build_webhook_application(),
+        path=urlparse(settings.TELEGRAM_WEBHOOK_URL).path or '/',
+        secret_token=settings.TELEGRAM_WEBHOOK_SECRET,
+        webhook_url=settings.TELEGRAM_WEBHOOK_URL,
+    )
+
+
+application = wrap_telegram_webhook(application)
@@ -0,0 +1,208 @@
+"""
+In-process metrics, exposed in the Prometheus text format at /metrics.
+
+Histograms and counters live in this process only: with several gunicorn
+workers each one reports its own, and Prometheus sums them per instance
+label. The admin bot records into the same registry, which run_bot serves on
+BOT_METRICS_PORT (in webhook mode the bot runs inside the web process and
+its metrics are part of /metrics).
+
+METRICS_SAMPLE_RATE is the fraction of requests and bot updates that are
+measured; the rest run without any instrumentation.
+
+Database connection pool statistics (settings.DB_POOL) are read from psycopg's
+pool when the metrics are rendered. The pool reports totals rather than
+single waits, so the mean wait for a connection over an interval is
+rate(db_pool_wait_seconds_total) / rate(db_pool_requests_total).
+"""
+import bisect
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+
+# Seconds; request latencies, query and render times
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def sampled():
+    """Whether to measure this request or update."""
+    rate = settings.METRICS_SAMPLE_RATE
+    return rate >= 1 or random.random() < rate
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def set_total(self, value, *label_values):
+        """Mirror a total that is counted elsewhere."""
+        with self._lock:
+            self._values[label_values] = value
+
+    def value(self, *label_values):
+        return self._values.get(label_values, 0)
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for label_values, value in values:
+            yield f'{self.name}_total{_format_labels(self.labels, label_values)} {_format_value(value)}'
+
+
+class Gauge(Counter):
+    type = 'gauge'
+
+    def set(self, value, *label_values):
+        self.set_total(value, *label_values)
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for label_values, value in values:
+            yield f'{self.name}{_format_labels(self.labels, label_values)} {_format_value(value)}'
+
+
+class Histogram:
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=DURATION_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (last one is +Inf), sum]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(label_values)
+            if entry is None:
+                entry = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def count(self, *label_values):
+        entry = self._values.get(label_values)
+        return sum(entry[0]) if entry else 0
+
+    def samples(self):
+        with self._lock:
+            values = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        for label_values, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, '+Inf'), counts):
+                cumulative += count
+                le = (('le', bound if bound == '+Inf' else _format_value(bound)),)
+                yield f'{self.name}_bucket{_format_labels(self.labels, label_values, le)} {cumulative}'
+            yield f'{self.name}_sum{_format_labels(self.labels, label_values)} {_format_value(total)}'
+            yield f'{self.name}_count{_format_labels(self.labels, label_values)} {cumulative}'
+
+
+def _register(metric):
+    with _registry_lock:
+        # Modules can be imported more than once (management commands, tests).
+        return _registry.setdefault(metric.name, metric)
+
+
+def counter(name, documentation, labels=()):
+    return _register(Counter(name, documentation, labels))
+
+
+def gauge(name, documentation, labels=()):
+    return _register(Gauge(name, documentation, labels))
+
+
+def histogram(name, documentation, labels=(), buckets=DURATION_BUCKETS):
+    return _register(Histogram(name, documentation, labels, buckets))
+
+
+POOL_SIZE = gauge('db_pool_size', 'Connections in the pool, in use or idle.', ['alias'])
+POOL_AVAILABLE = gauge('db_pool_available', 'Idle connections in the pool.', ['alias'])
+POOL_WAITING = gauge('db_pool_requests_waiting', 'Threads waiting for a connection right now.', ['alias'])
+POOL_REQUESTS = counter('db_pool_requests', 'Connections handed out by the pool.', ['alias'])
+POOL_QUEUED = counter('db_pool_requests_queued', 'Requests for a connection that had to wait.', ['alias'])
+POOL_WAIT = counter('db_pool_wait_seconds', 'Time spent waiting for a pooled connection.', ['alias'])
+POOL_ERRORS = counter('db_pool_request_errors', 'Requests for a connection that timed out.', ['alias'])
+POOL_LOST = counter('db_pool_connections_lost', 'Connections found broken by the health check.', ['alias'])
+
+
+def collect_pool_stats():
+    for alias in connections:
+        pool = getattr(connections[alias], 'pool', None)
+        if pool is None:
+            continue
+        stats = pool.get_stats()
+        POOL_SIZE.set(stats.get('pool_size', 0), alias)
+        POOL_AVAILABLE.set(stats.get('pool_available', 0), alias)
+        POOL_WAITING.set(stats.get('requests_waiting', 0), alias)
+        POOL_REQUESTS.set_total(stats.get('requests_num', 0), alias)
+        POOL_QUEUED.set_total(stats.get('requests_queued', 0), alias)
+        POOL_WAIT.set_total(stats.get('requests_wait_ms', 0) / 1000, alias)
+        POOL_ERRORS.set_total(stats.get('requests_errors', 0), alias)
+        POOL_LOST.set_total(stats.get('connections_lost', 0), alias)
+
+
+def render():
+    """All registered metrics in the Prometheus text exposition format."""
+    collect_pool_stats()
+    lines = []
+    with _registry_lock:
+        metrics = sorted(_registry.values(), key=lambda m: m.name)
+    for metric in metrics:
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.type}')
+        lines.extend(metric.samples())
+    return '\n'.join(lines) + '\n'
+
+
+class QueryTimer:
+    """A database execute wrapper that counts queries and adds up their time."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
@@ -0,0 +1,165 @@
+import contextvars
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from . import metrics
+
+REQUEST_DURATION = metrics.histogram(
+    'http_request_duration_seconds', 'Time from the middleware to the rendered response, by view.', ['view'],
+)
+DB_QUERIES = metrics.histogram(
+    'http_db_queries', 'Database queries per request, by view.', ['view'], metrics.QUERY_COUNT_BUCKETS,
+)
+DB_DURATION = metrics.histogram('http_db_duration_seconds', 'Database time per request, by view.', ['view'])
+RENDER_DURATION = metrics.histogram(
+    'http_render_duration_seconds', 'Response serialization time, by view.', ['view'],
+)
+RESPONSE_SIZE = metrics.histogram(
+    'http_response_size_bytes', 'Response body size, by view.', ['view'], metrics.SIZE_BUCKETS,
+)
+RESPONSES = metrics.counter('http_responses', 'Responses by view and status class.', ['view', 'status'])
+
+
+_request_queries = contextvars.ContextVar('request_queries', default=None)
+
+
+def _time_request_queries(execute, sql, params, many, context):
+    timer = _request_queries.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    return timer(execute, sql, params, many, context)
+
+
+def _install(connection, **kwargs):
+    if _time_request_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_request_queries)
+
+
+def install_query_timing():
+    """Time request queries on this thread's connections and on every one opened later."""
+    # Under ASGI, queries run on Django's sync threads, not the one the
+    # middleware runs on; the request's timer follows them in a context
+    # variable.
+    connection_created.connect(_install, weak=False, dispatch_uid='request_queries')
+    for connection in connections.all():
+        _install(connection)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.queries = metrics.QueryTimer()
+        self.render_started = None
+        self.render = 0.0
+
+
+def note_render(request, seconds):
+    """Record serialization time for a view that renders its response itself."""
+    request_metrics = getattr(request, 'metrics', None)
+    if request_metrics is not None:
+        request_metrics.render += seconds
+
+
+class RequestMetricsMiddleware:
+    """
+    Time each sampled request and report it in a Server-Timing header.
+
+    The header has the total time ("app"), the database time with the query
+    count ("db") and the time spent rendering the response ("render"). DRF
+    responses are rendered after the view returns, so their render time is
+    taken from process_template_response to the post-render callback; views
+    that render themselves report it with note_render().
+
+    Streaming responses are measured up to their first byte, and their size
+    only when they declare a Content-Length.
+
+    Under ASGI the middleware runs on the event loop, so Django needs no
+    thread switch to call it.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        install_query_timing()
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+            # Django would run a sync hook in a thread for every DRF response.
+            self.process_template_response = self.aprocess_template_response
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not metrics.sampled():
+            return self.get_response(request)
+
+        for connection in connections.all():
+            _install(connection)
+        request.metrics = request_metrics = RequestMetrics()
+        token = _request_queries.set(request_metrics.queries)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_queries.reset(token)
+        return self.finish(request, response, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        if not metrics.sampled():
+            return await self.get_response(request)
+
+        request.metrics = request_metrics = RequestMetrics()
+        token = _request_queries.set(request_metrics.queries)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_queries.reset(token)
+        return self.finish(request, response, time.perf_counter() - started)
+
+    def finish(self, request, response, duration):
+        request_metrics = request.metrics
+        match = request.resolver_match
+        view = match.view_name if match is not None else 'unresolved'
+        queries = request_metrics.queries
+        REQUEST_DURATION.observe(duration, view)
+        DB_QUERIES.observe(queries.count, view)
+        DB_DURATION.observe(queries.duration, view)
+        RENDER_DURATION.observe(request_metrics.render, view)
+        RESPONSES.inc(view, f'{response.status_code // 100}xx')
+        size = self.response_size(response)
+        if size is not None:
+            RESPONSE_SIZE.observe(size, view)
+
+        response['Server-Timing'] = (
+            f'app;dur={duration * 1000:.1f}, '
+            f'db;dur={queries.duration * 1000:.1f};desc="{queries.count} queries", '
+            f'render;dur={request_metrics.render * 1000:.1f}'
+        )
+        return response
+
+    def process_template_response(self, request, response):
+        request_metrics = getattr(request, 'metrics', None)
+        if request_metrics is not None:
+            # Template response middleware runs right before render().
+            request_metrics.render_started = time.perf_counter()
+            response.add_post_render_callback(lambda rendered: self.rendered(request_metrics))
+        return response
+
+    async def aprocess_template_response(self, request, response):
+        return RequestMetricsMiddleware.process_template_response(self, request, response)
+
+    @staticmethod
+    def rendered(request_metrics):
+        request_metrics.render += time.perf_counter() - request_metrics.render_started
+
+    @staticmethod
+    def response_size(response):
+        if response.has_header('Content-Length'):
+            return int(response['Content-Length'])
+        if response.streaming:
+            return None
+        return len(response.content)
@@ -44,7 +44,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware', # Add WhiteNoise for static files
+    'ishoratech_backend.middleware.RequestMetricsMiddleware', # Server-Timing and /metrics histograms
+    'videos.snapshot.SnapshotWhiteNoiseMiddleware', # WhiteNoise for static files and dictionary snapshots
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -71,6 +72,9 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'ishoratech_backend.wsgi.application'
+# 'wsgi' or 'asgi': how gunicorn serves the project (see gunicorn.conf.py).
+# In 'asgi' mode the video list is served by an async view.
+SERVER_MODE = os.environ.get('SERVER_MODE', 'wsgi')
 
 
 # Database
@@ -81,9 +85,91 @@ import dj_database_url
 DATABASES = {
     'default': dj_database_url.config(
         default=f"sqlite:///{BASE_DIR / 'db.sqlite3'}",
-        conn_max_age=600
+        conn_max_age=600,
+        # Test persistent connections before reuse, so a failover costs a
+        # reconnect instead of the next request.
+        conn_health_checks=True,
     )
 }
+DATABASE_ENGINE = DATABASES['default']['ENGINE']
+
+# DB_POOL=True (Postgres only, needs psycopg[pool]) replaces persistent
+# connections with psycopg's pool: each process keeps DB_POOL_MIN_SIZE to
+# DB_POOL_MAX_SIZE connections and hands them out per request or bot query.
+# The default maximum covers the bot's BOT_DB_THREADS plus the async ORM
+# thread. With the health checks above, connections are checked as they are
+# handed out; waits show up as db_pool_* in /metrics.
+DB_POOL = os.environ.get('DB_POOL', 'False') == 'True'
+if DB_POOL and DATABASE_ENGINE == 'django.db.backends.postgresql':
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default'].setdefault('OPTIONS', {})['pool'] = {
+        'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', '2')),
+        'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', '5')),
+        # Seconds to wait for a connection before the request fails
+        'timeout': float(os.environ.get('DB_POOL_TIMEOUT', '10')),
+        'max_idle': float(os.environ.get('DB_POOL_MAX_IDLE', '600')),
+        'max_lifetime': float(os.environ.get('DB_POOL_MAX_LIFETIME', '3600')),
+    }
+
+# The SQLite fallback runs tuned unless SQLITE_TUNED=False: writers wait up
+# to SQLITE_BUSY_TIMEOUT seconds for each other instead of failing with
+# "database is locked", and transactions take the write lock when they
+# begin, since a read transaction that later writes cannot wait for the
+# lock. These are per-connection settings.
+# SQLITE_WAL=True also switches to WAL, which lets API reads go on while the
+# bot writes; synchronous=NORMAL is durable in WAL mode except across a
+# power cut. WAL mode is stored in the database file, so it is opt-in: it
+# would convert the db.sqlite3 checked into the repo (and leave
+# db.sqlite3-wal/-shm files next to it, which git ignores).
+# `PRAGMA journal_mode=DELETE` converts a file back.
+SQLITE_TUNED = os.environ.get('SQLITE_TUNED', 'True') == 'True'
+SQLITE_WAL = os.environ.get('SQLITE_WAL', 'False') == 'True'
+SQLITE_TUNED_OPTIONS = {
+    'init_command': (
+        f"PRAGMA mmap_size={int(os.environ.get('SQLITE_MMAP_SIZE', str(256 << 20)))};"
+        'PRAGMA cache_size=-16000;'
+    ),
+    'timeout': float(os.environ.get('SQLITE_BUSY_TIMEOUT', '20')),
+    'transaction_mode': 'IMMEDIATE',
+}
+SQLITE_WAL_INIT_COMMAND = 'PRAGMA journal_mode=WAL;PRAGMA synchronous=NORMAL;'
+if DATABASE_ENGINE == 'django.db.backends.sqlite3':
+    options = DATABASES['default'].setdefault('OPTIONS', {})
+    if SQLITE_TUNED:
+        options.update(SQLITE_TUNED_OPTIONS)
+    if SQLITE_WAL:
+        options['init_command'] = SQLITE_WAL_INIT_COMMAND + options.get('init_command', '')
+
+
+# Cache
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+# Set CACHE_DIR to share cached API responses (and their invalidation) between
+# the web and bot processes on one host; do so in production. Otherwise each
+# process keeps its own and can't see the others' writes, so it re-reads the
+# data version from the database every CACHE_VERSION_TTL seconds and may
+# serve responses that old (see videos/cache.py).
+
+CACHE_DIR = os.environ.get('CACHE_DIR')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': CACHE_DIR,
+    } if CACHE_DIR else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+CACHE_VERSION_TTL = int(os.environ.get('CACHE_VERSION_TTL', '5'))
+
+# Disk cache for video bytes proxied from Telegram by /api/videos/<id>/stream;
+# the least recently served files are evicted past VIDEO_CACHE_MAX_BYTES.
+VIDEO_CACHE_DIR = os.environ.get('VIDEO_CACHE_DIR', str(BASE_DIR / 'video_cache'))
+VIDEO_CACHE_MAX_BYTES = int(os.environ.get('VIDEO_CACHE_MAX_BYTES', str(2 << 30)))
+
+
+# Fraction of requests and bot updates measured for Server-Timing and
+# /metrics; lower it if the instrumentation ever shows up in latencies.
+METRICS_SAMPLE_RATE = float(os.environ.get('METRICS_SAMPLE_RATE', '1'))
 
 
 # Password validation
@@ -128,4 +214,21 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 TELEGRAM_BOT_TOKEN = os.environ.get('TELEGRAM_BOT_TOKEN', '8533482306:AAFX5vhfCSmE-j7l7VgupnJvwaFjFeQ5NNg')
 # Admin IDs as a list of integers
 ADMIN_IDS = [int(id) for id in os.environ.get('ADMIN_IDS', '6311751656').split(',')]
+# Webhook mode: with TELEGRAM_WEBHOOK_URL set (a public https URL), the ASGI
+# web process receives bot updates on that URL's path and `run_bot` only runs
+# with --polling. Telegram sends TELEGRAM_WEBHOOK_SECRET in the
+# X-Telegram-Bot-Api-Secret-Token header; requests without it are rejected.
+# Conversation state is per process, so gunicorn.conf.py then runs a single
+# worker, and `run_bot` without --polling just idles.
+TELEGRAM_WEBHOOK_URL = os.environ.get('TELEGRAM_WEBHOOK_URL', '')
+TELEGRAM_WEBHOOK_SECRET = os.environ.get('TELEGRAM_WEBHOOK_SECRET', '')
+# Point the bot at another Bot API server, e.g. videos.fake_telegram in tests
+TELEGRAM_API_BASE_URL = os.environ.get('TELEGRAM_API_BASE_URL', '')
+# Threads (and so database connections) the bot uses for multi-query work;
+# 0 runs it on the async ORM's single shared thread. See videos/executor.py.
+BOT_DB_THREADS = int(os.environ.get('BOT_DB_THREADS', '4'))
+# Updates the bot handles at once; each admin's own updates stay in order.
+BOT_CONCURRENT_UPDATES = int(os.environ.get('BOT_CONCURRENT_UPDATES', '16'))
+# Port on which run_bot serves its metrics in the Prometheus format; 0 disables it.
+BOT_METRICS_PORT = int(os.environ.get('BOT_METRICS_PORT', '0'))
 
@@ -16,10 +16,11 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
-from .views import home
+from .views import home, metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('videos.urls')),
+    path('metrics', metrics_view, name='metrics'),
     path('', home),
 ]
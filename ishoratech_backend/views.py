@@ -1,10 +1,17 @@
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse
+
+from . import metrics
 
 def home(request):
     return JsonResponse({
         "message": "Welcome to IshoraTech API",
         "endpoints": {
             "videos": "/api/videos/",
+            "search": "/api/videos/search?q=",
+            "sync": "/api/sync?since=",
             "admin": "/admin/"
         }
     })
+
+def metrics_view(request):
+    return HttpResponse(metrics.render(), content_type=metrics.CONTENT_TYPE)
@@ -0,0 +1,177 @@
+"""
+Batch ingestion for the admin bot: videos collected from forwarded albums,
+plus a CSV or JSON sheet that supplies the text fields for each video.
+
+A sheet row refers to its video by `file_name` (the name Telegram reports
+for the upload) or by `index` (1-based arrival order). Rows without either
+are matched to videos in order. The whole batch is validated first. It is
+then written with one bulk_create in a transaction, or not at all.
+"""
+import csv
+import io
+import json
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+
+from .cache import bump_version, categories
+from .fields import FIELD_ALIASES
+from .jsonstream import iter_records
+from .models import Category, Video
+from .search import build_search_key
+
+MAX_SHEET_SIZE = 1 << 20
+FILE_NAME_KEYS = ('file_name', 'filename', 'file')
+INDEX_KEYS = ('index', 'order', 'n')
+
+
+class SheetError(ValueError):
+    pass
+
+
+def parse_sheet(content, file_name=''):
+    """Return the rows of a CSV, JSON array or NDJSON sheet as dicts with lower-case keys."""
+    try:
+        text = content.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        raise SheetError('The sheet must be UTF-8 encoded.')
+    if file_name.lower().endswith(('.json', '.ndjson')) or text.lstrip()[:1] in ('[', '{'):
+        try:
+            rows = list(iter_records(io.StringIO(text)))
+        except json.JSONDecodeError as e:
+            raise SheetError(f'Invalid JSON: {e}')
+        if not all(isinstance(row, dict) for row in rows):
+            raise SheetError('Every JSON record must be an object.')
+    else:
+        rows = list(csv.DictReader(io.StringIO(text)))
+    return [
+        {str(key).strip().lower(): value for key, value in row.items() if key is not None}
+        for row in rows
+    ]
+
+
+def _first(row, keys):
+    for key in keys:
+        value = row.get(key)
+        if isinstance(value, str):
+            value = value.strip()
+        if value not in (None, ''):
+            return value
+    return None
+
+
+def _category_name(row):
+    name = str(_first(row, ('category',)) or '')
+    # Same apostrophe folding as clean_data.py and import_videos.
+    return name.replace("’", "'").replace("`", "'")
+
+
+def plan_batch(videos, rows):
+    """
+    Match rows to videos and validate them.
+
+    `videos` are dicts with file_id, file_name, message_id and optionally
+    metadata (Video field values from Telegram). Returns a list
+    of (unsaved Video, category name) pairs and a list of error strings; the
+    pairs are only meaningful when there are no errors.
+    """
+    videos = sorted(videos, key=lambda v: v['message_id'])
+    by_name = {v['file_name']: v for v in videos if v.get('file_name')}
+    errors = []
+    if not videos:
+        errors.append('No videos were received.')
+    if not rows:
+        errors.append('The sheet has no rows.')
+
+    planned = []
+    used = {}
+    for number, row in enumerate(rows, 1):
+        file_name = _first(row, FILE_NAME_KEYS)
+        index = _first(row, INDEX_KEYS)
+        if file_name is not None:
+            video = by_name.get(str(file_name))
+            if video is None:
+                errors.append(f'Row {number}: no video named "{file_name}".')
+                continue
+        else:
+            try:
+                position = int(index) if index is not None else number
+            except (TypeError, ValueError):
+                errors.append(f'Row {number}: index "{index}" is not a number.')
+                continue
+            if not 1 <= position <= len(videos):
+                errors.append(f'Row {number}: there is no video #{position} (received {len(videos)}).')
+                continue
+            video = videos[position - 1]
+        if video['file_id'] in used:
+            errors.append(f'Row {number}: same video as row {used[video["file_id"]]}.')
+            continue
+        used[video['file_id']] = number
+
+        values = {field: _first(row, aliases) for field, aliases in FIELD_ALIASES.items()}
+        category_name = _category_name(row)
+        if not values['title_lat']:
+            errors.append(f'Row {number}: title_lat is empty.')
+        if not category_name:
+            errors.append(f'Row {number}: category is empty.')
+        planned.append((
+            Video(
+                telegram_file_id=video['file_id'],
+                **video.get('metadata', {}),
+                **{field: str(value) for field, value in values.items() if value is not None},
+            ),
+            category_name,
+        ))
+
+    for position, video in enumerate(videos, 1):
+        if video['file_id'] not in used:
+            label = f' ({video["file_name"]})' if video.get('file_name') else ''
+            errors.append(f'Video #{position}{label} has no row in the sheet.')
+
+    unique_ids = [video.file_unique_id for video, _ in planned if video.file_unique_id]
+    existing = set()
+    for file_id, unique_id in Video.objects.filter(
+        Q(telegram_file_id__in=used) | Q(file_unique_id__in=unique_ids)
+    ).values_list('telegram_file_id', 'file_unique_id'):
+        existing.update([file_id, unique_id])
+    for video, _ in planned:
+        if video.telegram_file_id in existing or (video.file_unique_id and video.file_unique_id in existing):
+            errors.append(f'Row {used[video.telegram_file_id]}: this video is already in the dictionary.')
+    return planned, errors
+
+
+def ingest_batch(videos, rows):
+    """
+    Validate and save a batch. Returns a summary dict; when 'errors' is
+    non-empty nothing was written.
+    """
+    planned, errors = plan_batch(videos, rows)
+    if errors:
+        return {'created': 0, 'errors': errors}
+
+    names = {name for _, name in planned}
+    try:
+        with transaction.atomic():
+            category_ids = dict(Category.objects.filter(name__in=names).values_list('name', 'id'))
+            missing = names - category_ids.keys()
+            if missing:
+                Category.objects.bulk_create([Category(name=name) for name in missing], ignore_conflicts=True)
+                category_ids.update(Category.objects.filter(name__in=missing).values_list('name', 'id'))
+            for video, name in planned:
+                video.category_id = category_ids[name]
+                video.search_key = build_search_key(video)
+            Video.objects.bulk_create([video for video, _ in planned])
+    except IntegrityError:
+        # Lost a race with another upload of the same file.
+        return {'created': 0, 'errors': ['One of these videos was added meanwhile; nothing was saved.']}
+
+    # bulk_create() sends no signals.
+    bump_version()
+    if missing:
+        categories.invalidate()
+    return {
+        'created': len(planned),
+        'categories': len(names),
+        'new_categories': sorted(missing),
+        'errors': [],
+    }
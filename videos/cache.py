@@ -0,0 +1,200 @@
+import datetime
+import hashlib
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db.models import Count, Max
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from .executor import run_in_db_thread
+from .models import Category, Video, VideoTombstone
+
+# Bumped by the signals in videos/signals.py on every Video/Category write.
+# Payloads are keyed by version, so a bump orphans every cached response at
+# once without having to enumerate the keys.
+#
+# A process-local backend (LocMemCache, the default without CACHE_DIR) never
+# sees bumps made by other processes: the bot, the other gunicorn workers,
+# import_videos. There the version is read from the database instead and
+# trusted for CACHE_VERSION_TTL seconds, which bounds how stale a response
+# served by another process can be.
+VERSION_KEY = 'videos:version'
+PAYLOAD_TIMEOUT = 60 * 60 * 24
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+# Category signals clear the in-process category cache in the process that
+# made the change; the TTL bounds staleness for changes made elsewhere (the
+# admin site in the web process, import_videos).
+CATEGORY_CACHE_TTL = 300
+
+
+def is_process_local():
+    """Whether the default cache lives in this process only."""
+    return isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+def database_version():
+    """The time of the newest change the API serves, from the database (ns since the epoch)."""
+    category = Category.objects.aggregate(latest=Max('updated_at'), count=Count('id'))
+    timestamps = [
+        category['latest'],
+        Video.objects.aggregate(latest=Max('updated_at'))['latest'],
+        VideoTombstone.objects.aggregate(latest=Max('deleted_at'))['latest'],
+    ]
+    latest = max((timestamp for timestamp in timestamps if timestamp is not None), default=EPOCH)
+    # Deleting an empty category leaves no timestamp behind; adding the
+    # count catches it and moves the version by a few microseconds at most.
+    return (latest - EPOCH) // datetime.timedelta(microseconds=1) * 1000 + category['count']
+
+
+def get_version():
+    """Return the current data version (nanoseconds since the epoch)."""
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        if is_process_local():
+            version = database_version()
+            cache.set(VERSION_KEY, version, settings.CACHE_VERSION_TTL)
+            return version
+        cache.add(VERSION_KEY, time.time_ns(), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+async def aget_version():
+    """get_version() for async views."""
+    version = await cache.aget(VERSION_KEY)
+    if version is None:
+        if is_process_local():
+            version = await sync_to_async(database_version)()
+            await cache.aset(VERSION_KEY, version, settings.CACHE_VERSION_TTL)
+            return version
+        await cache.aadd(VERSION_KEY, time.time_ns(), None)
+        version = await cache.aget(VERSION_KEY)
+    return version
+
+
+def bump_version():
+    if is_process_local():
+        # Read the new version from the database on the next request.
+        cache.delete(VERSION_KEY)
+    else:
+        cache.set(VERSION_KEY, time.time_ns(), None)
+
+
+def response_cache_key(request, media_type, version, prefix='videos:response'):
+    """Cache key for a response variant; its last segment doubles as the ETag."""
+    variant = '|'.join([
+        media_type,
+        request.build_absolute_uri(request.path),
+        '&'.join(sorted(
+            f'{name}={value}'
+            for name, values in request.GET.lists()
+            for value in values
+        )),
+    ])
+    digest = hashlib.sha256(f'{version}|{variant}'.encode('utf-8')).hexdigest()[:32]
+    return f'{prefix}:{digest}'
+
+
+class CategoryCache:
+    """All categories, sorted by name and by id, loaded with one query on demand."""
+
+    def __init__(self, ttl=CATEGORY_CACHE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._entry = None  # (loaded_at, sorted list, {id: Category})
+
+    def _fresh_entry(self):
+        entry = self._entry
+        if entry is not None and time.monotonic() - entry[0] <= self.ttl:
+            return entry
+        return None
+
+    def _get(self):
+        entry = self._fresh_entry()
+        if entry is None:
+            generation = self._generation
+            categories = list(Category.objects.order_by('name', 'id'))
+            entry = (time.monotonic(), categories, {c.id: c for c in categories})
+            with self._lock:
+                # Don't keep a result that an invalidation overtook.
+                if generation == self._generation:
+                    self._entry = entry
+        return entry
+
+    def all(self):
+        return self._get()[1]
+
+    def get(self, category_id):
+        """Return the Category with this id, or None."""
+        return self._get()[2].get(category_id)
+
+    async def aget(self, category_id):
+        """get() for async callers; only a reload leaves the event loop."""
+        entry = self._fresh_entry()
+        if entry is not None:
+            return entry[2].get(category_id)
+        return await run_in_db_thread(self.get, category_id)
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._entry = None
+
+
+categories = CategoryCache()
+
+
+class CachedResponseMixin:
+    """
+    Serve GET responses from the cache, keyed by data version and request variant.
+
+    The ETag is derived from the version and the variant alone, so a matching
+    If-None-Match is answered with 304 without touching the database. Only
+    JSON responses are cached; the browsable API depends on the user and is
+    always rendered fresh.
+    """
+    cache_key_prefix = 'videos:response'
+    cacheable_formats = ('json',)
+
+    def get(self, request, *args, **kwargs):
+        if request.accepted_renderer.format not in self.cacheable_formats:
+            return super().get(request, *args, **kwargs)
+
+        version = get_version()
+        key = self.get_cache_key(request, version)
+        etag = quote_etag(key.rsplit(':', 1)[-1])
+        last_modified = version // 10 ** 9
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            cached = cache.get(key)
+            if cached is not None:
+                content, content_type = cached
+                response = HttpResponse(content, content_type=content_type)
+            else:
+                response = super().get(request, *args, **kwargs)
+                response.add_post_render_callback(
+                    lambda rendered: self.store_response(key, rendered)
+                )
+
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        # The key, and so the body, depends on the negotiated media type.
+        patch_vary_headers(response, ['Accept'])
+        return response
+
+    def get_cache_key(self, request, version):
+        return response_cache_key(request, request.accepted_media_type, version, self.cache_key_prefix)
+
+    def store_response(self, key, response):
+        if response.status_code == 200:
+            cache.set(key, (response.content, response['Content-Type']), PAYLOAD_TIMEOUT)
@@ -0,0 +1,114 @@
+"""
+Synthetic dictionary corpora for benchmarks (see the bench_api command).
+
+Words are built from Uzbek-like Cyrillic syllables and transliterated to
+Latin with the same table search uses, so the Latin and Cyrillic titles of a
+video fold to the same search tokens, as real entries do. Russian titles
+come from a separate syllable set. Output depends only on the seed and the
+row numbers, so corpora grown in steps (1k, then 10k, ...) match corpora
+generated in one go.
+"""
+import datetime
+import random
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Category, Video
+from .search import CYRILLIC_TO_LATIN, build_search_key
+
+UZ_SYLLABLES = (
+    'ба', 'бо', 'да', 'до', 'ка', 'ки', 'қа', 'қо', 'ма', 'ми', 'на', 'ни', 'ра', 'ри', 'са', 'си', 'та', 'ти',
+    'ёр', 'ўқ', 'ғо', 'ша', 'чи', 'ла', 'ли', 'ҳа', 'хо', 'зи', 'ол', 'ун', 'ат', 'ир', 'ям', 'юл',
+)
+RU_SYLLABLES = (
+    'ва', 'во', 'го', 'да', 'ду', 'жи', 'за', 'ка', 'ку', 'ле', 'ло', 'ми', 'не', 'но', 'пе', 'по', 'ра', 'ре',
+    'со', 'ст', 'та', 'то', 'ху', 'це', 'чи', 'ше', 'щи', 'ры', 'вь', 'ют', 'ям',
+)
+# Uzbek Latin writes these with an apostrophe, which the search table drops.
+LATIN_SPELLING = {**CYRILLIC_TO_LATIN, 'ў': "o‘", 'ғ': "g‘"}
+
+BATCH_SIZE = 2000
+PUBLISHED_RATIO = 0.95
+FIRST_CREATED = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def to_latin(text):
+    return ''.join(LATIN_SPELLING.get(char, char) for char in text)
+
+
+def make_word(rng, syllables, min_syllables=1, max_syllables=4):
+    return ''.join(rng.choice(syllables) for _ in range(rng.randint(min_syllables, max_syllables)))
+
+
+def make_phrase(rng, syllables, min_words, max_words):
+    return ' '.join(make_word(rng, syllables) for _ in range(rng.randint(min_words, max_words)))
+
+
+def ensure_categories(count, seed=0):
+    """Create categories up to `count`; returns their ids in creation order."""
+    existing = Category.objects.count()
+    if existing < count:
+        rng = random.Random(f'{seed}:categories')
+        Category.objects.bulk_create(
+            Category(name=f'{make_word(rng, UZ_SYLLABLES, 2, 3).capitalize()} {n}')
+            for n in range(existing, count)
+        )
+    return list(Category.objects.order_by('id').values_list('id', flat=True)[:count])
+
+
+def build_video(n, category_ids, seed=0):
+    """The n-th synthetic video (unsaved)."""
+    rng = random.Random(f'{seed}:video:{n}')
+    title = make_phrase(rng, UZ_SYLLABLES, 1, 2)
+    description = make_phrase(rng, UZ_SYLLABLES, 6, 20)
+    # A dictionary that grew over about two years, a few words an hour.
+    created_at = FIRST_CREATED + datetime.timedelta(minutes=10 * n + rng.randint(0, 9))
+    # Skewed, like real topics: half the words go to a few large categories.
+    if rng.random() < 0.5:
+        category = min(int(rng.paretovariate(1.2)) - 1, len(category_ids) - 1)
+    else:
+        category = rng.randrange(len(category_ids))
+    video = Video(
+        title_lat=to_latin(title).capitalize(),
+        title_kiril=title.capitalize(),
+        title_ru=make_phrase(rng, RU_SYLLABLES, 1, 2).capitalize() if rng.random() < 0.9 else None,
+        description_lat=to_latin(description).capitalize() + '.',
+        description_kiril=description.capitalize() + '.',
+        description_ru=make_phrase(rng, RU_SYLLABLES, 6, 20).capitalize() + '.' if rng.random() < 0.8 else None,
+        category_id=category_ids[category],
+        telegram_file_id=f'bench_{seed}_{n}',
+        file_unique_id=f'ubench_{seed}_{n}',
+        duration=rng.randint(2, 20),
+        width=720,
+        height=1280,
+        file_size=rng.randint(200_000, 4_000_000),
+        mime_type='video/mp4',
+        is_published=rng.random() < PUBLISHED_RATIO,
+        created_at=created_at,
+        updated_at=min(created_at + datetime.timedelta(days=rng.randint(0, 60)), timezone.now()),
+    )
+    video.search_key = build_search_key(video)
+    return video
+
+
+def generate_corpus(videos, categories, seed=0, batch_size=BATCH_SIZE):
+    """
+    Grow the Video table to `videos` synthetic rows across `categories`
+    categories. Returns the number of rows added.
+
+    Rows go in with bulk_create, which skips save() and the cache signals,
+    and then get their generated timestamps back with bulk_update, since
+    auto_now and auto_now_add override them on insert.
+    """
+    category_ids = ensure_categories(categories, seed)
+    start = Video.objects.count()
+    for first in range(start, videos, batch_size):
+        batch = [build_video(n, category_ids, seed) for n in range(first, min(first + batch_size, videos))]
+        timestamps = [(video.created_at, video.updated_at) for video in batch]
+        with transaction.atomic():
+            Video.objects.bulk_create(batch)
+            for video, (created_at, updated_at) in zip(batch, timestamps):
+                video.created_at, video.updated_at = created_at, updated_at
+            Video.objects.bulk_update(batch, ['created_at', 'updated_at'], batch_size=500)
+    return max(videos - start, 0)
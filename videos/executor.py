@@ -0,0 +1,48 @@
+"""
+A bounded thread pool for blocking database work in the admin bot.
+
+Django's async ORM methods (aget, acreate, ...) still run each query on
+asgiref's single shared thread. That is fine for one-off queries, but a
+multi-query unit of work (a browser page, a bulk action, a transaction)
+would queue every other handler behind it there. Such units run here
+instead, on at most settings.BOT_DB_THREADS threads with one database
+connection each.
+
+With BOT_DB_THREADS = 0 they run on the shared thread like the async ORM,
+which keeps everything on the caller's connection (needed inside TestCase
+transactions).
+"""
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+_executors = {}
+
+
+def db_executor():
+    threads = settings.BOT_DB_THREADS
+    if threads not in _executors:
+        _executors[threads] = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='bot-db')
+    return _executors[threads]
+
+
+def _with_fresh_connection(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        # Pool threads live for the whole process; drop connections that
+        # outlived CONN_MAX_AGE or broke, as a request cycle would.
+        close_old_connections()
+        return func(*args, **kwargs)
+    return wrapper
+
+
+async def run_in_db_thread(func, *args, **kwargs):
+    """Run a blocking database function without stalling the event loop."""
+    if not settings.BOT_DB_THREADS:
+        return await sync_to_async(func)(*args, **kwargs)
+    return await sync_to_async(
+        _with_fresh_connection(func), thread_sensitive=False, executor=db_executor()
+    )(*args, **kwargs)
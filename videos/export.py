@@ -0,0 +1,87 @@
+"""
+NDJSON export of the published dictionary, streamed as it is read.
+
+Rows come from one server-side iterator with the category joined, and are
+encoded one JSON object per line into chunks of about CHUNK_BYTES. The
+optional gzip is a single compressor that is sync-flushed after every
+chunk. Memory use is therefore bounded by one iterator batch plus one chunk,
+however large the table grows, and the first chunk goes out right after the
+first batch.
+"""
+import json
+import zlib
+
+from asgiref.sync import sync_to_async
+
+from .models import Video
+from .serializers import VIDEO_VALUES_FIELDS, serialize_video_values
+
+ITERATOR_CHUNK_SIZE = 2000
+CHUNK_BYTES = 1 << 16
+GZIP_LEVEL = 6
+
+
+def export_rows(since=None, chunk_size=ITERATOR_CHUNK_SIZE):
+    """Published videos, oldest change first when `since` is given, else by id."""
+    videos = Video.objects.filter(is_published=True)
+    if since is not None:
+        # (updated_at, id) is indexed, so this is a range scan without a sort.
+        videos = videos.filter(updated_at__gt=since).order_by('updated_at', 'id')
+    else:
+        videos = videos.order_by('id')
+    return videos.values('id', 'updated_at', *VIDEO_VALUES_FIELDS).iterator(chunk_size=chunk_size)
+
+
+def iter_ndjson(rows, chunk_bytes=None):
+    """Yield UTF-8 NDJSON for rows, in chunks of roughly chunk_bytes (default CHUNK_BYTES)."""
+    chunk_bytes = chunk_bytes or CHUNK_BYTES
+    lines = []
+    size = 0
+    for row in rows:
+        item = {'id': row['id'], **serialize_video_values([row])[0], 'updated_at': row['updated_at'].isoformat()}
+        line = (json.dumps(item, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8')
+        lines.append(line)
+        size += len(line)
+        if size >= chunk_bytes:
+            yield b''.join(lines)
+            lines, size = [], 0
+    if lines:
+        yield b''.join(lines)
+
+
+def accepts_gzip(accept_encoding):
+    """Whether an Accept-Encoding header allows gzip: named, or through *, with q > 0."""
+    weights = {}
+    for coding in accept_encoding.split(','):
+        name, _, params = coding.partition(';')
+        q = 1.0
+        for param in params.split(';'):
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[name.strip().lower()] = q
+    return weights.get('gzip', weights.get('x-gzip', weights.get('*', 0.0))) > 0
+
+
+def gzip_chunks(chunks, level=GZIP_LEVEL):
+    """Compress chunks into one gzip stream, flushing after each so clients can decode as it arrives."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+async def aiter_chunks(chunks):
+    """
+    Async wrapper for a sync chunk iterator, for ASGI responses.
+
+    Django would otherwise read a sync iterator to the end before sending
+    anything. Every step runs on the request's thread-sensitive thread, which
+    for the export is the one holding the database cursor.
+    """
+    step = sync_to_async(next)
+    while (chunk := await step(chunks, None)) is not None:
+        yield chunk
@@ -0,0 +1,252 @@
+"""
+A local stand-in for the Telegram Bot API, for offline end-to-end tests.
+
+Point the bot at it with TELEGRAM_API_BASE_URL = server.base_url. It answers
+the Bot API methods this project uses with plausible objects, records every
+call, and serves registered files under /file/bot<token>/<file_path>.
+message_update() and callback_update() build incoming updates to feed the bot.
+"""
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+_update_ids = itertools.count(1)
+
+
+def message_update(user_id, text=None, video=None, document=None, **fields):
+    """
+    Update JSON for a private message.
+
+    video is a file_id or a dict of Video fields; document is a dict of
+    Document fields. Any other keyword (media_group_id, caption, ...) is set
+    on the message.
+    """
+    update_id = next(_update_ids)
+    message = {
+        'message_id': update_id, 'date': int(time.time()),
+        'from': {'id': user_id, 'is_bot': False, 'first_name': 'Admin'},
+        'chat': {'id': user_id, 'type': 'private'},
+        **fields,
+    }
+    if text is not None:
+        message['text'] = text
+        if text.startswith('/'):
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+    if video is not None:
+        video = {'file_id': video} if isinstance(video, str) else video
+        message['video'] = {
+            'file_unique_id': f"u_{video['file_id']}",
+            'width': 640, 'height': 480, 'duration': 3,
+            **video,
+        }
+    if document is not None:
+        message['document'] = {'file_unique_id': f"u_{document['file_id']}", **document}
+    return {'update_id': update_id, 'message': message}
+
+
+def callback_update(user_id, data, message_id=1):
+    """Update JSON for an inline button press on one of the bot's messages."""
+    update_id = next(_update_ids)
+    user = {'id': user_id, 'is_bot': False, 'first_name': 'Admin'}
+    return {
+        'update_id': update_id,
+        'callback_query': {
+            'id': str(update_id), 'from': user, 'chat_instance': str(user_id), 'data': data,
+            'message': {
+                'message_id': message_id, 'date': int(time.time()), 'text': '',
+                'from': {'id': 1, 'is_bot': True, 'first_name': 'Fake'},
+                'chat': {'id': user_id, 'type': 'private'},
+            },
+        },
+    }
+
+
+class FakeTelegramServer:
+    def __init__(self, host='127.0.0.1', port=0):
+        self.calls = []
+        self.files = {}
+        self._condition = threading.Condition()
+        self._message_id = 0
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def add_file(self, file_id, content, file_path=None, **metadata):
+        """Make a file available to getFile and the file download endpoint."""
+        file_path = file_path or f'videos/{file_id}.mp4'
+        self.files[file_id] = {'content': content, 'file_path': file_path, **metadata}
+        return file_path
+
+    def calls_to(self, method):
+        with self._condition:
+            return [params for name, params in self.calls if name == method]
+
+    def wait_for(self, method, count=1, timeout=5):
+        """Block until method has been called count times; return those calls."""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while len([1 for name, _ in self.calls if name == method]) < count:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f'{method} was not called {count} time(s)')
+                self._condition.wait(remaining)
+            return [params for name, params in self.calls if name == method]
+
+    # --- Bot API methods ---
+    def call(self, method, params):
+        with self._condition:
+            self.calls.append((method, params))
+            self._condition.notify_all()
+        handler = getattr(self, f'api_{method}', None)
+        if handler is None:
+            return True
+        return handler(params)
+
+    def api_getMe(self, params):
+        return {'id': 1, 'is_bot': True, 'first_name': 'Fake', 'username': 'fake_bot'}
+
+    def api_getUpdates(self, params):
+        # Behave like an idle long poll without holding the thread for long.
+        time.sleep(min(float(params.get('timeout') or 0), 0.1))
+        return []
+
+    def api_sendMessage(self, params):
+        return self._message(params)
+
+    def api_editMessageText(self, params):
+        return self._message(params)
+
+    def api_sendVideo(self, params):
+        """Re-sending a registered file_id returns its full Video object, as Telegram does."""
+        file_id = params.get('video')
+        entry = self.files.get(file_id)
+        if entry is None:
+            raise LookupError('Bad Request: wrong file identifier/HTTP URL specified')
+        video = {
+            'file_id': file_id,
+            'file_unique_id': entry.get('file_unique_id', f'u_{file_id}'),
+            'width': entry.get('width', 640), 'height': entry.get('height', 480),
+            'duration': entry.get('duration', 3),
+            'mime_type': entry.get('mime_type', 'video/mp4'),
+            'file_size': len(entry['content']),
+        }
+        if entry.get('thumbnail_file_id'):
+            video['thumbnail'] = {
+                'file_id': entry['thumbnail_file_id'], 'file_unique_id': f"u_{entry['thumbnail_file_id']}",
+                'width': 320, 'height': 240,
+            }
+        return {**self._message(params), 'video': video}
+
+    def api_getFile(self, params):
+        entry = self.files.get(params.get('file_id'))
+        if entry is None:
+            raise LookupError('Bad Request: invalid file_id')
+        return {
+            'file_id': params['file_id'],
+            'file_unique_id': entry.get('file_unique_id', f"u_{params['file_id']}"),
+            'file_size': len(entry['content']),
+            'file_path': entry['file_path'],
+        }
+
+    def _message(self, params):
+        with self._condition:
+            self._message_id += 1
+            message_id = params.get('message_id') or self._message_id
+        chat_id = params.get('chat_id') or 0
+        return {
+            'message_id': message_id,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'text': params.get('text', ''),
+        }
+
+    def file_content(self, file_path):
+        for entry in self.files.values():
+            if entry['file_path'] == file_path:
+                return entry['content']
+        return None
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                parts = self.path.split('?')[0].strip('/').split('/')
+                if len(parts) != 2 or not parts[0].startswith('bot'):
+                    return self._json(404, {'ok': False, 'error_code': 404, 'description': 'Not Found'})
+                length = int(self.headers.get('Content-Length') or 0)
+                params = self._parse(self.rfile.read(length))
+                try:
+                    result = server.call(parts[1], params)
+                except LookupError as e:
+                    return self._json(400, {'ok': False, 'error_code': 400, 'description': str(e)})
+                self._json(200, {'ok': True, 'result': result})
+
+            def do_GET(self):
+                path = self.path.split('?')[0]
+                if not path.startswith('/file/'):
+                    return self.do_POST()
+                # /file/bot<token>/<file_path>
+                file_path = path.split('/', 3)[3] if path.count('/') >= 3 else ''
+                content = server.file_content(file_path)
+                if content is None:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                with server._condition:
+                    server.calls.append(('download', {'file_path': file_path}))
+                    server._condition.notify_all()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/octet-stream')
+                self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def _parse(self, body):
+                content_type = self.headers.get('Content-Type', '')
+                if not body:
+                    return {}
+                if content_type.startswith('application/json'):
+                    return json.loads(body)
+                params = {}
+                for key, value in parse_qsl(body.decode('utf-8')):
+                    try:
+                        params[key] = json.loads(value)
+                    except ValueError:
+                        params[key] = value
+                return params
+
+            def _json(self, status, payload):
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
@@ -0,0 +1,15 @@
+"""
+Record keys accepted for each Video text field in imported data: dumps for
+the import_videos command and the sheets the admin bot takes with a batch.
+"""
+
+# First match wins. "word" and "definition" are what clean_data.py writes;
+# the rest mirror the model and the API.
+FIELD_ALIASES = {
+    'title_lat': ('title_lat', 'word_lat', 'word'),
+    'title_kiril': ('title_kiril', 'word_kiril'),
+    'title_ru': ('title_ru', 'word_ru'),
+    'description_lat': ('description_lat', 'definition_lat', 'definition'),
+    'description_kiril': ('description_kiril', 'definition_kiril'),
+    'description_ru': ('description_ru', 'definition_ru'),
+}
@@ -0,0 +1,142 @@
+"""
+Metrics for the admin bot, in the registry of ishoratech_backend.metrics.
+
+Every handler callback is wrapped to record its latency, its database time
+and query count, and its exceptions, labelled with the handler and the
+conversation state it ran in. Database time is attributed through a context
+variable: queries run on the ORM thread or the bot's DB pool in a copy of
+the handler's context, so concurrent handlers are kept apart. Handler runs
+are sampled by METRICS_SAMPLE_RATE; Bot API calls are few and always timed.
+"""
+import contextvars
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+from telegram.ext import ConversationHandler
+from telegram.request import HTTPXRequest
+
+from ishoratech_backend import metrics
+
+HANDLER_DURATION = metrics.histogram(
+    'bot_handler_duration_seconds', 'Bot handler latency, by handler and conversation state.', ['handler', 'state'],
+)
+HANDLER_DB_DURATION = metrics.histogram(
+    'bot_handler_db_duration_seconds', 'Database time per bot handler run.', ['handler', 'state'],
+)
+HANDLER_DB_QUERIES = metrics.histogram(
+    'bot_handler_db_queries', 'Database queries per bot handler run.', ['handler', 'state'],
+    metrics.QUERY_COUNT_BUCKETS,
+)
+HANDLER_ERRORS = metrics.counter(
+    'bot_handler_errors', 'Bot handler runs that raised, by handler and conversation state.', ['handler', 'state'],
+)
+TELEGRAM_DURATION = metrics.histogram(
+    'bot_telegram_request_duration_seconds', 'Bot API call latency, by method.', ['method'],
+)
+TELEGRAM_ERRORS = metrics.counter(
+    'bot_telegram_errors', 'Bot API calls that failed or were answered with an error status.', ['method'],
+)
+
+_handler_queries = contextvars.ContextVar('bot_handler_queries', default=None)
+
+
+def _time_handler_queries(execute, sql, params, many, context):
+    timer = _handler_queries.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    return timer(execute, sql, params, many, context)
+
+
+def _install(connection, **kwargs):
+    if _time_handler_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_handler_queries)
+
+
+def install_query_timing():
+    """Time handler queries on this thread's connections and on every one opened later."""
+    # The DB pool threads open their own connections.
+    connection_created.connect(_install, weak=False, dispatch_uid='bot_handler_queries')
+    for connection in connections.all():
+        _install(connection)
+
+
+def timed_handler(callback, handler, state):
+    async def wrapper(update, context):
+        if not metrics.sampled():
+            return await callback(update, context)
+        timer = metrics.QueryTimer()
+        token = _handler_queries.set(timer)
+        started = time.perf_counter()
+        try:
+            return await callback(update, context)
+        except Exception:
+            HANDLER_ERRORS.inc(handler, state)
+            raise
+        finally:
+            _handler_queries.reset(token)
+            HANDLER_DURATION.observe(time.perf_counter() - started, handler, state)
+            HANDLER_DB_DURATION.observe(timer.duration, handler, state)
+            HANDLER_DB_QUERIES.observe(timer.count, handler, state)
+
+    wrapper.__wrapped__ = callback
+    return wrapper
+
+
+def instrument_handlers(application, state_names):
+    """Wrap the callback of every handler, conversations included; state_names maps states to labels."""
+    def instrument(handler, state):
+        if isinstance(handler, ConversationHandler):
+            for entry_point in handler.entry_points:
+                instrument(entry_point, 'entry')
+            for key, state_handlers in handler.states.items():
+                for state_handler in state_handlers:
+                    instrument(state_handler, state_names.get(key, str(key)))
+            for fallback in handler.fallbacks:
+                instrument(fallback, 'fallback')
+        else:
+            handler.callback = timed_handler(handler.callback, handler.callback.__name__, state)
+
+    for group in application.handlers.values():
+        for handler in group:
+            instrument(handler, 'none')
+
+
+class InstrumentedRequest(HTTPXRequest):
+    """HTTPXRequest that times each Bot API call, after rate limiting."""
+
+    async def do_request(self, url, method, request_data=None, **kwargs):
+        api_method = url.rsplit('/', 1)[-1]
+        started = time.perf_counter()
+        try:
+            code, payload = await super().do_request(url, method, request_data, **kwargs)
+        except Exception:
+            TELEGRAM_ERRORS.inc(api_method)
+            raise
+        finally:
+            TELEGRAM_DURATION.observe(time.perf_counter() - started, api_method)
+        if code >= 400:
+            TELEGRAM_ERRORS.inc(api_method)
+        return code, payload
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = metrics.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', metrics.CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_metrics(port, host=''):
+    """Serve the registry on port from a daemon thread; returns the server."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name='bot-metrics', daemon=True).start()
+    return server
@@ -0,0 +1,137 @@
+"""
+Incremental reading of large JSON dumps.
+
+Used by the import_videos command and clean_data.py, so this module must not
+depend on Django. Memory use is bounded by the largest single record, not by
+the file size.
+"""
+import json
+import re
+
+CHUNK_SIZE = 1 << 16
+MAX_RECORD_SIZE = 1 << 24
+
+# A string literal (without its closing quote if the text ends first) or a
+# comma with the whitespace and closing bracket after it.
+_STRING_OR_COMMA = re.compile(r'"(?:[^"\\]|\\.)*(?P<close>")?|,(?P<space>\s*)(?P<bracket>[\}\]])?')
+_WHITESPACE_OR_COMMA = re.compile(r'[\s,]*')
+_DELIMITERS = frozenset(' \t\r\n,]}')
+
+
+def _strip_complete(text, final):
+    """
+    Return (text without trailing commas, held-back tail). Without final, a
+    string or comma that may continue in the next chunk is held back.
+    """
+    out = []
+    last = 0
+    for match in _STRING_OR_COMMA.finditer(text):
+        if match.group().startswith('"'):
+            # Stops short of the closing quote only at the end of the text,
+            # or of the text but a trailing backslash.
+            incomplete = match['close'] is None
+        else:
+            incomplete = match['bracket'] is None and match.end() == len(text)
+        if incomplete and not final:
+            out.append(text[last:match.start()])
+            return ''.join(out), text[match.start():]
+        if match['bracket'] is not None:
+            out.append(text[last:match.start()])
+            out.append(match['space'] + match['bracket'])
+            last = match.end()
+    out.append(text[last:])
+    return ''.join(out), ''
+
+
+def strip_trailing_commas(chunks, max_string_size=MAX_RECORD_SIZE):
+    """
+    Drop commas directly before a closing ] or } from a stream of text chunks.
+
+    Commas inside strings are left alone. A string or comma at the end of a
+    chunk is held back until the next chunk shows how it ends.
+    """
+    carry = ''
+    for chunk in chunks:
+        text, carry = _strip_complete(carry + chunk, final=False)
+        if len(carry) > max_string_size:
+            raise json.JSONDecodeError('Unterminated string', carry, 0)
+        if text:
+            yield text
+    if carry:
+        yield _strip_complete(carry, final=True)[0]
+
+
+def read_chunks(f, chunk_size=CHUNK_SIZE):
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_records(f, chunk_size=CHUNK_SIZE, max_record_size=MAX_RECORD_SIZE,
+                 tolerate_trailing_commas=False):
+    """
+    Yield top-level values from a text file holding a JSON array or NDJSON.
+
+    tolerate_trailing_commas accepts hand-edited exports with a comma before
+    a closing bracket, at about a quarter of the speed.
+
+    Raises json.JSONDecodeError on malformed input (with the position relative
+    to the current buffer) or when one record exceeds max_record_size.
+    """
+    chunks = read_chunks(f, chunk_size)
+    if tolerate_trailing_commas:
+        chunks = strip_trailing_commas(chunks, max_record_size)
+    decoder = json.JSONDecoder()
+
+    buf = ''
+    pos = 0
+    eof = False
+    in_array = None
+
+    def fill():
+        nonlocal buf, pos, eof
+        chunk = ''
+        while not chunk:
+            chunk = next(chunks, None)
+            if chunk is None:
+                eof = True
+                return False
+        buf = buf[pos:] + chunk
+        pos = 0
+        return True
+
+    while True:
+        pos = _WHITESPACE_OR_COMMA.match(buf, pos).end()
+        if pos >= len(buf):
+            if eof or not fill():
+                break
+            continue
+
+        if in_array is None:
+            in_array = buf[pos] == '['
+            if in_array:
+                pos += 1
+            continue
+        if in_array and buf[pos] == ']':
+            break
+
+        try:
+            value, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            # Most likely the record continues in the next chunk; give up
+            # once it is bigger than any sane record.
+            if len(buf) - pos < max_record_size and not eof and fill():
+                continue
+            raise
+        incomplete = end == len(buf) or (
+            not isinstance(value, (dict, list, str)) and buf[end] not in _DELIMITERS
+        )
+        if incomplete and not eof:
+            # A bare number like "4." may continue in the next chunk; decode
+            # again once more text is available.
+            if fill():
+                continue
+        pos = end
+        yield value
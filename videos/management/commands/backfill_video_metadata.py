@@ -0,0 +1,107 @@
+import asyncio
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from telegram.error import TelegramError
+from telegram.ext import ExtBot
+from videos.cache import bump_version
+from videos.models import Video
+from videos.ratelimit import TelegramRateLimiter
+from videos.telegram import video_metadata
+
+METADATA_FIELDS = ['file_unique_id', 'duration', 'width', 'height', 'file_size', 'mime_type', 'thumbnail_file_id']
+
+class Command(BaseCommand):
+    help = (
+        'Fills in Telegram metadata for videos saved before the bot captured it. getFile '
+        'reports neither duration, dimensions nor thumbnail, so each video is sent to the chat '
+        'given by --chat-id with sendVideo, which returns the full Video, and the copy '
+        'is deleted right away. Sends are paced by the bot\'s rate limiter (about one per '
+        'second for a private chat).'
+    )
+
+    def add_arguments(self, parser):
+        # No default: every stored video is posted to this chat.
+        parser.add_argument('--chat-id', type=int, required=True, help='Chat to send the videos through')
+        parser.add_argument('--limit', type=int, default=None, help='Backfill at most this many videos')
+        parser.add_argument('--batch-size', type=int, default=50, help='Videos per database write')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1.')
+        chat_id = options['chat_id']
+        pending = Video.objects.filter(file_unique_id__isnull=True).order_by('id')
+        pending = list(pending.values_list('id', 'telegram_file_id')[:options['limit']])
+        if not pending:
+            self.stdout.write('Every video already has metadata.')
+            return
+
+        self.updated = self.failed = 0
+        batch_size = options['batch_size']
+        # One event loop for the bot across batches; the writes stay on this thread.
+        with asyncio.Runner() as runner:
+            bot = self.build_bot()
+            runner.run(bot.initialize())
+            try:
+                for start in range(0, len(pending), batch_size):
+                    self.save(runner.run(self.fetch_batch(bot, chat_id, pending[start:start + batch_size])))
+            finally:
+                runner.run(bot.shutdown())
+        if self.updated:
+            # bulk_update() sends no signals.
+            bump_version()
+        self.stdout.write(self.style.SUCCESS(
+            f'Backfilled {self.updated} of {len(pending)} videos; {self.failed} failed.'
+        ))
+
+    def build_bot(self):
+        kwargs = {}
+        if settings.TELEGRAM_API_BASE_URL:
+            base_url = settings.TELEGRAM_API_BASE_URL.rstrip('/')
+            kwargs = {'base_url': f"{base_url}/bot", 'base_file_url': f"{base_url}/file/bot"}
+        return ExtBot(settings.TELEGRAM_BOT_TOKEN, rate_limiter=TelegramRateLimiter(), **kwargs)
+
+    async def fetch_batch(self, bot, chat_id, videos):
+        found = {}
+        for pk, file_id in videos:
+            metadata = await self.fetch(bot, chat_id, pk, file_id)
+            if metadata is not None:
+                found[pk] = metadata
+        return found
+
+    async def fetch(self, bot, chat_id, pk, file_id):
+        try:
+            message = await bot.send_video(chat_id, video=file_id, disable_notification=True)
+        except TelegramError as e:
+            self.stderr.write(f'Video {pk}: {e}')
+            self.failed += 1
+            return None
+        try:
+            await bot.delete_message(chat_id, message.message_id)
+        except TelegramError as e:
+            self.stderr.write(f'Video {pk}: could not delete the copy ({e})')
+        if message.video is None:
+            self.stderr.write(f'Video {pk}: Telegram did not return a video')
+            self.failed += 1
+            return None
+        return video_metadata(message.video)
+
+    def save(self, found):
+        if not found:
+            return
+        # The same file saved twice can only keep its file_unique_id once.
+        unique_ids = [metadata['file_unique_id'] for metadata in found.values()]
+        taken = dict(Video.objects.filter(file_unique_id__in=unique_ids).values_list('file_unique_id', 'id'))
+        videos = []
+        now = timezone.now()
+        for pk, metadata in found.items():
+            owner = taken.setdefault(metadata['file_unique_id'], pk)
+            if owner != pk:
+                self.stderr.write(f'Video {pk}: same file as video {owner}; left without metadata')
+                self.failed += 1
+                continue
+            # updated_at moves so sync clients pick up the new fields.
+            videos.append(Video(id=pk, updated_at=now, **metadata))
+        Video.objects.bulk_update(videos, [*METADATA_FIELDS, 'updated_at'])
+        self.updated += len(videos)
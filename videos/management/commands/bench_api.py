@@ -0,0 +1,240 @@
+import json
+import platform
+import shutil
+import statistics
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.urls import reverse
+from ishoratech_backend.metrics import QueryTimer
+from videos.cache import bump_version, categories
+from videos.corpus import generate_corpus
+from videos.models import Category, Video
+
+BASELINE_DIR = Path(__file__).resolve().parents[2] / 'benchmarks'
+WARMUP_REQUESTS = 3
+MEMORY_REQUESTS = 3
+# Differences below these are noise, whatever the ratio.
+LATENCY_NOISE_MS = 2.0
+MEMORY_NOISE_KIB = 64
+
+
+def percentile(quantiles, p):
+    return quantiles[p - 1] * 1000
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmarks the list endpoints in process on synthetic dictionaries of growing '
+        'size (see videos/corpus.py). Builds a throwaway database next to the configured '
+        'one (a temp file for SQLite, <NAME>_bench for Postgres), with the response cache '
+        'off, and reports p50/p95/p99 latency, queries per request, peak memory and '
+        'payload bytes per endpoint and size. Fails if a result regresses past '
+        '--threshold against the committed baseline for the database vendor.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000], help='Videos per corpus')
+        parser.add_argument('--categories', type=int, default=300, help='Categories in every corpus')
+        parser.add_argument('--requests', type=int, default=200, help='Timed requests per endpoint and size')
+        parser.add_argument('--seed', type=int, default=0, help='Corpus seed')
+        parser.add_argument('--output', help='Write the results as JSON to this path')
+        parser.add_argument(
+            '--baseline', help='Baseline to compare with (default: videos/benchmarks/baseline-<vendor>.json)'
+        )
+        parser.add_argument(
+            '--threshold', type=float, default=0.25,
+            help='Allowed relative increase in p50/p95 latency, peak memory and payload bytes'
+        )
+        parser.add_argument('--update-baseline', action='store_true', help='Write the results as the new baseline')
+
+    def handle(self, *args, **options):
+        for name in ('categories', 'requests'):
+            if options[name] < 1:
+                raise CommandError(f'--{name} must be at least 1.')
+        sizes = sorted(set(options['sizes']))
+        if sizes[0] < 1:
+            raise CommandError('--sizes must be positive.')
+
+        baseline_path = Path(options['baseline'] or BASELINE_DIR / f'baseline-{connection.vendor}.json')
+        results = {
+            'vendor': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'seed': options['seed'],
+            'categories': options['categories'],
+            'requests': options['requests'],
+            'results': [],
+        }
+        with self.throwaway_database(), override_settings(
+            CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'bench_api'}},
+            ALLOWED_HOSTS=['testserver'], DEBUG=False, METRICS_SAMPLE_RATE=0,
+            # Read the data version once per corpus, not whenever the TTL
+            # runs out, so query counts don't depend on timing.
+            CACHE_VERSION_TTL=None,
+        ):
+            for size in sizes:
+                started = time.monotonic()
+                generate_corpus(size, options['categories'], options['seed'])
+                # bulk_create() sends no signals.
+                bump_version()
+                categories.invalidate()
+                if connection.vendor == 'postgresql':
+                    # What autovacuum would have done by now on a real table.
+                    with connection.cursor() as cursor:
+                        cursor.execute('ANALYZE')
+                self.stdout.write(f'{size} videos generated in {time.monotonic() - started:.1f}s')
+                for row in self.run_endpoints(size, options['requests']):
+                    results['results'].append(row)
+                    self.report(row)
+
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(results, indent=2) + '\n')
+        if options['update_baseline']:
+            baseline_path.parent.mkdir(parents=True, exist_ok=True)
+            baseline_path.write_text(json.dumps(results, indent=2) + '\n')
+            self.stdout.write(self.style.SUCCESS(f'Baseline written to {baseline_path}'))
+        elif baseline_path.exists():
+            self.compare(results, json.loads(baseline_path.read_text()), options['threshold'], baseline_path)
+        else:
+            self.stdout.write(self.style.WARNING(
+                f'No baseline at {baseline_path}; run with --update-baseline to create one.'
+            ))
+
+    @contextmanager
+    def throwaway_database(self):
+        test_settings = connection.settings_dict['TEST']
+        saved_name = test_settings['NAME']
+        tmpdir = None
+        if connection.vendor == 'sqlite':
+            # On disk: an in-memory database would flatter every query.
+            tmpdir = tempfile.mkdtemp(prefix='bench_api_')
+            test_settings['NAME'] = str(Path(tmpdir) / 'bench.sqlite3')
+        else:
+            test_settings['NAME'] = f"{connection.settings_dict['NAME']}_bench"
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            yield
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            test_settings['NAME'] = saved_name
+            if tmpdir:
+                shutil.rmtree(tmpdir, ignore_errors=True)
+
+    def endpoints(self):
+        """(name, URL, timed requests as a fraction of --requests) per endpoint."""
+        # The largest category and a word from the newest published entry.
+        category_id = (
+            Category.objects.annotate(videos_count=Count('videos')).order_by('-videos_count')
+            .values_list('id', flat=True).first()
+        )
+        term = (
+            Video.objects.filter(is_published=True).order_by('-created_at')
+            .values_list('title_lat', flat=True).first()
+        ).split()[0]
+        videos = reverse('video-list')
+        return [
+            ('videos', f'{videos}?page_size=50', 1),
+            ('videos compact', f'{videos}?page_size=50&version=2&lang=lat', 1),
+            ('videos by category', f'{videos}?page_size=50&category={category_id}', 1),
+            ('categories', reverse('category-list'), 1),
+            ('category videos', f"{reverse('category-videos', args=[category_id])}?page_size=50", 1),
+            ('search', f"{reverse('video-search')}?q={term}", 1),
+            ('sync', f"{reverse('sync')}?limit=500", 1),
+            # The whole published table per request
+            ('export', reverse('video-export'), 1 / 20),
+        ]
+
+    def run_endpoints(self, size, requests):
+        client = Client()
+        for name, url, share in self.endpoints():
+            count = max(3, int(requests * share))
+            for n in range(WARMUP_REQUESTS):
+                self.fetch(client, self.uncached(url, f'w{n}'))
+
+            queries = QueryTimer()
+            latencies = []
+            with connection.execute_wrapper(queries):
+                for n in range(count):
+                    started = time.perf_counter()
+                    size_bytes = self.fetch(client, self.uncached(url, n))
+                    latencies.append(time.perf_counter() - started)
+
+            # Separately: tracing allocations slows every request down.
+            tracemalloc.start()
+            try:
+                peak = 0
+                for n in range(MEMORY_REQUESTS):
+                    tracemalloc.reset_peak()
+                    before = tracemalloc.get_traced_memory()[0]
+                    self.fetch(client, self.uncached(url, f'm{n}'))
+                    peak = max(peak, tracemalloc.get_traced_memory()[1] - before)
+            finally:
+                tracemalloc.stop()
+
+            quantiles = statistics.quantiles(latencies, n=100, method='inclusive')
+            yield {
+                'endpoint': name,
+                'videos': size,
+                'requests': count,
+                'p50_ms': round(percentile(quantiles, 50), 3),
+                'p95_ms': round(percentile(quantiles, 95), 3),
+                'p99_ms': round(percentile(quantiles, 99), 3),
+                'queries': round(queries.count / count, 2),
+                'peak_memory_kib': round(peak / 1024, 1),
+                'bytes': size_bytes,
+            }
+
+    @staticmethod
+    def uncached(url, n):
+        # A parameter the views ignore, so every request misses the response
+        # cache and pays for its version lookup and store as a real miss does.
+        return f"{url}{'&' if '?' in url else '?'}_={n}"
+
+    def fetch(self, client, url):
+        response = client.get(url)
+        if response.status_code != 200:
+            raise CommandError(f'GET {url} answered {response.status_code}.')
+        try:
+            if response.streaming:
+                return sum(len(chunk) for chunk in response.streaming_content)
+            return len(response.content)
+        finally:
+            response.close()
+
+    def report(self, row):
+        self.stdout.write(
+            f"{row['endpoint']:>18} @ {row['videos']:>6}: p50 {row['p50_ms']:8.2f} ms, "
+            f"p95 {row['p95_ms']:8.2f} ms, p99 {row['p99_ms']:8.2f} ms, {row['queries']:g} queries, "
+            f"peak {row['peak_memory_kib']:8.1f} KiB, {row['bytes']} bytes"
+        )
+
+    def compare(self, results, baseline, threshold, baseline_path):
+        expected = {(row['endpoint'], row['videos']): row for row in baseline['results']}
+        regressions = []
+        for row in results['results']:
+            base = expected.get((row['endpoint'], row['videos']))
+            if base is None:
+                continue
+            label = f"{row['endpoint']} @ {row['videos']}"
+            for key, noise in (('p50_ms', LATENCY_NOISE_MS), ('p95_ms', LATENCY_NOISE_MS),
+                               ('peak_memory_kib', MEMORY_NOISE_KIB), ('bytes', 0)):
+                if row[key] > base[key] * (1 + threshold) and row[key] - base[key] > noise:
+                    regressions.append(f'{label}: {key} {base[key]:g} -> {row[key]:g}')
+            # Query counts don't depend on the machine: any increase counts.
+            if row['queries'] > base['queries']:
+                regressions.append(f"{label}: queries {base['queries']:g} -> {row['queries']:g}")
+
+        if regressions:
+            for regression in regressions:
+                self.stderr.write(regression)
+            raise CommandError(f'{len(regressions)} regressions against {baseline_path}.')
+        self.stdout.write(self.style.SUCCESS(f'No regressions against {baseline_path}.'))
@@ -0,0 +1,162 @@
+import asyncio
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test import override_settings
+from telegram import Update
+from videos.fake_telegram import FakeTelegramServer, message_update
+from videos.management.commands.run_bot import Command as BotCommand
+
+# Fake admin ids, far away from real Telegram user ids
+FIRST_USER_ID = 10 ** 12
+
+def add_video_flow(user_id, n):
+    """The updates of one add-video flow, up to the category picker, then /cancel."""
+    yield message_update(user_id, '/addvideo')
+    yield message_update(user_id, video=f'bench_{user_id}_{n}')
+    for text in ('Salom', 'Салом', 'Привет', 'Tavsif', 'Тавсиф', 'skip'):
+        yield message_update(user_id, text)
+    yield message_update(user_id, '/cancel')
+
+class Command(BaseCommand):
+    help = (
+        'Measures the admin bot against a local fake Bot API. "persistence" compares '
+        'per-update latency with and without DB persistence; "handlers" runs DB-heavy '
+        'handlers for several admins at once, on the shared ORM thread and on the '
+        'bounded bot DB pool.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenario', nargs='?', choices=['persistence', 'handlers'], default='persistence')
+        parser.add_argument('--flows', type=int, default=50, help='Add-video flows per mode (persistence)')
+        parser.add_argument('--users', type=int, default=5, help='Admins taking turns (persistence)')
+        parser.add_argument(
+            '--persistence-interval', type=float, default=0.05,
+            help='Seconds between persistence writes (run_bot uses a longer one)'
+        )
+        parser.add_argument('--rounds', type=int, default=20, help='Rounds of concurrent updates (handlers)')
+        parser.add_argument('--concurrency', type=int, default=8, help='Admins per round (handlers)')
+        parser.add_argument(
+            '--threads', type=int, default=None,
+            help='BOT_DB_THREADS to compare with the shared thread (default: the setting, or 4)'
+        )
+        parser.add_argument(
+            '--db-latency', type=float, default=0,
+            help='Milliseconds added to every query, to emulate a database across the network'
+        )
+
+    def handle(self, *args, **options):
+        for name in ('flows', 'users', 'rounds', 'concurrency'):
+            if options[name] < 1:
+                raise CommandError(f'--{name} must be at least 1.')
+        if options['db_latency'] > 0:
+            self.add_db_latency(options['db_latency'] / 1000)
+        users = options['users'] if options['scenario'] == 'persistence' else options['concurrency']
+        user_ids = [FIRST_USER_ID + i for i in range(users)]
+        with FakeTelegramServer() as server, override_settings(
+            TELEGRAM_API_BASE_URL=server.base_url, ADMIN_IDS=user_ids,
+        ):
+            if options['scenario'] == 'persistence':
+                self.bench_persistence(user_ids, options)
+            else:
+                self.bench_handlers(user_ids, options)
+
+    def add_db_latency(self, seconds):
+        def delay(execute, sql, params, many, context):
+            time.sleep(seconds)
+            return execute(sql, params, many, context)
+
+        def install(connection, **kwargs):
+            if delay not in connection.execute_wrappers:
+                connection.execute_wrappers.append(delay)
+
+        # Pool threads open their own connections later.
+        connection_created.connect(install, weak=False)
+        for connection in connections.all():
+            install(connection)
+
+    # --- persistence ---
+    def bench_persistence(self, user_ids, options):
+        results = {}
+        for mode in ('none', 'db'):
+            results[mode] = asyncio.run(self.run_flows(mode, user_ids, options))
+            latencies, writes = results[mode]
+            self.report(mode, latencies, f'{writes} DB write rounds')
+
+        overhead = statistics.mean(results['db'][0]) - statistics.mean(results['none'][0])
+        self.stdout.write(self.style.SUCCESS(f'Persistence overhead: {overhead * 1000:+.3f} ms/update'))
+
+    async def run_flows(self, mode, user_ids, options):
+        bot = BotCommand(stdout=self.stdout, stderr=self.stderr)
+        interval = options['persistence_interval'] if mode == 'db' else None
+        # Without Telegram's flood limits, which would dominate the timings
+        application = bot.build_application(
+            '123:bench', updater=False, persistence_interval=interval, rate_limit=False,
+        )
+        latencies = []
+        await application.initialize()
+        await application.start()
+        try:
+            for n in range(options['flows']):
+                user_id = user_ids[n % len(user_ids)]
+                for data in add_video_flow(user_id, n):
+                    update = Update.de_json(data, application.bot)
+                    started = time.perf_counter()
+                    await application.process_update(update)
+                    latencies.append(time.perf_counter() - started)
+                # Let the persistence timer fire between flows, as it would
+                # between real admin messages.
+                await asyncio.sleep(0)
+        finally:
+            await application.stop()
+            await application.shutdown()
+        writes = application.persistence.writes if application.persistence else 0
+        return latencies, writes
+
+    # --- handlers ---
+    def bench_handlers(self, user_ids, options):
+        threads = options['threads'] or settings.BOT_DB_THREADS or 4
+        for label, count in (('shared thread', 0), (f'{threads} DB threads', threads)):
+            with override_settings(BOT_DB_THREADS=count):
+                latencies, elapsed = asyncio.run(self.run_rounds(user_ids, options))
+            self.report(label, latencies, f'{len(latencies) / elapsed:.0f} updates/sec')
+
+    async def run_rounds(self, user_ids, options):
+        bot = BotCommand(stdout=self.stdout, stderr=self.stderr)
+        application = bot.build_application(
+            '123:bench', updater=False, persistence_interval=None, rate_limit=False,
+        )
+        latencies = []
+
+        async def timed(update):
+            started = time.perf_counter()
+            await application.process_update(update)
+            latencies.append(time.perf_counter() - started)
+
+        await application.initialize()
+        try:
+            # Warm up connections and caches outside the measurement.
+            await timed(Update.de_json(message_update(user_ids[0], '/listvideos'), application.bot))
+            latencies.clear()
+            started = time.perf_counter()
+            for _ in range(options['rounds']):
+                # Every admin opens the video browser at the same moment.
+                await asyncio.gather(*(
+                    timed(Update.de_json(message_update(user_id, '/listvideos'), application.bot))
+                    for user_id in user_ids
+                ))
+            elapsed = time.perf_counter() - started
+        finally:
+            await application.shutdown()
+        return latencies, elapsed
+
+    def report(self, label, latencies, extra):
+        p95 = statistics.quantiles(latencies, n=20)[-1] if len(latencies) > 1 else latencies[0]
+        self.stdout.write(
+            f'{label:>14}: {len(latencies)} updates, mean {statistics.mean(latencies) * 1000:.3f} ms, '
+            f'p95 {p95 * 1000:.3f} ms, {extra}'
+        )
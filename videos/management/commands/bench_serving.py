@@ -0,0 +1,122 @@
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+READY_TIMEOUT = 30
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class Command(BaseCommand):
+    help = (
+        'Compares the web process under SERVER_MODE=wsgi (sync workers) and '
+        'SERVER_MODE=asgi (uvicorn workers, async video list). Starts gunicorn '
+        'with gunicorn.conf.py for each mode against the configured database '
+        'and reports throughput and latency at a fixed number of concurrent clients.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/api/videos/?page_size=50', help='URL path to request')
+        parser.add_argument('--concurrency', type=int, default=32, help='Clients sending requests at once')
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per mode')
+        parser.add_argument('--workers', type=int, default=2, help='WEB_CONCURRENCY for both modes')
+        parser.add_argument(
+            '--bust-cache', action='store_true',
+            help='Add a unique query parameter to every request, so each one misses the response cache'
+        )
+        parser.add_argument('--modes', nargs='+', choices=['wsgi', 'asgi'], default=['wsgi', 'asgi'])
+
+    def handle(self, *args, **options):
+        for name in ('concurrency', 'requests', 'workers'):
+            if options[name] < 1:
+                raise CommandError(f'--{name} must be at least 1.')
+
+        self.stdout.write(
+            f"{options['requests']} requests to {options['path']}, {options['concurrency']} concurrent, "
+            f"{options['workers']} workers{', cache busted' if options['bust_cache'] else ''}"
+        )
+        for mode in options['modes']:
+            port = free_port()
+            server = self.start_server(mode, port, options['workers'])
+            try:
+                base_url = f'http://127.0.0.1:{port}'
+                self.wait_until_ready(server, base_url + options['path'])
+                latencies, errors, elapsed = asyncio.run(self.run_load(base_url, options))
+            finally:
+                server.terminate()
+                server.wait(timeout=10)
+            self.report(mode, latencies, errors, elapsed)
+
+    def start_server(self, mode, port, workers):
+        env = {**os.environ, 'SERVER_MODE': mode, 'WEB_CONCURRENCY': str(workers)}
+        return subprocess.Popen(
+            [
+                sys.executable, '-m', 'gunicorn',
+                '--config', str(settings.BASE_DIR / 'gunicorn.conf.py'),
+                '--bind', f'127.0.0.1:{port}',
+                '--log-level', 'critical',
+            ],
+            cwd=settings.BASE_DIR, env=env,
+        )
+
+    def wait_until_ready(self, server, url):
+        deadline = time.monotonic() + READY_TIMEOUT
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f'gunicorn exited with status {server.returncode}.')
+            try:
+                # Also warms up every worker's connection and the response cache.
+                httpx.get(url, timeout=5).raise_for_status()
+                return
+            except httpx.HTTPError:
+                time.sleep(0.2)
+        raise CommandError(f'gunicorn did not answer {url} within {READY_TIMEOUT}s.')
+
+    async def run_load(self, base_url, options):
+        latencies = []
+        errors = 0
+        remaining = iter(range(options['requests']))
+        separator = '&' if '?' in options['path'] else '?'
+
+        async def client(http):
+            nonlocal errors
+            for n in remaining:
+                path = options['path']
+                if options['bust_cache']:
+                    path = f'{path}{separator}_={time.time_ns()}{n}'
+                started = time.perf_counter()
+                try:
+                    response = await http.get(path)
+                    await response.aread()
+                    if response.status_code != 200:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - started)
+
+        limits = httpx.Limits(max_connections=options['concurrency'])
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as http:
+            started = time.perf_counter()
+            await asyncio.gather(*(client(http) for _ in range(options['concurrency'])))
+            elapsed = time.perf_counter() - started
+        return latencies, errors, elapsed
+
+    def report(self, mode, latencies, errors, elapsed):
+        quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+        self.stdout.write(
+            f'{mode:>5}: {len(latencies) / elapsed:7.1f} req/s, '
+            f'p50 {quantiles[49] * 1000:.1f} ms, p95 {quantiles[94] * 1000:.1f} ms, '
+            f'p99 {quantiles[98] * 1000:.1f} ms, {errors} errors'
+        )
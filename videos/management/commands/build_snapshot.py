@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from videos.snapshot import build_snapshot
+
+class Command(BaseCommand):
+    help = 'Builds a content-hashed, precompressed snapshot of the published dictionary'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep', type=int, default=3, help='Number of bundles to keep on disk')
+
+    def handle(self, *args, **options):
+        pointer = build_snapshot(keep=options['keep'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Snapshot {pointer['hash']}: {pointer['videos']} videos, {pointer['size']} bytes."
+        ))
@@ -0,0 +1,144 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from videos.cache import bump_version
+from videos.fields import FIELD_ALIASES
+from videos.jsonstream import iter_records
+from videos.models import Category, Video
+from videos.search import build_search_key
+
+# is_published only applies to new rows: a re-import must not republish
+# videos an admin took down.
+UPDATE_FIELDS = [*FIELD_ALIASES, 'category', 'search_key', 'updated_at']
+
+
+def field_value(record, field):
+    """The record's value for a Video field, or None if it has none."""
+    value = next((record[key] for key in FIELD_ALIASES[field] if record.get(key) is not None), None)
+    return value.strip() if isinstance(value, str) else value
+
+class Command(BaseCommand):
+    help = 'Bulk imports videos from a JSON array or NDJSON file (e.g. cleaned_data.json)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', help='Path to the JSON or NDJSON dump')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Parse and validate without writing')
+        parser.add_argument('--default-category', default='Uncategorized')
+        parser.add_argument(
+            '--allow-trailing-commas', action='store_true', help='Accept a comma before a closing ] or }'
+        )
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        self.default_category = options['default_category']
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be at least 1.')
+
+        # One query up front; new names are added as batches create them.
+        self.category_ids = dict(Category.objects.values_list('name', 'id'))
+
+        self.started = time.monotonic()
+        self.read = self.written = self.skipped = 0
+        batch = {}
+        try:
+            with open(options['file'], encoding='utf-8') as f:
+                for record in iter_records(f, tolerate_trailing_commas=options['allow_trailing_commas']):
+                    self.read += 1
+                    video = self.build_video(record)
+                    if video is None:
+                        self.skipped += 1
+                        continue
+                    # Later records win; Postgres rejects an upsert batch
+                    # that touches the same row twice.
+                    batch[video.telegram_file_id] = (video, record)
+                    if len(batch) >= batch_size:
+                        self.write_batch(batch)
+                        batch = {}
+                if batch:
+                    self.write_batch(batch)
+        except OSError as e:
+            raise CommandError(f'Cannot read {options["file"]}: {e}')
+        except ValueError as e:
+            raise CommandError(f'Invalid JSON after {self.read} records: {e}')
+
+        if self.written and not self.dry_run:
+            # bulk_create() sends no signals, so invalidate cached responses here.
+            bump_version()
+
+        verb = 'Validated' if self.dry_run else 'Imported'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {self.written} videos ({self.skipped} skipped) in {self.elapsed():.1f}s '
+            f'({self.rate():.0f} rows/sec).'
+        ))
+
+    def build_video(self, record):
+        if not isinstance(record, dict):
+            return None
+        file_id = str(record.get('telegram_file_id') or '').strip()
+        values = {field: field_value(record, field) for field in FIELD_ALIASES}
+        if not file_id or not values['title_lat']:
+            return None
+
+        video = Video(
+            telegram_file_id=file_id,
+            is_published=bool(record.get('is_published', True)),
+            **{field: value for field, value in values.items() if value is not None},
+        )
+        video.search_key = build_search_key(video)
+        return video
+
+    def resolve_categories(self, batch):
+        names = {self.category_name(record) for _, record in batch.values()}
+        missing = names - self.category_ids.keys()
+        if missing and not self.dry_run:
+            Category.objects.bulk_create([Category(name=name) for name in missing], ignore_conflicts=True)
+            self.category_ids.update(Category.objects.filter(name__in=missing).values_list('name', 'id'))
+        for video, record in batch.values():
+            video.category_id = self.category_ids.get(self.category_name(record))
+
+    def category_name(self, record):
+        name = str(record.get('category') or '').strip()
+        # Same apostrophe folding as clean_data.py.
+        return name.replace("’", "'").replace("`", "'") or self.default_category
+
+    def merge_existing(self, batch):
+        """
+        Give records for rows that already exist the stored value of every
+        field they leave out, so a word/definition dump keeps the other
+        scripts, the translations and the category.
+        """
+        existing = Video.objects.filter(telegram_file_id__in=batch.keys())
+        for stored in existing.only('telegram_file_id', 'category', *FIELD_ALIASES):
+            video, record = batch[stored.telegram_file_id]
+            for field in FIELD_ALIASES:
+                if field_value(record, field) is None:
+                    setattr(video, field, getattr(stored, field))
+            if not str(record.get('category') or '').strip():
+                video.category_id = stored.category_id
+            video.search_key = build_search_key(video)
+
+    def write_batch(self, batch):
+        if self.dry_run:
+            self.resolve_categories(batch)
+        else:
+            with transaction.atomic():
+                self.resolve_categories(batch)
+                self.merge_existing(batch)
+                Video.objects.bulk_create(
+                    [video for video, _ in batch.values()],
+                    update_conflicts=True,
+                    unique_fields=['telegram_file_id'],
+                    update_fields=UPDATE_FIELDS,
+                )
+        self.written += len(batch)
+        verb = 'validated' if self.dry_run else 'written'
+        self.stdout.write(f'{self.written} rows {verb}, {self.rate():.0f} rows/sec')
+
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def rate(self):
+        return self.written / max(self.elapsed(), 1e-9)
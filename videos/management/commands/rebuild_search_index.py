@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from videos.cache import bump_version
+from videos.models import Video
+from videos.search import SEARCH_FIELDS, build_search_key, ensure_search_index, rebuild_search_index
+
+class Command(BaseCommand):
+    help = 'Recomputes Video.search_key for every row and rebuilds the full-text index'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        queryset = Video.objects.only('id', 'search_key', *SEARCH_FIELDS).order_by('id')
+
+        updated = 0
+        last_id = 0
+        while True:
+            batch = list(queryset.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            changed = []
+            now = timezone.now()
+            for video in batch:
+                key = build_search_key(video)
+                if key != video.search_key:
+                    # As save() does: the timestamp is what other processes
+                    # read the data version from (see videos/cache.py).
+                    video.search_key, video.updated_at = key, now
+                    changed.append(video)
+            with transaction.atomic():
+                Video.objects.bulk_update(changed, ['search_key', 'updated_at'])
+            updated += len(changed)
+            last_id = batch[-1].id
+
+        # Triggers keep the FTS table in step with updates; a full rebuild
+        # also repairs rows written while the triggers were missing.
+        ensure_search_index()
+        with transaction.atomic():
+            rebuild_search_index()
+
+        # bulk_update() sends no signals, so invalidate cached responses here.
+        bump_version()
+        self.stdout.write(self.style.SUCCESS(f'Search keys updated for {updated} videos.'))
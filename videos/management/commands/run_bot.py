@@ -1,12 +1,24 @@
 import os
 import asyncio
 import logging
+import threading
 from django.core.management.base import BaseCommand
 from django.conf import settings
 from telegram import Update, ReplyKeyboardMarkup, ReplyKeyboardRemove, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ApplicationBuilder, ContextTypes, CommandHandler, MessageHandler, filters, ConversationHandler, CallbackQueryHandler
-from asgiref.sync import sync_to_async
+from telegram.error import BadRequest
+from django.db import IntegrityError
+from django.db.models import Q
+from django.utils import timezone
+from videos.batch import MAX_SHEET_SIZE, SheetError, ingest_batch, parse_sheet
+from videos.cache import bump_version, categories
+from videos.executor import run_in_db_thread
+from videos.instrumentation import InstrumentedRequest, install_query_timing, instrument_handlers, serve_metrics
 from videos.models import Video, Category
+from videos.persistence import DjangoPersistence
+from videos.ratelimit import TelegramRateLimiter
+from videos.telegram import video_metadata
+from videos.updates import PerUserUpdateProcessor
 
 # Enable logging
 logging.basicConfig(
@@ -23,24 +35,168 @@ logger = logging.getLogger(__name__)
 VIDEO, TITLE_LAT, TITLE_KIRIL, TITLE_RU, DESC_LAT, DESC_KIRIL, DESC_RU, CATEGORY, VIDEO_NEW_CATEGORY, CONFIRM = range(10)
 # States for Add Category Conversation
 ADD_CATEGORY_NAME = range(10, 11)
+# States for Batch Upload Conversation
+BATCH_VIDEOS = 11
+# Conversation states as metric labels
+STATE_NAMES = {
+    VIDEO: 'VIDEO', TITLE_LAT: 'TITLE_LAT', TITLE_KIRIL: 'TITLE_KIRIL', TITLE_RU: 'TITLE_RU',
+    DESC_LAT: 'DESC_LAT', DESC_KIRIL: 'DESC_KIRIL', DESC_RU: 'DESC_RU', CATEGORY: 'CATEGORY',
+    VIDEO_NEW_CATEGORY: 'VIDEO_NEW_CATEGORY', CONFIRM: 'CONFIRM',
+    ADD_CATEGORY_NAME: 'ADD_CATEGORY_NAME', BATCH_VIDEOS: 'BATCH_VIDEOS',
+}
+
+# Seconds between batched writes of conversation state to the database
+PERSISTENCE_UPDATE_INTERVAL = 10
+
+# Categories per page in the add-video picker; Telegram allows at most 100
+# inline buttons per keyboard
+CATEGORY_PAGE_SIZE = 8
+
+# Videos per page in the /listvideos browser
+VIDEO_PAGE_SIZE = 10
+
+def load_video_page(page, first_id=None):
+    """
+    Load one browser page, newest first, keyed on the primary key.
+
+    A page is addressed by the id of its first row, so next/prev are keyset
+    range scans. Jumping to a page number with no known first id finds it
+    with an index-only offset over the primary key.
+    """
+    total = Video.objects.count()
+    pages = max(1, -(-total // VIDEO_PAGE_SIZE))
+    page = min(max(page, 1), pages)
+    ids = Video.objects.order_by('-id').values_list('id', flat=True)
+    if first_id is None and page > 1:
+        first_id = ids[(page - 1) * VIDEO_PAGE_SIZE:(page - 1) * VIDEO_PAGE_SIZE + 1].first()
+
+    rows = Video.objects.order_by('-id')
+    if first_id is not None:
+        rows = rows.filter(id__lte=first_id)
+    rows = list(rows.values('id', 'title_lat', 'category__name', 'is_published')[:VIDEO_PAGE_SIZE + 1])
+    if not rows and total:
+        # Everything from first_id on was deleted; show the last page instead.
+        return load_video_page(pages)
+
+    next_id = rows[VIDEO_PAGE_SIZE]['id'] if len(rows) > VIDEO_PAGE_SIZE else None
+    rows = rows[:VIDEO_PAGE_SIZE]
+    prev_id = None
+    if rows:
+        newer = list(ids.filter(id__gt=rows[0]['id']).order_by('id')[:VIDEO_PAGE_SIZE])
+        prev_id = newer[-1] if newer else None
+        # Page numbers drift as rows come and go; pin the ends.
+        if prev_id is None:
+            page = 1
+        elif next_id is None:
+            page = pages
+
+    return {
+        'rows': rows, 'page': page, 'pages': pages, 'total': total,
+        'next_id': next_id, 'prev_id': prev_id,
+    }
+
+def load_category_page(page, prefix=''):
+    """
+    One page of the add-video category picker, from the in-process category cache.
+
+    With a prefix, only categories whose name or any word of it starts with
+    the prefix (case-insensitively) are listed.
+    """
+    matches = categories.all()
+    prefix = prefix.strip().casefold()
+    if prefix:
+        matches = [
+            c for c in matches
+            if any(word.startswith(prefix) for word in [c.name.casefold(), *c.name.casefold().split()])
+        ]
+    pages = max(1, -(-len(matches) // CATEGORY_PAGE_SIZE))
+    page = min(max(page, 1), pages)
+    start = (page - 1) * CATEGORY_PAGE_SIZE
+    return {
+        'rows': matches[start:start + CATEGORY_PAGE_SIZE],
+        'page': page, 'pages': pages, 'total': len(matches),
+    }
+
+def apply_bulk_action(action, ids):
+    """Run a browser bulk action as one query and return the number of videos affected."""
+    videos = Video.objects.filter(id__in=ids)
+    if action == 'delete':
+        # QuerySet.delete() still sends post_delete per row, which records
+        # sync tombstones and invalidates cached responses.
+        _, per_model = videos.delete()
+        return per_model.get(Video._meta.label, 0)
+    if action in ('publish', 'unpublish'):
+        # update() sends no signals: stamp updated_at for sync and
+        # invalidate cached responses by hand.
+        count = videos.update(is_published=(action == 'publish'), updated_at=timezone.now())
+        bump_version()
+        return count
+    raise ValueError(f"Unknown bulk action: {action}")
+
+def build_webhook_application():
+    """Build the bot Application for webhook mode, without a polling Updater."""
+    return Command().build_application(settings.TELEGRAM_BOT_TOKEN, updater=False)
 
 class Command(BaseCommand):
     help = 'Runs the Telegram Bot'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--polling', action='store_true',
+            help='Long-poll for updates even when TELEGRAM_WEBHOOK_URL is set (removes the webhook)'
+        )
+
     def handle(self, *args, **options):
         token = settings.TELEGRAM_BOT_TOKEN
         if not token or token == 'YOUR_BOT_TOKEN':
             self.stdout.write(self.style.ERROR('TELEGRAM_BOT_TOKEN is not set in settings.'))
             return
 
+        if settings.TELEGRAM_WEBHOOK_URL and not options['polling']:
+            # Stay up rather than exit: process managers (the Procfile's bot
+            # process) restart a process that exits, over and over.
+            self.stdout.write(self.style.WARNING(
+                'Webhook mode is active: updates are delivered to the ASGI web process, '
+                'so this process idles. Use --polling to fall back to long polling.'
+            ))
+            try:
+                self.idle()
+            except KeyboardInterrupt:
+                pass
+            return
+
+        if settings.BOT_METRICS_PORT:
+            serve_metrics(settings.BOT_METRICS_PORT)
+            self.stdout.write(f"Serving metrics on port {settings.BOT_METRICS_PORT}")
+
         import asyncio
         try:
             asyncio.run(self.run_bot(token))
         except KeyboardInterrupt:
             self.stdout.write(self.style.SUCCESS('Bot stopped by user.'))
 
-    async def run_bot(self, token):
-        application = ApplicationBuilder().token(token).build()
+    def idle(self):
+        """Block until the process is stopped."""
+        threading.Event().wait()
+
+    def build_application(self, token, updater=True, persistence_interval=PERSISTENCE_UPDATE_INTERVAL,
+                          rate_limit=True):
+        builder = ApplicationBuilder().token(token).concurrent_updates(
+            PerUserUpdateProcessor(settings.BOT_CONCURRENT_UPDATES)
+        ).request(InstrumentedRequest(connection_pool_size=256))
+        if rate_limit:
+            # Replies wait for Telegram's flood limits instead of failing with 429
+            builder = builder.rate_limiter(TelegramRateLimiter())
+        persistent = persistence_interval is not None
+        if persistent:
+            # In-flight flows survive restarts instead of ending in "Session Expired"
+            builder = builder.persistence(DjangoPersistence(update_interval=persistence_interval))
+        if settings.TELEGRAM_API_BASE_URL:
+            base_url = settings.TELEGRAM_API_BASE_URL.rstrip('/')
+            builder = builder.base_url(f"{base_url}/bot").base_file_url(f"{base_url}/file/bot")
+        if not updater:
+            builder = builder.updater(None)
+        application = builder.build()
 
         # Add Video Conversation
         add_video_conv = ConversationHandler(
@@ -56,11 +212,16 @@ class Command(BaseCommand):
                 DESC_LAT: [MessageHandler(filters.TEXT & ~filters.COMMAND, self.receive_desc_lat)],
                 DESC_KIRIL: [MessageHandler(filters.TEXT & ~filters.COMMAND, self.receive_desc_kiril)],
                 DESC_RU: [MessageHandler(filters.TEXT & ~filters.COMMAND, self.receive_desc_ru)],
-                CATEGORY: [CallbackQueryHandler(self.receive_category)],
+                CATEGORY: [
+                    CallbackQueryHandler(self.receive_category),
+                    MessageHandler(filters.TEXT & ~filters.COMMAND, self.filter_categories),
+                ],
                 VIDEO_NEW_CATEGORY: [MessageHandler(filters.TEXT & ~filters.COMMAND, self.receive_new_category_inline)],
                 CONFIRM: [CallbackQueryHandler(self.confirm_save)],
             },
-            fallbacks=[CommandHandler('cancel', self.cancel)]
+            fallbacks=[CommandHandler('cancel', self.cancel)],
+            name='add_video',
+            persistent=persistent,
         )
 
         # Add Category Conversation
@@ -72,24 +233,54 @@ class Command(BaseCommand):
             states={
                 ADD_CATEGORY_NAME: [MessageHandler(filters.TEXT & ~filters.COMMAND, self.receive_new_category)],
             },
-            fallbacks=[CommandHandler('cancel', self.cancel)]
+            fallbacks=[CommandHandler('cancel', self.cancel)],
+            name='add_category',
+            persistent=persistent,
+        )
+
+        # Batch Upload Conversation
+        batch_conv = ConversationHandler(
+            entry_points=[CommandHandler('batchvideos', self.batch_start)],
+            states={
+                BATCH_VIDEOS: [
+                    MessageHandler(filters.VIDEO, self.receive_batch_video),
+                    MessageHandler(filters.Document.ALL, self.receive_batch_sheet),
+                    MessageHandler(filters.TEXT & ~filters.COMMAND, self.batch_hint),
+                ],
+            },
+            fallbacks=[CommandHandler('cancel', self.cancel)],
+            name='batch_videos',
+            persistent=persistent,
         )
 
         application.add_handler(CommandHandler('start', self.start))
         application.add_handler(CommandHandler('listvideos', self.list_videos))
+        application.add_handler(CommandHandler('botstats', self.bot_stats))
         application.add_handler(MessageHandler(filters.Regex('^📋 List Videos$'), self.list_videos))
+        # Before the conversations, whose CallbackQueryHandlers match any data
+        application.add_handler(CallbackQueryHandler(self.browse_videos, pattern=r'^v[ljsb]:'))
         
         application.add_handler(add_video_conv)
         application.add_handler(add_category_conv)
+        application.add_handler(batch_conv)
         
         # Global handler must be last to allow conversations to handle their own callbacks first
         application.add_handler(CallbackQueryHandler(self.handle_callback))
 
+        instrument_handlers(application, STATE_NAMES)
+        install_query_timing()
+        return application
+
+    async def run_bot(self, token):
+        application = self.build_application(token)
+
         self.stdout.write(self.style.SUCCESS('Starting bot...'))
         
         # Manual lifecycle management to avoid initialization errors
         await application.initialize()
         await application.start()
+        # Telegram refuses getUpdates while a webhook is registered
+        await application.bot.delete_webhook()
         await application.updater.start_polling(allowed_updates=Update.ALL_TYPES)
         
         # Keep running until stopped
@@ -107,7 +298,7 @@ class Command(BaseCommand):
         user_id = update.effective_user.id
         if user_id not in settings.ADMIN_IDS:
             self.stdout.write(self.style.WARNING(f"Unauthorized access attempt from User ID: {user_id}"))
-            await update.message.reply_text(f"⛔ You are not authorized. Your ID is: {user_id}")
+            await update.effective_message.reply_text(f"⛔ You are not authorized. Your ID is: {user_id}")
             return False
         return True
 
@@ -134,6 +325,25 @@ class Command(BaseCommand):
             return True
         return False
 
+    async def bot_stats(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        if not await self.is_admin(update): return
+        updates = context.application.update_processor.stats()
+        lines = [
+            "📊 Bot stats",
+            f"Updates: {updates['in_progress']} in progress, {updates['queued']} waiting behind "
+            f"their user's previous update (mean wait {updates['wait_mean_ms']:.0f} ms, "
+            f"max {updates['wait_max_ms']:.0f} ms)",
+        ]
+        rate_limiter = context.bot.rate_limiter
+        if rate_limiter is not None:
+            out = rate_limiter.stats()
+            lines.append(
+                f"Outgoing: {out['queued']} queued (max {out['max_queued']}), {out['sent']} sent, "
+                f"{out['coalesced']} coalesced, {out['retries']} retried after 429 "
+                f"(mean wait {out['wait_mean_ms']:.0f} ms, max {out['wait_max_ms']:.0f} ms)"
+            )
+        await update.message.reply_text("\n".join(lines))
+
     # --- Add Category Flow ---
     async def add_category_start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         if not await self.is_admin(update): return ConversationHandler.END
@@ -147,12 +357,12 @@ class Command(BaseCommand):
             
         category_name = update.message.text
         
-        exists = await sync_to_async(Category.objects.filter(name=category_name).exists)()
+        exists = await Category.objects.filter(name=category_name).aexists()
         if exists:
             await update.message.reply_text(f"Category '{category_name}' already exists.")
             return ConversationHandler.END
 
-        await sync_to_async(Category.objects.create)(name=category_name)
+        await Category.objects.acreate(name=category_name)
         await update.message.reply_text(f"✅ Category '{category_name}' created successfully!")
         return ConversationHandler.END
 
@@ -164,7 +374,19 @@ class Command(BaseCommand):
 
     async def receive_video(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         video = update.message.video
+        # Both columns are unique, so this is an index lookup; it runs before
+        # the admin types nine fields for a video that is already saved.
+        existing = await Video.objects.filter(
+            Q(file_unique_id=video.file_unique_id) | Q(telegram_file_id=video.file_id)
+        ).values_list('title_lat', flat=True).afirst()
+        if existing is not None:
+            await update.message.reply_text(
+                f"⚠️ This video is already in the dictionary as \"{existing}\".\n"
+                "Upload a different video, or /cancel."
+            )
+            return VIDEO
         context.user_data['file_id'] = video.file_id
+        context.user_data['video_metadata'] = video_metadata(video)
         await update.message.reply_text("Video received.\n\n1️⃣ Enter Title (Latin):")
         return TITLE_LAT
 
@@ -203,21 +425,21 @@ class Command(BaseCommand):
         if await self.check_if_menu_command(update, context): return ConversationHandler.END
         text = update.message.text
         context.user_data['desc_ru'] = "" if text.lower() == 'skip' else text
-        
-        # Fetch categories for Inline Keyboard
-        categories = await sync_to_async(list)(Category.objects.all())
-        
-        keyboard = []
-        for c in categories:
-            keyboard.append([InlineKeyboardButton(c.name, callback_data=f"cat_{c.id}")])
-        
-        # Add "New Category" button
-        keyboard.append([InlineKeyboardButton("➕ New Category", callback_data="cat_new")])
-            
-        await update.message.reply_text(
-            "7️⃣ Select a Category or create a new one:",
-            reply_markup=InlineKeyboardMarkup(keyboard)
-        )
+        context.user_data['category_filter'] = ''
+
+        page = await run_in_db_thread(load_category_page, 1)
+        text, reply_markup = self.render_category_page(page, '')
+        await update.message.reply_text(text, reply_markup=reply_markup)
+        return CATEGORY
+
+    async def filter_categories(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        # Typing while the picker is open narrows it to matching names
+        if await self.check_if_menu_command(update, context): return ConversationHandler.END
+        prefix = update.message.text.strip()
+        context.user_data['category_filter'] = prefix
+        page = await run_in_db_thread(load_category_page, 1, prefix)
+        text, reply_markup = self.render_category_page(page, prefix)
+        await update.message.reply_text(text, reply_markup=reply_markup)
         return CATEGORY
 
     async def receive_category(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -230,23 +452,65 @@ class Command(BaseCommand):
         if data == "cat_new":
             await query.edit_message_text("Please enter the name of the new category:")
             return VIDEO_NEW_CATEGORY
+
+        prefix = context.user_data.get('category_filter', '')
+        if data == "catf_clear":
+            prefix = context.user_data['category_filter'] = ''
+            data = "catp_1"
+        if data.startswith("catp_"):
+            page = await run_in_db_thread(load_category_page, int(data.split("_")[1]), prefix)
+            text, reply_markup = self.render_category_page(page, prefix)
+            try:
+                await query.edit_message_text(text, reply_markup=reply_markup)
+            except BadRequest as e:
+                if "not modified" not in str(e).lower():
+                    raise
+            return CATEGORY
             
         if not data.startswith("cat_"):
             return CATEGORY
             
         cat_id = int(data.split("_")[1])
-        category = await sync_to_async(Category.objects.get)(id=cat_id)
+        category = await categories.aget(cat_id)
+        if category is None:
+            page = await run_in_db_thread(load_category_page, 1, prefix)
+            text, reply_markup = self.render_category_page(page, prefix)
+            await query.edit_message_text("⚠️ That category no longer exists.\n\n" + text, reply_markup=reply_markup)
+            return CATEGORY
         context.user_data['category_id'] = category.id
         context.user_data['category_name'] = category.name
 
         return await self.show_confirmation(query, context)
 
+    def render_category_page(self, page, prefix):
+        lines = ["7️⃣ Select a Category or create a new one:"]
+        if prefix:
+            lines.append(f"Filter: \"{prefix}\" ({page['total']} found)")
+        if page['pages'] > 1:
+            lines.append(f"Page {page['page']}/{page['pages']}")
+        if page['total'] > CATEGORY_PAGE_SIZE or prefix:
+            lines.append("Type a few letters to filter.")
+
+        keyboard = [[InlineKeyboardButton(c.name, callback_data=f"cat_{c.id}")] for c in page['rows']]
+        nav = []
+        if page['page'] > 1:
+            nav.append(InlineKeyboardButton("◀️ Prev", callback_data=f"catp_{page['page'] - 1}"))
+        if page['page'] < page['pages']:
+            nav.append(InlineKeyboardButton("Next ▶️", callback_data=f"catp_{page['page'] + 1}"))
+        if nav:
+            keyboard.append(nav)
+        if prefix:
+            keyboard.append([InlineKeyboardButton("✖️ Clear filter", callback_data="catf_clear")])
+        # Add "New Category" button
+        keyboard.append([InlineKeyboardButton("➕ New Category", callback_data="cat_new")])
+        return "\n".join(lines), InlineKeyboardMarkup(keyboard)
+
     async def receive_new_category_inline(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Inline category creation during video upload
         category_name = update.message.text
         
         # Check if exists
-        category, created = await sync_to_async(Category.objects.get_or_create)(name=category_name)
+        category, created = await Category.objects.aget_or_create(name=category_name)
         
         context.user_data['category_id'] = category.id
         context.user_data['category_name'] = category.name
@@ -289,20 +553,35 @@ class Command(BaseCommand):
         query = update.callback_query
         await query.answer()
         
-        if query.data == 'confirm_yes':
-            category = await sync_to_async(Category.objects.get)(id=context.user_data['category_id'])
-            await sync_to_async(Video.objects.create)(
-                title_lat=context.user_data['title_lat'],
-                title_kiril=context.user_data['title_kiril'],
-                title_ru=context.user_data['title_ru'],
-                description_lat=context.user_data['desc_lat'],
-                description_kiril=context.user_data['desc_kiril'],
-                description_ru=context.user_data['desc_ru'],
-                category=category,
-                telegram_file_id=context.user_data['file_id'],
-                is_published=True
-            )
-            await query.edit_message_text("✅ Video saved and published!")
+        # The picker already loaded this category; the cache spares a query
+        category = await categories.aget(context.user_data['category_id'])
+        if query.data == 'confirm_yes' and category is None:
+            await query.edit_message_text("❌ The selected category was deleted. Operation cancelled.")
+        elif query.data == 'confirm_yes':
+            try:
+                await Video.objects.acreate(
+                    title_lat=context.user_data['title_lat'],
+                    title_kiril=context.user_data['title_kiril'],
+                    title_ru=context.user_data['title_ru'],
+                    description_lat=context.user_data['desc_lat'],
+                    description_kiril=context.user_data['desc_kiril'],
+                    description_ru=context.user_data['desc_ru'],
+                    category=category,
+                    telegram_file_id=context.user_data['file_id'],
+                    # Flows started before metadata was captured have none.
+                    **context.user_data.get('video_metadata', {}),
+                    is_published=True
+                )
+            except IntegrityError:
+                # The cache can still list a category deleted from elsewhere;
+                # the foreign key then fails rather than the file id.
+                if await Category.objects.filter(pk=category.id).aexists():
+                    await query.edit_message_text("❌ This video was added meanwhile. Operation cancelled.")
+                else:
+                    categories.invalidate()
+                    await query.edit_message_text("❌ The selected category was deleted. Operation cancelled.")
+            else:
+                await query.edit_message_text("✅ Video saved and published!")
         else:
             await query.edit_message_text("❌ Operation cancelled.")
         
@@ -310,6 +589,79 @@ class Command(BaseCommand):
         await self.show_main_menu(query.message, context)
         return ConversationHandler.END
 
+    # --- Batch Upload Flow ---
+    async def batch_start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        if not await self.is_admin(update): return ConversationHandler.END
+        context.user_data['batch'] = []
+        await update.message.reply_text(
+            "📦 Batch upload\n\n"
+            "1. Forward the videos (albums are fine).\n"
+            "2. Upload a CSV or JSON sheet with the columns title_lat, title_kiril, title_ru, "
+            "description_lat, description_kiril, description_ru and category.\n\n"
+            "Rows match videos by a file_name column, by an index column (1 = first video), "
+            "or else in order. Send /cancel to stop."
+        )
+        return BATCH_VIDEOS
+
+    async def receive_batch_video(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        # Albums arrive as one update per video; stay quiet after the first
+        batch = context.user_data.setdefault('batch', [])
+        video = update.message.video
+        metadata = video_metadata(video)
+        if all(
+            v['file_id'] != video.file_id and v.get('metadata', {}).get('file_unique_id') != video.file_unique_id
+            for v in batch
+        ):
+            batch.append({
+                'file_id': video.file_id,
+                'file_name': video.file_name,
+                'message_id': update.message.message_id,
+                'metadata': metadata,
+            })
+        if len(batch) == 1:
+            await update.message.reply_text("📥 Collecting videos. Upload the sheet when they are all here.")
+        return BATCH_VIDEOS
+
+    async def receive_batch_sheet(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        document = update.message.document
+        if document.file_size and document.file_size > MAX_SHEET_SIZE:
+            await update.message.reply_text("❌ The sheet is too large (1 MB at most).")
+            return BATCH_VIDEOS
+        sheet_file = await document.get_file()
+        content = bytes(await sheet_file.download_as_bytearray())
+        try:
+            rows = parse_sheet(content, document.file_name or '')
+        except SheetError as e:
+            await update.message.reply_text(f"❌ {e}")
+            return BATCH_VIDEOS
+
+        result = await run_in_db_thread(ingest_batch, context.user_data.get('batch', []), rows)
+        if result['errors']:
+            shown = result['errors'][:10]
+            more = len(result['errors']) - len(shown)
+            await update.message.reply_text(
+                "❌ Nothing was saved:\n" + "\n".join(f"• {e}" for e in shown)
+                + (f"\n…and {more} more." if more > 0 else "")
+                + "\n\nFix the sheet and upload it again, or /cancel."
+            )
+            return BATCH_VIDEOS
+
+        summary = f"✅ Saved and published {result['created']} videos in {result['categories']} categories."
+        if result['new_categories']:
+            summary += "\nNew categories: " + ", ".join(result['new_categories'])
+        await update.message.reply_text(summary)
+        context.user_data.clear()
+        await self.show_main_menu(update.message, context)
+        return ConversationHandler.END
+
+    async def batch_hint(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        if await self.check_if_menu_command(update, context): return ConversationHandler.END
+        count = len(context.user_data.get('batch', []))
+        await update.message.reply_text(
+            f"{count} videos received. Forward more videos or upload the sheet; /cancel to stop."
+        )
+        return BATCH_VIDEOS
+
     async def cancel(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("Operation cancelled.")
         context.user_data.clear()
@@ -324,24 +676,109 @@ class Command(BaseCommand):
         reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
         await message.reply_text("Select an option:", reply_markup=reply_markup)
 
-    # --- List & Delete ---
+    # --- Video Browser ---
     async def list_videos(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         if not await self.is_admin(update): return
-        
-        videos = await sync_to_async(list)(Video.objects.all().select_related('category').order_by('-created_at'))
-        if not videos:
+
+        context.user_data['selected_videos'] = set()
+        page = await run_in_db_thread(load_video_page, 1)
+        if not page['rows']:
             await update.message.reply_text("No videos found.")
             return
 
-        await update.message.reply_text("📺 **Video List**:")
-        
-        for v in videos:
-            keyboard = [[InlineKeyboardButton("❌ Delete", callback_data=f"delete_{v.id}")]]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            await update.message.reply_text(
-                f"ID: {v.id}\nTitle: {v.title_lat}\nCategory: {v.category.name}",
-                reply_markup=reply_markup
-            )
+        text, reply_markup = self.render_video_page(page, context.user_data['selected_videos'])
+        await update.message.reply_text(text, reply_markup=reply_markup)
+
+    async def browse_videos(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        # Callback data: vl:<page>:<first id> shows a page, vj:<page> jumps to
+        # one, vs:<id>:<page>:<first id> toggles a selection and
+        # vb:<action>:<page>:<first id> runs a bulk action.
+        query = update.callback_query
+        if not await self.is_admin(update):
+            await query.answer()
+            return
+
+        selected = context.user_data.setdefault('selected_videos', set())
+        kind, *args = query.data.split(":")
+        notice = None
+
+        if kind == "vj":
+            page_number, first_id = int(args[0]), None
+        elif kind == "vs":
+            video_id = int(args[0])
+            selected.symmetric_difference_update({video_id})
+            page_number, first_id = int(args[1]), int(args[2])
+        elif kind == "vb":
+            action = args[0]
+            page_number, first_id = int(args[1]), int(args[2])
+            if action == "delete" and selected:
+                await query.answer()
+                keyboard = [[
+                    InlineKeyboardButton(f"🗑 Yes, delete {len(selected)}", callback_data=f"vb:delete!:{page_number}:{first_id}"),
+                    InlineKeyboardButton("↩️ Back", callback_data=f"vl:{page_number}:{first_id}"),
+                ]]
+                await query.edit_message_text(
+                    f"Delete {len(selected)} selected video(s)? This cannot be undone.",
+                    reply_markup=InlineKeyboardMarkup(keyboard)
+                )
+                return
+            if action == "clear":
+                selected.clear()
+            elif selected:
+                count = await run_in_db_thread(apply_bulk_action, action.rstrip("!"), selected)
+                notice = f"{count} video(s) updated."
+                selected.clear()
+        else:
+            page_number, first_id = int(args[0]), int(args[1])
+
+        await query.answer(notice)
+        page = await run_in_db_thread(load_video_page, page_number, first_id)
+        if not page['rows']:
+            await query.edit_message_text("No videos found.")
+            return
+        text, reply_markup = self.render_video_page(page, selected)
+        try:
+            await query.edit_message_text(text, reply_markup=reply_markup)
+        except BadRequest as e:
+            if "not modified" not in str(e).lower():
+                raise
+
+    def render_video_page(self, page, selected):
+        number, pages, first_id = page['page'], page['pages'], page['rows'][0]['id']
+        lines = [f"📺 Video List — page {number}/{pages} ({page['total']} videos)", ""]
+        keyboard = []
+        for row in page['rows']:
+            status_icon = "" if row['is_published'] else " 🙈"
+            lines.append(f"#{row['id']} {row['title_lat']} · {row['category__name']}{status_icon}")
+            mark = "☑️" if row['id'] in selected else "⬜"
+            keyboard.append([InlineKeyboardButton(
+                f"{mark} #{row['id']} {row['title_lat']}"[:60],
+                callback_data=f"vs:{row['id']}:{number}:{first_id}"
+            )])
+
+        nav = []
+        if page['prev_id'] is not None:
+            nav.append(InlineKeyboardButton("◀️", callback_data=f"vl:{number - 1}:{page['prev_id']}"))
+        nav.append(InlineKeyboardButton(f"{number}/{pages}", callback_data=f"vl:{number}:{first_id}"))
+        if page['next_id'] is not None:
+            nav.append(InlineKeyboardButton("▶️", callback_data=f"vl:{number + 1}:{page['next_id']}"))
+        keyboard.append(nav)
+
+        jumps = sorted({1, number - 2, number - 1, number + 1, number + 2, pages} - {number})
+        jumps = [p for p in jumps if 1 <= p <= pages]
+        if jumps:
+            keyboard.append([InlineKeyboardButton(f"↪ {p}", callback_data=f"vj:{p}") for p in jumps])
+
+        here = f"{number}:{first_id}"
+        if selected:
+            keyboard.append([
+                InlineKeyboardButton(f"🗑 Delete ({len(selected)})", callback_data=f"vb:delete:{here}"),
+                InlineKeyboardButton("✅ Publish", callback_data=f"vb:publish:{here}"),
+                InlineKeyboardButton("🙈 Unpublish", callback_data=f"vb:unpublish:{here}"),
+            ])
+            keyboard.append([InlineKeyboardButton("✖️ Clear selection", callback_data=f"vb:clear:{here}")])
+
+        return "\n".join(lines), InlineKeyboardMarkup(keyboard)
 
     async def handle_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         query = update.callback_query
@@ -354,12 +791,12 @@ class Command(BaseCommand):
         if data.startswith("delete_"):
             video_id = int(data.split("_")[1])
             try:
-                video = await sync_to_async(Video.objects.get)(id=video_id)
-                await sync_to_async(video.delete)()
+                video = await Video.objects.aget(id=video_id)
+                await video.adelete()
                 await query.edit_message_text(text=f"✅ Video '{video.title_lat}' (ID: {video_id}) deleted.")
             except Video.DoesNotExist:
                 await query.edit_message_text(text="❌ Video not found or already deleted.")
-        elif data.startswith("cat_") or data == "cat_new":
+        elif data.startswith(("cat_", "catp_", "catf_")):
             # If we are here, it means the ConversationHandler didn't catch it.
             # This happens if the bot was restarted and the state was lost.
             await query.edit_message_text(
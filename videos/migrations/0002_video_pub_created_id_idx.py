@@ -0,0 +1,17 @@
+# Generated by Django 6.0 on 2026-10-18 10:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='video',
+            index=models.Index(fields=['is_published', 'created_at', 'id'], name='video_pub_created_id_idx'),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 6.0 on 2026-10-18 10:05
+
+from django.db import migrations, models
+
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE videos_video_fts USING fts5(search_key, tokenize='unicode61')",
+    "INSERT INTO videos_video_fts(rowid, search_key) SELECT id, search_key FROM videos_video",
+    """CREATE TRIGGER videos_video_fts_ai AFTER INSERT ON videos_video BEGIN
+        INSERT INTO videos_video_fts(rowid, search_key) VALUES (new.id, new.search_key);
+    END""",
+    """CREATE TRIGGER videos_video_fts_ad AFTER DELETE ON videos_video BEGIN
+        DELETE FROM videos_video_fts WHERE rowid = old.id;
+    END""",
+    """CREATE TRIGGER videos_video_fts_au AFTER UPDATE OF search_key ON videos_video BEGIN
+        DELETE FROM videos_video_fts WHERE rowid = old.id;
+        INSERT INTO videos_video_fts(rowid, search_key) VALUES (new.id, new.search_key);
+    END""",
+]
+
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS videos_video_fts_au",
+    "DROP TRIGGER IF EXISTS videos_video_fts_ad",
+    "DROP TRIGGER IF EXISTS videos_video_fts_ai",
+    "DROP TABLE IF EXISTS videos_video_fts",
+]
+
+POSTGRES_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX video_search_key_tsv_idx ON videos_video USING gin (to_tsvector('simple', search_key))",
+    "CREATE INDEX video_search_key_trgm_idx ON videos_video USING gin (search_key gin_trgm_ops)",
+]
+
+POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS video_search_key_trgm_idx",
+    "DROP INDEX IF EXISTS video_search_key_tsv_idx",
+]
+
+
+def run_statements(statements):
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0002_video_pub_created_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='search_key',
+            field=models.TextField(default='', editable=False),
+        ),
+        migrations.RunPython(
+            run_statements({'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRES_FORWARD}),
+            run_statements({'sqlite': SQLITE_BACKWARD, 'postgresql': POSTGRES_BACKWARD}),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 6.0 on 2026-10-18 10:11
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def remove_duplicate_file_ids(apps, schema_editor):
+    """
+    Keep one video per telegram_file_id, preferring a published one and then
+    the newest, and tombstone the rest so sync clients drop them too.
+    """
+    Video = apps.get_model('videos', 'Video')
+    VideoTombstone = apps.get_model('videos', 'VideoTombstone')
+    file_ids = list(
+        Video.objects.values('telegram_file_id').annotate(rows=Count('id')).filter(rows__gt=1)
+        .values_list('telegram_file_id', flat=True)
+    )
+    for file_id in file_ids:
+        ids = list(
+            Video.objects.filter(telegram_file_id=file_id).order_by('-is_published', '-id')
+            .values_list('id', flat=True)
+        )
+        Video.objects.filter(id__in=ids[1:]).delete()
+        VideoTombstone.objects.bulk_create([VideoTombstone(video_id=pk) for pk in ids[1:]])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0004_updated_at_videotombstone'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_file_ids, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='video',
+            name='telegram_file_id',
+            field=models.CharField(max_length=255, unique=True),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 6.0 on 2026-10-18 10:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0006_botstate'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='video',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['category', 'created_at', 'id'], name='video_cat_pub_created_idx'),
+        ),
+    ]
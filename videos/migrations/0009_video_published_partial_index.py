@@ -0,0 +1,21 @@
+# Generated by Django 6.0 on 2026-10-18 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0008_video_telegram_metadata'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='video',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['created_at', 'id'], name='video_pub_created_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='video',
+            name='video_pub_created_id_idx',
+        ),
+    ]
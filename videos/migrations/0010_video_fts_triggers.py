@@ -0,0 +1,43 @@
+# Generated by Django 6.0 on 2026-10-18 12:40
+
+from django.db import migrations
+
+# 0003 created the SQLite FTS table and its triggers once; every later
+# migration that remakes videos_video dropped the triggers again. Recreate
+# them and refill the table, which also drops entries for videos deleted
+# while the triggers were missing. From here on
+# videos.search.ensure_search_index() recreates them after every migrate.
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS videos_video_fts USING fts5(search_key, tokenize='unicode61')",
+    """CREATE TRIGGER IF NOT EXISTS videos_video_fts_ai AFTER INSERT ON videos_video BEGIN
+        INSERT INTO videos_video_fts(rowid, search_key) VALUES (new.id, new.search_key);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS videos_video_fts_ad AFTER DELETE ON videos_video BEGIN
+        DELETE FROM videos_video_fts WHERE rowid = old.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS videos_video_fts_au AFTER UPDATE OF search_key ON videos_video BEGIN
+        DELETE FROM videos_video_fts WHERE rowid = old.id;
+        INSERT INTO videos_video_fts(rowid, search_key) VALUES (new.id, new.search_key);
+    END""",
+    "DELETE FROM videos_video_fts",
+    "INSERT INTO videos_video_fts(rowid, search_key) SELECT id, search_key FROM videos_video",
+]
+
+
+def run_statements(statements):
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0009_video_published_partial_index'),
+    ]
+
+    operations = [
+        # Backwards, 0003 drops the table and triggers.
+        migrations.RunPython(run_statements({'sqlite': SQLITE_FORWARD}), migrations.RunPython.noop),
+    ]
@@ -1,7 +1,10 @@
 from django.db import models
 
+from .search import build_search_key
+
 class Category(models.Model):
     name = models.CharField(max_length=255, unique=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
@@ -19,9 +22,74 @@ class Video(models.Model):
     description_ru = models.TextField(blank=True, null=True)
     
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='videos')
-    telegram_file_id = models.CharField(max_length=255)
+    telegram_file_id = models.CharField(max_length=255, unique=True)
+    # Telegram's metadata for the file, captured by the bot at upload (or by
+    # backfill_video_metadata). file_unique_id is stable across bots and
+    # messages, unlike telegram_file_id, so it is what duplicates are found by.
+    file_unique_id = models.CharField(max_length=64, unique=True, null=True, blank=True)
+    duration = models.PositiveIntegerField(null=True, blank=True)
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    file_size = models.PositiveBigIntegerField(null=True, blank=True)
+    mime_type = models.CharField(max_length=100, blank=True, default='')
+    thumbnail_file_id = models.CharField(max_length=255, blank=True, default='')
     is_published = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Titles and descriptions folded to one Latin form; see videos/search.py.
+    search_key = models.TextField(default='', editable=False)
 
     def __str__(self):
         return self.title_lat or "Untitled"
+
+    def save(self, *args, **kwargs):
+        self.search_key = build_search_key(self)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'search_key', 'updated_at'}
+        super().save(*args, **kwargs)
+
+    class Meta:
+        indexes = [
+            # Partial rather than led by is_published: SQLite only matches
+            # Django's bare `WHERE is_published` against an index's WHERE clause.
+            # The first serves the video list, the second the category filter
+            # and the per-category counts.
+            models.Index(
+                fields=['created_at', 'id'], condition=models.Q(is_published=True),
+                name='video_pub_created_idx',
+            ),
+            models.Index(
+                fields=['category', 'created_at', 'id'], condition=models.Q(is_published=True),
+                name='video_cat_pub_created_idx',
+            ),
+            models.Index(fields=['updated_at', 'id'], name='video_updated_id_idx'),
+        ]
+
+class VideoTombstone(models.Model):
+    """Records a deleted Video so sync clients can drop it; see videos/sync.py."""
+    video_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Deleted video {self.video_id}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['deleted_at', 'id'], name='tombstone_deleted_id_idx'),
+        ]
+
+class BotState(models.Model):
+    """A pickled admin bot conversation state or user_data entry; see videos/persistence.py."""
+    kind = models.CharField(max_length=64)
+    key = models.CharField(max_length=255)
+    data = models.BinaryField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.kind} {self.key}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'key'], name='botstate_kind_key_uniq'),
+        ]
@@ -0,0 +1,137 @@
+"""
+Database-backed persistence for the admin bot (run_bot).
+
+Conversation states and user_data survive restarts in the BotState table.
+The Application already collects changes and hands them over every
+update_interval seconds. Those changes are buffered here, later values
+overwriting earlier ones for the same entry, and written in one transaction
+per round instead of one write per update.
+
+user_data is loaded lazily, one user at a time, on that user's first update
+after a restart. Conversation states are loaded at startup, because
+ConversationHandler looks them up before any callback runs. Only in-flight
+conversations have rows (ended ones are deleted), so that load stays small.
+"""
+import asyncio
+import json
+import logging
+import pickle
+
+from django.db import transaction
+from telegram.ext import BasePersistence, PersistenceInput
+
+from .executor import run_in_db_thread
+from .models import BotState
+
+logger = logging.getLogger(__name__)
+
+USER_DATA = 'user_data'
+CONVERSATION = 'conversation:'
+
+
+class DjangoPersistence(BasePersistence):
+    def __init__(self, update_interval=10):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+        # (kind, key) -> pickled data, or None to delete the row
+        self._pending = {}
+        self._writer = None
+        self._loaded_users = set()
+        self.writes = 0
+
+    # --- Loading ---
+    async def get_user_data(self):
+        return {}
+
+    async def refresh_user_data(self, user_id, user_data):
+        if user_id in self._loaded_users:
+            return
+        self._loaded_users.add(user_id)
+        stored = BotState.objects.filter(kind=USER_DATA, key=str(user_id))
+        data = await stored.values_list('data', flat=True).afirst()
+        for key, value in (pickle.loads(data) if data is not None else {}).items():
+            user_data.setdefault(key, value)
+
+    async def get_conversations(self, name):
+        rows = BotState.objects.filter(kind=CONVERSATION + name).values_list('key', 'data')
+        return {tuple(json.loads(key)): pickle.loads(data) async for key, data in rows}
+
+    # --- Buffered writes ---
+    async def update_user_data(self, user_id, data):
+        # Cleared user_data (the end of every flow) needs no row.
+        self._buffer(USER_DATA, str(user_id), data or None)
+
+    async def drop_user_data(self, user_id):
+        self._buffer(USER_DATA, str(user_id), None)
+
+    async def update_conversation(self, name, key, new_state):
+        self._buffer(CONVERSATION + name, json.dumps(list(key)), new_state)
+
+    def _buffer(self, kind, key, value):
+        self._pending[(kind, key)] = None if value is None else pickle.dumps(value)
+        # The Application calls the update methods for one round together;
+        # the writer task runs after all of them and writes the lot.
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.create_task(self._write_pending())
+
+    async def _write_pending(self):
+        while self._pending:
+            batch, self._pending = self._pending, {}
+            try:
+                await run_in_db_thread(self._write, batch)
+            except Exception:
+                logger.exception("Writing %s bot state entries failed; retrying next round", len(batch))
+                # Keep anything newer that arrived while the write ran.
+                self._pending = {**batch, **self._pending}
+                return
+
+    def _write(self, batch):
+        upserts = [
+            BotState(kind=kind, key=key, data=data)
+            for (kind, key), data in batch.items() if data is not None
+        ]
+        deletes = [(kind, key) for (kind, key), data in batch.items() if data is None]
+        with transaction.atomic():
+            if upserts:
+                BotState.objects.bulk_create(
+                    upserts, update_conflicts=True,
+                    unique_fields=['kind', 'key'], update_fields=['data', 'updated_at'],
+                )
+            for kind in {kind for kind, _ in deletes}:
+                BotState.objects.filter(kind=kind, key__in=[key for k, key in deletes if k == kind]).delete()
+        self.writes += 1
+
+    async def flush(self):
+        if self._writer is not None:
+            await self._writer
+        await self._write_pending()
+
+    # --- Not stored ---
+    async def get_chat_data(self):
+        return {}
+
+    async def get_bot_data(self):
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def update_chat_data(self, chat_id, data):
+        pass
+
+    async def update_bot_data(self, data):
+        pass
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def drop_chat_data(self, chat_id):
+        pass
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        pass
+
+    async def refresh_bot_data(self, bot_data):
+        pass
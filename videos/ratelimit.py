@@ -0,0 +1,170 @@
+"""
+Outbound rate limiting for the admin bot, below Telegram's flood limits.
+
+Every request addressed to a chat first takes a token from that chat's
+bucket, then one from the global bucket. The limits are about 1 message a
+second per private chat (short bursts are tolerated), 20 a minute per group,
+and 30 a second overall. Requests wait in FIFO order instead of failing.
+An edit of a message that a newer edit of the same message overtakes while
+waiting is dropped, and the caller gets the newer edit's result. A 429
+that gets through anyway pauses all requests for the advertised time, and
+then the request is retried.
+"""
+import asyncio
+import datetime
+import time
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+# Endpoints where only the latest request per message matters
+COALESCED_ENDPOINTS = frozenset({'editMessageText', 'editMessageReplyMarkup', 'editMessageCaption'})
+MAX_IDLE_BUCKETS = 1000
+
+
+class TokenBucket:
+    """Refills `rate` tokens a second up to `capacity`; acquire() waits in FIFO order."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        async with self._lock:
+            self._refill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+    def release(self):
+        """Give back a token that was acquired but not used."""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + 1)
+
+    def idle(self):
+        self._refill()
+        return self.tokens >= self.capacity and not self._lock.locked()
+
+
+class TelegramRateLimiter(BaseRateLimiter):
+    def __init__(self, global_rate=30, private_rate=1, private_burst=5,
+                 group_rate=20 / 60, group_burst=3, max_retries=3):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.private_limits = (private_rate, private_burst)
+        self.group_limits = (group_rate, group_burst)
+        self.max_retries = max_retries
+        self._chat_buckets = {}
+        self._latest = {}
+        self._paused_until = 0
+        self.queued = self.max_queued = 0
+        self.sent = self.coalesced = self.retries = self.waits = 0
+        self.wait_total = self.wait_max = 0.0
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def chat_bucket(self, chat_id):
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) >= MAX_IDLE_BUCKETS:
+                self._chat_buckets = {k: b for k, b in self._chat_buckets.items() if not b.idle()}
+            # Group and channel ids are negative (or @usernames).
+            private = isinstance(chat_id, int) and chat_id > 0
+            bucket = TokenBucket(*(self.private_limits if private else self.group_limits))
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        chat_id = data.get('chat_id')
+        if chat_id is None:
+            # Not a message to a chat (answerCallbackQuery, getFile, ...)
+            return await self._send(callback, args, kwargs)
+
+        key = None
+        if endpoint in COALESCED_ENDPOINTS and data.get('message_id') is not None:
+            key = (endpoint, chat_id, data['message_id'])
+        result = asyncio.get_running_loop().create_future()
+        if key is not None:
+            self._latest[key] = result
+        try:
+            value = await self._queue(chat_id, key, result, callback, args, kwargs)
+        except BaseException as e:
+            # Superseded edits may be waiting on this one.
+            if isinstance(e, Exception):
+                result.set_exception(e)
+                result.exception()
+            else:
+                result.cancel()
+            raise
+        finally:
+            if key is not None and self._latest.get(key) is result:
+                del self._latest[key]
+        result.set_result(value)
+        return value
+
+    async def _queue(self, chat_id, key, result, callback, args, kwargs):
+        arrived = time.monotonic()
+        self.queued += 1
+        self.max_queued = max(self.max_queued, self.queued)
+        try:
+            bucket = self.chat_bucket(chat_id)
+            await bucket.acquire()
+            latest = self._latest.get(key, result) if key is not None else result
+            if latest is not result:
+                # A newer edit of the same message is queued; it replaces this one.
+                bucket.release()
+                self.coalesced += 1
+            else:
+                await self.global_bucket.acquire()
+        finally:
+            self.queued -= 1
+
+        if latest is not result:
+            return await asyncio.shield(latest)
+        waited = time.monotonic() - arrived
+        self.waits += 1
+        self.wait_total += waited
+        self.wait_max = max(self.wait_max, waited)
+        return await self._send(callback, args, kwargs)
+
+    async def _send(self, callback, args, kwargs):
+        for attempt in range(self.max_retries + 1):
+            delay = self._paused_until - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            try:
+                value = await callback(*args, **kwargs)
+                self.sent += 1
+                return value
+            except RetryAfter as e:
+                if attempt == self.max_retries:
+                    raise
+                self.retries += 1
+                retry_after = e.retry_after
+                if isinstance(retry_after, datetime.timedelta):
+                    retry_after = retry_after.total_seconds()
+                # The flood limit applies to the whole bot, not just this request.
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+
+    def stats(self):
+        return {
+            'queued': self.queued,
+            'max_queued': self.max_queued,
+            'sent': self.sent,
+            'coalesced': self.coalesced,
+            'retries': self.retries,
+            'wait_mean_ms': self.wait_total / max(self.waits, 1) * 1000,
+            'wait_max_ms': self.wait_max * 1000,
+        }
@@ -0,0 +1,56 @@
+"""
+Renderers for the video lists, negotiated through Accept.
+
+FastJSONRenderer produces the same bytes as DRF's JSONRenderer (compact,
+UTF-8) with orjson, which is several times faster on these flat rows.
+MessagePackRenderer answers Accept: application/msgpack. Both libraries are
+optional: without orjson the JSON renderer falls back to DRF's encoder, and
+without msgpack the MessagePack renderer is not offered.
+"""
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.settings import api_settings
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Indented output for ?indent= or Accept parameters stays with DRF.
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            return orjson.dumps(data)
+        except TypeError:
+            # Lazy translations and other types only DRF's encoder knows.
+            return super().render(data, accepted_media_type, renderer_context)
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=str)
+
+
+def video_list_renderers():
+    """Renderer classes for the list views, MessagePack only when available."""
+    renderers = [FastJSONRenderer]
+    renderers += [r for r in api_settings.DEFAULT_RENDERER_CLASSES if not issubclass(r, JSONRenderer)]
+    if msgpack is not None:
+        renderers.append(MessagePackRenderer)
+    return renderers
@@ -0,0 +1,138 @@
+"""
+Script-aware search over Video titles and descriptions.
+
+Every video carries a ``search_key``: its titles and descriptions folded to
+one lowercase Latin form. Cyrillic is transliterated with the Uzbek
+Cyrillic->Latin table and all apostrophe variants (’ ‘ ` ʻ ʼ ') are dropped.
+"o‘zbek", "o'zbek" and "ўзбек" all fold to "ozbek", so one query matches
+every script. Queries go through the same folding before they hit the index:
+FTS5 on SQLite, to_tsvector/pg_trgm GIN indexes on Postgres (see migration
+0003_video_search_key).
+
+SQLite drops a table's triggers whenever a migration remakes it, so besides
+migrations 0003 and 0010 the FTS table and its triggers are (re)created after
+every migrate by ensure_search_index().
+"""
+import re
+
+from django.db import connection, connections
+
+SEARCH_FIELDS = (
+    'title_lat', 'title_kiril', 'title_ru',
+    'description_lat', 'description_kiril', 'description_ru',
+)
+
+VIDEO_TABLE = 'videos_video'
+FTS_TABLE = 'videos_video_fts'
+
+SQLITE_INDEX = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(search_key, tokenize='unicode61')",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {VIDEO_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, search_key) VALUES (new.id, new.search_key);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {VIDEO_TABLE} BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF search_key ON {VIDEO_TABLE} BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+        INSERT INTO {FTS_TABLE}(rowid, search_key) VALUES (new.id, new.search_key);
+    END""",
+]
+
+APOSTROPHES = "'’‘`ʻʼ"
+
+CYRILLIC_TO_LATIN = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'yo',
+    'ж': 'j', 'з': 'z', 'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm',
+    'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u',
+    'ф': 'f', 'х': 'x', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'sh', 'ъ': '',
+    'ы': 'i', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya',
+    # Uzbek-specific letters; their Latin forms lose the apostrophe below.
+    'ў': 'o', 'қ': 'q', 'ғ': 'g', 'ҳ': 'h',
+}
+
+_TRANSLATION = str.maketrans({
+    **CYRILLIC_TO_LATIN,
+    **{mark: '' for mark in APOSTROPHES},
+})
+_NON_WORD = re.compile(r'[\W_]+')
+
+
+def tokenize(text):
+    """Fold text to lowercase Latin tokens."""
+    if not text:
+        return []
+    return _NON_WORD.sub(' ', text.lower().translate(_TRANSLATION)).split()
+
+
+def build_search_key(video):
+    """Return the normalized search key for a Video (or any object with SEARCH_FIELDS)."""
+    tokens = {}
+    for field in SEARCH_FIELDS:
+        for token in tokenize(getattr(video, field)):
+            tokens.setdefault(token, None)
+    return ' '.join(tokens)
+
+
+def ensure_search_index(using='default'):
+    """Create the SQLite FTS table and triggers if missing; no-op elsewhere."""
+    conn = connections[using]
+    if conn.vendor != 'sqlite':
+        return
+    with conn.cursor() as cursor:
+        tables = conn.introspection.table_names(cursor)
+        if VIDEO_TABLE not in tables:
+            return
+        columns = {c.name for c in conn.introspection.get_table_description(cursor, VIDEO_TABLE)}
+        if 'search_key' not in columns:
+            return
+        for statement in SQLITE_INDEX:
+            cursor.execute(statement)
+        if FTS_TABLE not in tables:
+            rebuild_search_index(using)
+
+
+def rebuild_search_index(using='default'):
+    """Repopulate the SQLite FTS table from search_key; no-op elsewhere."""
+    conn = connections[using]
+    if conn.vendor != 'sqlite':
+        return
+    with conn.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(f"INSERT INTO {FTS_TABLE}(rowid, search_key) SELECT id, search_key FROM {VIDEO_TABLE}")
+
+
+def search_video_ids(query, limit):
+    """Return ids of published videos matching every token of query, best first."""
+    tokens = tokenize(query)
+    if not tokens:
+        return []
+
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            match = ' '.join(f'"{token}"*' for token in tokens)
+            cursor.execute(
+                f"SELECT v.id FROM {FTS_TABLE} f JOIN {VIDEO_TABLE} v ON v.id = f.rowid "
+                f"WHERE {FTS_TABLE} MATCH %s AND v.is_published "
+                f"ORDER BY f.rank, v.created_at DESC LIMIT %s",
+                [match, limit],
+            )
+        elif connection.vendor == 'postgresql':
+            tsquery = ' & '.join(f'{token}:*' for token in tokens)
+            phrase = ' '.join(tokens)
+            cursor.execute(
+                f"SELECT id FROM {VIDEO_TABLE} "
+                f"WHERE is_published AND (to_tsvector('simple', search_key) @@ to_tsquery('simple', %s) "
+                f"OR search_key %% %s) "
+                f"ORDER BY ts_rank(to_tsvector('simple', search_key), to_tsquery('simple', %s)) DESC, "
+                f"similarity(search_key, %s) DESC, created_at DESC LIMIT %s",
+                [tsquery, phrase, tsquery, phrase, limit],
+            )
+        else:
+            where = ' AND '.join(['search_key LIKE %s'] * len(tokens))
+            cursor.execute(
+                f"SELECT id FROM {VIDEO_TABLE} WHERE is_published AND {where} "
+                f"ORDER BY created_at DESC LIMIT %s",
+                [*(f'%{token}%' for token in tokens), limit],
+            )
+        return [row[0] for row in cursor.fetchall()]
@@ -1,5 +1,6 @@
 from rest_framework import serializers
-from .models import Video
+from rest_framework.exceptions import ValidationError
+from .models import Category, Video
 
 class VideoSerializer(serializers.ModelSerializer):
     word_lat = serializers.CharField(source='title_lat')
@@ -15,5 +16,81 @@ class VideoSerializer(serializers.ModelSerializer):
         fields = [
             'word_lat', 'word_kiril', 'word_ru',
             'definition_lat', 'definition_kiril', 'definition_ru',
-            'category', 'telegram_file_id'
+            'category', 'telegram_file_id',
+            'file_unique_id', 'duration', 'width', 'height', 'file_size', 'mime_type', 'thumbnail_file_id',
         ]
+
+class CategorySerializer(serializers.ModelSerializer):
+    video_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Category
+        fields = ['id', 'name', 'video_count']
+
+# Column -> response key for the values()-based fast path used by list views.
+# Must stay in step with VideoSerializer.Meta.fields, which it mirrors.
+VIDEO_VALUES_FIELDS = {
+    'title_lat': 'word_lat',
+    'title_kiril': 'word_kiril',
+    'title_ru': 'word_ru',
+    'description_lat': 'definition_lat',
+    'description_kiril': 'definition_kiril',
+    'description_ru': 'definition_ru',
+    'category__name': 'category',
+    'telegram_file_id': 'telegram_file_id',
+    'file_unique_id': 'file_unique_id',
+    'duration': 'duration',
+    'width': 'width',
+    'height': 'height',
+    'file_size': 'file_size',
+    'mime_type': 'mime_type',
+    'thumbnail_file_id': 'thumbnail_file_id',
+}
+
+VIDEO_LANGUAGES = ('lat', 'kiril', 'ru')
+
+def select_video_fields(params):
+    """
+    Return the part of VIDEO_VALUES_FIELDS a list request asks for.
+
+    ?lang=lat|kiril|ru keeps one script's word and definition and
+    ?fields=<key>,... keeps the named response keys. Callers select only
+    the returned columns.
+    """
+    fields = VIDEO_VALUES_FIELDS
+    lang = params.get('lang')
+    if lang:
+        if lang not in VIDEO_LANGUAGES:
+            raise ValidationError({'lang': f"Expected one of: {', '.join(VIDEO_LANGUAGES)}."})
+        other = tuple(f'_{code}' for code in VIDEO_LANGUAGES if code != lang)
+        fields = {column: key for column, key in fields.items() if not key.endswith(other)}
+    requested = params.get('fields')
+    if requested:
+        keys = {key.strip() for key in requested.split(',') if key.strip()}
+        unknown = keys - set(VIDEO_VALUES_FIELDS.values())
+        if unknown:
+            raise ValidationError({'fields': f"Unknown fields: {', '.join(sorted(unknown))}."})
+        fields = {column: key for column, key in fields.items() if key in keys}
+    return fields
+
+def serialize_video_values(rows, fields=VIDEO_VALUES_FIELDS):
+    """Map rows from .values(*fields) to the VideoSerializer shape."""
+    items = fields.items()
+    return [{key: row[column] for column, key in items} for row in rows]
+
+def serialize_video_values_compact(rows, fields=VIDEO_VALUES_FIELDS):
+    """
+    The compact (version 2) list shape: each row an array in `fields` order.
+
+    The category is sent as an id into a `categories` map, so each name is
+    sent once per page; rows then need a category_id column as well.
+    """
+    columns = ['category_id' if column == 'category__name' else column for column in fields]
+    categories = {}
+    if 'category__name' in fields:
+        categories = {str(row['category_id']): row['category__name'] for row in rows}
+    return {
+        'fields': list(fields.values()),
+        'categories': categories,
+        'rows': [[row[column] for column in columns] for row in rows],
+    }
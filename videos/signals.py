@@ -0,0 +1,39 @@
+from django.db.models.signals import post_delete, post_migrate, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .cache import bump_version, categories
+from .models import Category, Video, VideoTombstone
+from .search import ensure_search_index
+
+
+@receiver(post_save, sender=Video)
+@receiver(post_delete, sender=Video)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_cached_responses(sender, **kwargs):
+    bump_version()
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_cache(sender, **kwargs):
+    categories.invalidate()
+
+
+@receiver(post_delete, sender=Video)
+def record_tombstone(sender, instance, **kwargs):
+    VideoTombstone.objects.create(video_id=instance.id)
+
+
+@receiver(post_save, sender=Category)
+def touch_category_videos(sender, instance, created, **kwargs):
+    # Videos inline the category name, so a rename must reach sync clients.
+    if not created:
+        Video.objects.filter(category=instance).update(updated_at=timezone.now())
+
+
+@receiver(post_migrate)
+def create_search_index(sender, using, **kwargs):
+    if sender.name == 'videos':
+        ensure_search_index(using)
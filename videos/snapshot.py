@@ -0,0 +1,267 @@
+"""
+Precompressed, content-hashed snapshots of the published dictionary.
+
+build_snapshot() streams every published video, grouped by category, into
+STATIC_ROOT/snapshots/dictionary.<hash>.json with .gz and .br siblings, then
+points STATIC_ROOT/snapshots/latest.json at it. Every file is written to a
+temp file and renamed into place, so readers never see a partial bundle.
+SnapshotWhiteNoiseMiddleware serves the bundles with far-future cache
+headers, including ones built after the web process started.
+
+Bundles are built by the web process, which serves them: the pointer records
+the data version (videos/cache.py) it was built from, and /api/snapshot/latest
+starts a rebuild in the background once that version is out of date. The bot
+may run on another machine with a filesystem of its own.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from .cache import get_version
+from .models import Video
+from .serializers import VIDEO_VALUES_FIELDS, serialize_video_values
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+SNAPSHOT_SUBDIR = 'snapshots'
+POINTER_NAME = 'latest.json'
+BUNDLE_NAME = re.compile(r'dictionary\.[0-9a-f]{16}\.json')
+CHUNK_SIZE = 2000
+
+logger = logging.getLogger(__name__)
+_rebuild_lock = threading.Lock()
+
+
+def snapshot_dir():
+    return Path(settings.STATIC_ROOT) / SNAPSHOT_SUBDIR
+
+
+def _dump(value):
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+
+def iter_bundle_chunks(stats):
+    """Yield the bundle JSON in pieces, counting videos into stats['videos']."""
+    rows = (
+        Video.objects.filter(is_published=True)
+        .order_by('category__name', 'category_id', 'id')
+        .values('id', 'category_id', *VIDEO_VALUES_FIELDS)
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+    yield '{"categories":['
+    current = None
+    for row in rows:
+        item = serialize_video_values([row])[0]
+        name = item.pop('category')
+        if row['category_id'] != current:
+            if current is not None:
+                yield ']},'
+            current = row['category_id']
+            yield f'{{"id":{current},"name":{_dump(name)},"videos":['
+            separator = ''
+        yield separator + _dump({'id': row['id'], **item})
+        separator = ','
+        stats['videos'] += 1
+    if current is not None:
+        yield ']}'
+    yield ']}'
+
+
+def _atomic_write(path, write):
+    """Call write(fileobj) on a temp file in path's directory, then rename it over path."""
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f'.{path.name}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def build_snapshot(keep=3):
+    """Build a snapshot bundle if the data changed and return the pointer dict."""
+    directory = snapshot_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    # Read first: a write during the build leaves the pointer out of date.
+    version = get_version()
+
+    digest = hashlib.sha256()
+    stats = {'videos': 0}
+    fd, raw = tempfile.mkstemp(dir=directory, prefix='.bundle.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in iter_bundle_chunks(stats):
+                data = chunk.encode('utf-8')
+                digest.update(data)
+                f.write(data)
+        os.chmod(raw, 0o644)
+
+        bundle_hash = digest.hexdigest()[:16]
+        bundle = directory / f'dictionary.{bundle_hash}.json'
+        if bundle.exists():
+            # Unchanged data; refresh the mtime so pruning keeps it.
+            os.utime(bundle)
+        else:
+            # Compressed variants land first so WhiteNoise never sees the
+            # bundle without them.
+            _atomic_write(bundle.with_name(bundle.name + '.gz'), lambda out: _gzip(raw, out))
+            if brotli is not None:
+                _atomic_write(bundle.with_name(bundle.name + '.br'), lambda out: _brotli(raw, out))
+            os.replace(raw, bundle)
+    finally:
+        if os.path.exists(raw):
+            os.unlink(raw)
+
+    pointer = {
+        'hash': bundle_hash,
+        'path': f'{SNAPSHOT_SUBDIR}/{bundle.name}',
+        'size': bundle.stat().st_size,
+        'videos': stats['videos'],
+        'generated_at': timezone.now().isoformat(),
+        'version': version,
+    }
+    _atomic_write(directory / POINTER_NAME, lambda out: out.write(_dump(pointer).encode('utf-8')))
+    prune_snapshots(keep)
+    return pointer
+
+
+def is_stale(pointer):
+    """Whether the data changed since the snapshot behind pointer was built (or there is none)."""
+    return pointer is None or pointer.get('version') != get_version()
+
+
+def schedule_rebuild(keep=3):
+    """
+    Build a snapshot on a background thread, unless this process is already
+    building one. Returns whether a build was started.
+    """
+    if not _rebuild_lock.acquire(blocking=False):
+        return False
+
+    def rebuild():
+        try:
+            pointer = build_snapshot(keep)
+            logger.info("Snapshot %s rebuilt with %s videos", pointer['hash'], pointer['videos'])
+        except Exception:
+            logger.exception("Snapshot rebuild failed")
+        finally:
+            connections.close_all()
+            _rebuild_lock.release()
+
+    threading.Thread(target=rebuild, name='snapshot-rebuild', daemon=True).start()
+    return True
+
+
+def _gzip(source, out):
+    with open(source, 'rb') as f, gzip.GzipFile(fileobj=out, mode='wb', compresslevel=9, mtime=0) as gz:
+        shutil.copyfileobj(f, gz)
+
+
+def _brotli(source, out):
+    compressor = brotli.Compressor(mode=brotli.MODE_TEXT)
+    with open(source, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 16), b''):
+            out.write(compressor.process(block))
+    out.write(compressor.finish())
+
+
+def prune_snapshots(keep):
+    """Delete all but the newest `keep` bundles (and their compressed variants)."""
+    bundles = sorted(
+        (p for p in snapshot_dir().iterdir() if BUNDLE_NAME.fullmatch(p.name)),
+        key=lambda p: p.stat().st_mtime,
+        reverse=True,
+    )
+    for bundle in bundles[keep:]:
+        for suffix in ('.gz', '.br', ''):
+            bundle.with_name(bundle.name + suffix).unlink(missing_ok=True)
+
+
+def read_pointer():
+    try:
+        with open(snapshot_dir() / POINTER_NAME, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+class SnapshotWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise that also serves snapshot bundles built after startup.
+
+    Without autorefresh WhiteNoise only knows the files it scanned at startup.
+    Bundles are content-hashed and never change once written, so any that
+    turn up later are added to the file table on first request and marked
+    immutable, and pruned ones are dropped from it again.
+
+    Unlike WhiteNoise's own middleware it also runs natively under ASGI, so
+    async views below it are not pushed onto a thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings)
+        self.async_mode = iscoroutinefunction(self.get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    @property
+    def snapshot_prefix(self):
+        # A property because WhiteNoise calls immutable_file_test() while
+        # scanning STATIC_ROOT in __init__.
+        return f'{self.static_prefix}{SNAPSHOT_SUBDIR}/'
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self.autorefresh and request.path_info.startswith(self.snapshot_prefix):
+            self.update_snapshot_file(request.path_info)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            path = request.path_info
+            if path.startswith(self.snapshot_prefix):
+                await sync_to_async(self.update_snapshot_file)(path)
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            # Opens and stats the file.
+            return await sync_to_async(self.serve)(static_file, request)
+        return await self.get_response(request)
+
+    def update_snapshot_file(self, url):
+        """Add a bundle built since startup to the file table, or drop one pruned since."""
+        name = url[len(self.snapshot_prefix):]
+        if not BUNDLE_NAME.fullmatch(name):
+            return
+        path = snapshot_dir() / name
+        if not path.is_file():
+            self.files.pop(url, None)
+        elif url not in self.files:
+            self.add_file_to_dictionary(url, str(path))
+
+    def immutable_file_test(self, path, url):
+        if url.startswith(self.snapshot_prefix) and BUNDLE_NAME.fullmatch(url[len(self.snapshot_prefix):]):
+            return True
+        return super().immutable_file_test(path, url)
@@ -0,0 +1,152 @@
+"""
+Video bytes for /api/videos/<id>/stream, fetched from Telegram once.
+
+The Bot API downloads a file in two steps: getFile returns a file_path that
+stays valid for at least an hour, then the file is fetched from that path.
+File paths are cached for FILE_PATH_TTL. Downloads land in VIDEO_CACHE_DIR,
+which is trimmed back to VIDEO_CACHE_MAX_BYTES by evicting the least
+recently served files. A file's atime records when it was last served; its
+mtime stays the download time, which Last-Modified and the ETag are based on.
+
+Bot API URLs carry the bot token, and so do httpx's error messages; error
+text is redacted before it leaves this module.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import httpx
+from django.conf import settings
+from django.core.cache import cache
+
+TELEGRAM_API_URL = 'https://api.telegram.org'
+FILE_PATH_TTL = 50 * 60
+API_TIMEOUT = 10
+DOWNLOAD_TIMEOUT = 120
+DOWNLOAD_CHUNK_SIZE = 1 << 16
+# Telegram sends videos as MP4.
+VIDEO_CONTENT_TYPE = 'video/mp4'
+
+# One download per file at a time within a process; striped so the lock
+# table stays fixed in size.
+_download_locks = [threading.Lock() for _ in range(64)]
+_client = None
+_client_lock = threading.Lock()
+
+
+class TelegramFileError(Exception):
+    """getFile or the download failed."""
+
+
+def redact(text):
+    """text with the bot token masked."""
+    token = settings.TELEGRAM_BOT_TOKEN
+    return str(text).replace(token, '<token>') if token else str(text)
+
+
+def _digest(file_id):
+    return hashlib.sha256(file_id.encode('utf-8')).hexdigest()
+
+
+def _http():
+    """A shared client: keeps connections to Telegram open between requests."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = httpx.Client(timeout=API_TIMEOUT)
+        return _client
+
+
+def _api_url():
+    return (settings.TELEGRAM_API_BASE_URL or TELEGRAM_API_URL).rstrip('/')
+
+
+def resolve_file_path(file_id, refresh=False):
+    """Return Telegram's file_path for file_id, from the cache unless refresh is set."""
+    key = f'videos:file_path:{_digest(file_id)}'
+    file_path = None if refresh else cache.get(key)
+    if file_path is None:
+        try:
+            response = _http().post(
+                f'{_api_url()}/bot{settings.TELEGRAM_BOT_TOKEN}/getFile', data={'file_id': file_id},
+            )
+            payload = response.json()
+        except (httpx.HTTPError, ValueError) as e:
+            raise TelegramFileError(redact(f'getFile failed: {e}'))
+        if not payload.get('ok'):
+            raise TelegramFileError(redact(payload.get('description') or 'getFile failed'))
+        file_path = payload['result']['file_path']
+        cache.set(key, file_path, FILE_PATH_TTL)
+    return file_path
+
+
+def cached_video_path(file_id):
+    """Return the local path of file_id's bytes, downloading them on a miss."""
+    digest = _digest(file_id)
+    cache_dir = Path(settings.VIDEO_CACHE_DIR)
+    path = cache_dir / digest
+    with _download_locks[int(digest[:8], 16) % len(_download_locks)]:
+        if not path.exists():
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            _download(file_id, path)
+            evict(cache_dir, settings.VIDEO_CACHE_MAX_BYTES, keep=path)
+        # Mark as recently served without touching the mtime.
+        os.utime(path, (time.time(), path.stat().st_mtime))
+    return path
+
+
+def _download(file_id, path):
+    file_path = resolve_file_path(file_id)
+    try:
+        if not _fetch(file_path, path):
+            # The cached file_path expired; ask Telegram for a new one.
+            if not _fetch(resolve_file_path(file_id, refresh=True), path):
+                raise TelegramFileError('Telegram has no file at the returned file_path')
+    except httpx.HTTPError as e:
+        raise TelegramFileError(redact(f'Download failed: {e}'))
+
+
+def _fetch(file_path, path):
+    """Stream file_path into path through a temp file; False if Telegram answers 404."""
+    url = f'{_api_url()}/file/bot{settings.TELEGRAM_BOT_TOKEN}/{file_path}'
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix='.download.')
+    try:
+        with os.fdopen(fd, 'wb') as f, _http().stream('GET', url, timeout=DOWNLOAD_TIMEOUT) as response:
+            if response.status_code == 404:
+                return False
+            response.raise_for_status()
+            for chunk in response.iter_bytes(DOWNLOAD_CHUNK_SIZE):
+                f.write(chunk)
+        os.replace(tmp, path)
+        return True
+    finally:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+
+
+def evict(cache_dir, max_bytes, keep=None):
+    """Delete the least recently served files until cache_dir holds at most max_bytes."""
+    entries = []
+    total = 0
+    with os.scandir(cache_dir) as it:
+        for entry in it:
+            # Skip downloads still in progress.
+            if entry.name.startswith('.') or not entry.is_file():
+                continue
+            stat = entry.stat()
+            entries.append((stat.st_atime, stat.st_size, entry.path))
+            total += stat.st_size
+    entries.sort()
+    for _, size, entry_path in entries:
+        if total <= max_bytes:
+            break
+        if keep is not None and entry_path == str(keep):
+            continue
+        try:
+            os.unlink(entry_path)
+        except FileNotFoundError:
+            pass
+        total -= size
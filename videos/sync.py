@@ -0,0 +1,106 @@
+"""
+Delta sync: ordered upserts and deletes since an opaque sync token.
+
+Changes come from two streams, Video rows ordered by (updated_at, id) and
+VideoTombstone rows ordered by (deleted_at, id). They are merged on
+(timestamp, kind, id) with kind 0 for upserts and 1 for deletes. The token
+is the position of the last change a client has seen, so every page is a
+pair of indexed range scans no matter how far behind the client is.
+
+Timestamps are taken when a row is saved, not when its transaction commits,
+so a row can become visible after a client has already synced past its
+timestamp. Once a client has caught up, its token therefore points no later
+than SAFETY_WINDOW ago, and its next sync re-reads that stretch. Rows are
+never missed as long as every transaction commits within SAFETY_WINDOW of its
+writes (and the app servers' clocks agree that closely). Clients must accept
+changes they have already applied; upserts and deletes are idempotent.
+"""
+import datetime
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Video, VideoTombstone
+from .serializers import VIDEO_VALUES_FIELDS, serialize_video_values
+
+UPSERT, DELETE = 0, 1
+# Longer than any write transaction, including a SQLite writer waiting out
+# SQLITE_BUSY_TIMEOUT for the lock after its timestamps were set.
+SAFETY_WINDOW = datetime.timedelta(seconds=60)
+
+
+class InvalidToken(ValueError):
+    pass
+
+
+def encode_token(position):
+    timestamp, kind, pk = position
+    token = f"{timestamp.isoformat()}|{kind}|{pk}"
+    return urlsafe_b64encode(token.encode('ascii')).decode('ascii')
+
+
+def decode_token(token):
+    try:
+        timestamp, kind, pk = urlsafe_b64decode(token.encode('ascii')).decode('ascii').split('|')
+        timestamp = parse_datetime(timestamp)
+        if timestamp is None:
+            raise ValueError
+        return timestamp, int(kind), int(pk)
+    except (TypeError, ValueError, UnicodeError):
+        raise InvalidToken(token)
+
+
+def _after(position, field, kind):
+    """Filter rows of one stream that sort after position in the merged order."""
+    timestamp, cursor_kind, pk = position
+    later = Q(**{f'{field}__gt': timestamp})
+    if kind > cursor_kind:
+        return Q(**{f'{field}__gte': timestamp})
+    if kind == cursor_kind:
+        # The redundant >= bound makes this one range scan of the
+        # (field, id) index; a bare OR is planned as two lookups and a sort.
+        return Q(**{f'{field}__gte': timestamp}) & (later | Q(id__gt=pk))
+    return later
+
+
+def get_changes(position, limit):
+    """
+    Return (upserts, deletes, next_position, has_more) after position.
+
+    Videos that were unpublished since the token are reported as deletes.
+    """
+    videos = Video.objects.order_by('updated_at', 'id').values(
+        'id', 'updated_at', 'is_published', *VIDEO_VALUES_FIELDS
+    )
+    tombstones = VideoTombstone.objects.order_by('deleted_at', 'id').values('id', 'deleted_at', 'video_id')
+    if position is not None:
+        videos = videos.filter(_after(position, 'updated_at', UPSERT))
+        tombstones = tombstones.filter(_after(position, 'deleted_at', DELETE))
+
+    changes = [((row['updated_at'], UPSERT, row['id']), row) for row in videos[:limit + 1]]
+    changes += [((row['deleted_at'], DELETE, row['id']), row) for row in tombstones[:limit + 1]]
+    changes.sort(key=lambda change: change[0])
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+
+    upserts, deletes = [], []
+    for (_, kind, _), row in changes:
+        if kind == DELETE:
+            deletes.append(row['video_id'])
+        elif row['is_published']:
+            upserts.append(row)
+        else:
+            deletes.append(row['id'])
+
+    next_position = changes[-1][0] if changes else position
+    if not has_more and next_position is not None:
+        # Caught up: come back for rows that may still commit behind us.
+        settled = (timezone.now() - SAFETY_WINDOW, UPSERT, 0)
+        next_position = min(next_position, settled)
+    upserts = [
+        {'id': row['id'], **item}
+        for row, item in zip(upserts, serialize_video_values(upserts))
+    ]
+    return upserts, deletes, next_position, has_more
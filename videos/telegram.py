@@ -0,0 +1,18 @@
+"""
+Helpers for Bot API objects shared by the admin bot and the management
+commands that talk to Telegram.
+"""
+
+
+def video_metadata(video):
+    """Video model fields from a telegram.Video, read from its Bot API form."""
+    data = video.to_dict()
+    return {
+        'file_unique_id': data.get('file_unique_id'),
+        'duration': data.get('duration'),
+        'width': data.get('width'),
+        'height': data.get('height'),
+        'file_size': data.get('file_size'),
+        'mime_type': data.get('mime_type') or '',
+        'thumbnail_file_id': (data.get('thumbnail') or {}).get('file_id', ''),
+    }
@@ -1,8 +1,57 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import gzip
+import json
+import os
+import runpy
+import shutil
+import tempfile
+import threading
+import time
+from io import StringIO
+from unittest import SkipTest, skipIf
+from unittest.mock import patch
+
+import httpx
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from django.conf import settings
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management import CommandError, call_command
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.test import AsyncRequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APITestCase
 from rest_framework import status
-from .models import Category, Video
+from telegram import Update
+from telegram.error import RetryAfter
+import clean_data
+from . import renderers, stream, sync
+from ishoratech_backend.middleware import DB_QUERIES, REQUEST_DURATION, RequestMetricsMiddleware, install_query_timing
+from .batch import ingest_batch, parse_sheet
+from .cache import VERSION_KEY, categories, get_version
+from .corpus import build_video, generate_corpus
+from .fake_telegram import FakeTelegramServer, callback_update, message_update
+from .jsonstream import iter_records
+from .instrumentation import HANDLER_DB_QUERIES, HANDLER_DURATION, HANDLER_ERRORS, TELEGRAM_DURATION
+from .management.commands.run_bot import Command as BotCommand
+from .management.commands.run_bot import (
+    CATEGORY_PAGE_SIZE, apply_bulk_action, build_webhook_application, load_category_page, load_video_page,
+)
+from .models import BotState, Category, Video, VideoTombstone
+from .pagination import VideoCursorPagination
+from .search import search_video_ids, tokenize
+from .serializers import VIDEO_VALUES_FIELDS, VideoSerializer
+from .ratelimit import TelegramRateLimiter
+from .snapshot import brotli, build_snapshot, read_pointer, schedule_rebuild, snapshot_dir
+from .sync import decode_token
+from .updates import PerUserUpdateProcessor
+from .views import VideoListAsyncView
+from .webhook import TelegramWebhookRouter
 
 class ModelTests(TestCase):
     def setUp(self):
@@ -47,8 +96,8 @@ class VideoAPITests(APITestCase):
         response = self.client.get(self.url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         
-        self.assertEqual(len(response.data), 1)
-        data = response.data[0]
+        self.assertEqual(len(response.data['results']), 1)
+        data = response.data['results'][0]
         
         # Check all fields are present
         self.assertEqual(data['word_lat'], "Apple")
@@ -69,4 +118,1590 @@ class VideoAPITests(APITestCase):
             is_published=False
         )
         response = self.client.get(self.url)
-        self.assertEqual(len(response.data), 1)
+        self.assertEqual(len(response.data['results']), 1)
+
+class VideoPaginationTests(APITestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="Paged")
+        self.videos = [
+            Video.objects.create(
+                title_lat=f"Word {i}",
+                category=self.category,
+                telegram_file_id=f"file_{i}",
+            )
+            for i in range(5)
+        ]
+        self.url = reverse('video-list')
+
+    def test_pages_follow_cursor_without_overlap(self):
+        """Test that walking next links yields every video once, newest first."""
+        seen = []
+        response = self.client.get(self.url, {'page_size': 2})
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            seen.extend(item['word_lat'] for item in response.data['results'])
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+        self.assertEqual(seen, [f"Word {i}" for i in reversed(range(5))])
+
+    def test_previous_link_returns_prior_page(self):
+        """Test that the previous link steps back to the same rows."""
+        first = self.client.get(self.url, {'page_size': 2})
+        self.assertIsNone(first.data['previous'])
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+        self.assertEqual(back.data['results'], first.data['results'])
+        self.assertIsNone(back.data['previous'])
+
+    def test_page_size_is_capped(self):
+        """Test that page_size above the cap falls back to max_page_size."""
+        cap = VideoCursorPagination.max_page_size
+        Video.objects.bulk_create(
+            Video(title_lat=f"Extra {i}", category=self.category, telegram_file_id=f"extra_{i}")
+            for i in range(cap)
+        )
+        response = self.client.get(self.url, {'page_size': 10 ** 6})
+        self.assertEqual(len(response.data['results']), cap)
+        self.assertIsNotNone(response.data['next'])
+
+    def test_invalid_cursor(self):
+        """Test that a malformed cursor returns 404."""
+        response = self.client.get(self.url, {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+class VideoListCacheTests(APITestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="Cached")
+        Video.objects.create(title_lat="First", category=self.category, telegram_file_id="f1")
+        self.url = reverse('video-list')
+
+    def test_etag_and_last_modified_headers(self):
+        """Test that the list sends strong validators."""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['ETag'].startswith('"'))
+        self.assertIn('Last-Modified', response)
+
+    def test_if_none_match_returns_304_without_queries(self):
+        """Test that a matching If-None-Match is answered from the cache alone."""
+        etag = self.client.get(self.url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_cached_payload_served_without_queries(self):
+        """Test that a repeat request is served from the cached payload."""
+        first = self.client.get(self.url)
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url)
+        self.assertEqual(second.content, first.content)
+
+    def test_write_invalidates_cache(self):
+        """Test that saving or deleting a video changes the ETag and payload."""
+        etag = self.client.get(self.url)['ETag']
+        video = Video.objects.create(title_lat="Second", category=self.category, telegram_file_id="f2")
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.json()['results']), 2)
+
+        etag = response['ETag']
+        video.delete()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.json()['results']), 1)
+
+    def test_category_rename_invalidates_cache(self):
+        """Test that renaming a category changes the cached payload."""
+        self.client.get(self.url)
+        self.category.name = "Renamed"
+        self.category.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response.json()['results'][0]['category'], "Renamed")
+
+    def test_write_from_another_process_seen_after_version_ttl(self):
+        """Test that a process-local cache reads the data version back from the database."""
+        etag = self.client.get(self.url)['ETag']
+        # Another process: no signals here, and its bump never reaches this cache.
+        Video.objects.filter(telegram_file_id="f1").update(title_lat="Edited", updated_at=timezone.now())
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+        cache.delete(VERSION_KEY)  # CACHE_VERSION_TTL ran out
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['results'][0]['word_lat'], "Edited")
+
+class VideoListFastPathTests(APITestCase):
+    def setUp(self):
+        self.categories = [Category.objects.create(name=f"Cat {i}") for i in range(3)]
+        for i in range(6):
+            Video.objects.create(
+                title_lat=f"Lat {i}",
+                title_kiril=f"Кир {i}",
+                title_ru=f"Рус {i}" if i % 2 else None,
+                description_lat=f"Desc {i}",
+                description_kiril=f"Тавсиф {i}",
+                description_ru=None if i % 2 else f"Описание {i}",
+                category=self.categories[i % 3],
+                telegram_file_id=f"file_{i}",
+            )
+        self.url = reverse('video-list')
+
+    def test_matches_model_serializer_output(self):
+        """Test that the fast path renders exactly what VideoSerializer would."""
+        expected = VideoSerializer(
+            Video.objects.filter(is_published=True).order_by('-created_at', '-id'),
+            many=True,
+        ).data
+        response = self.client.get(self.url)
+        self.assertEqual(response.json()['results'], json.loads(json.dumps(expected)))
+
+    def test_single_query_regardless_of_categories(self):
+        """Test that the list does not query per row for the category name."""
+        get_version()
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.json()['results']), 6)
+
+class VideoListAsyncViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Async")
+        for i in range(5):
+            Video.objects.create(title_lat=f"Word {i}", category=category, telegram_file_id=f"file_{i}")
+
+    def setUp(self):
+        self.url = reverse('video-list')
+        self.factory = AsyncRequestFactory()
+        self.view = VideoListAsyncView.as_view()
+
+    async def get_async(self, query, **headers):
+        return await self.view(self.factory.get(self.url, query, headers=headers))
+
+    async def test_pages_match_sync_view(self):
+        """Test that the async view renders the same pages, links included, as VideoListView."""
+        query = {'page_size': 2}
+        while True:
+            await cache.aclear()
+            response = await self.get_async(query)
+            await cache.aclear()
+            expected = await self.async_client.get(self.url, query)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.content, expected.content)
+            self.assertEqual(response['Content-Type'], expected['Content-Type'])
+            next_link = json.loads(response.content)['next']
+            if not next_link:
+                break
+            query = {'page_size': 2, 'cursor': next_link.split('cursor=')[1].split('&')[0]}
+
+    async def test_shares_cache_entries_and_etag(self):
+        """Test that both views answer from one cache entry and honour each other's ETag."""
+        expected = await self.async_client.get(self.url)
+        response = await self.get_async({})
+        self.assertEqual(response.content, expected.content)
+        self.assertEqual(response['ETag'], expected['ETag'])
+        not_modified = await self.get_async({}, if_none_match=expected['ETag'])
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    @skipIf(renderers.msgpack is None, "msgpack is not installed")
+    async def test_msgpack(self):
+        """Test that the async view negotiates MessagePack like VideoListView and shares its cache entry."""
+        expected = await self.async_client.get(self.url, headers={'accept': 'application/msgpack'})
+        self.assertEqual(expected['Content-Type'], 'application/msgpack')
+        await cache.aclear()
+        for _ in range(2):  # rendered, then from the cache
+            response = await self.get_async({}, accept='application/msgpack')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response['Content-Type'], 'application/msgpack')
+            self.assertEqual(response.content, expected.content)
+            self.assertEqual(response['ETag'], expected['ETag'])
+            self.assertIn('Accept', response['Vary'])
+
+        response = await self.get_async({})
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertNotEqual(response['ETag'], expected['ETag'])
+        self.assertEqual((await self.get_async({}, accept='text/csv')).status_code, status.HTTP_406_NOT_ACCEPTABLE)
+
+    async def test_invalid_cursor(self):
+        """Test that a malformed cursor returns 404 with DRF's error body."""
+        response = await self.get_async({'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(json.loads(response.content), {'detail': 'Invalid cursor'})
+
+class VideoListVariantTests(APITestCase):
+    def setUp(self):
+        categories = [Category.objects.create(name=f"Cat {i}") for i in range(2)]
+        for i in range(20):
+            Video.objects.create(
+                title_lat=f"Word {i}", title_kiril=f"Сўз {i}", title_ru=f"Слово {i}",
+                description_lat="Lorem ipsum " * 20, description_kiril="Тавсиф " * 20,
+                description_ru="Описание " * 20,
+                category=categories[i % 2], telegram_file_id=f"file_{i}",
+            )
+        self.url = reverse('video-list')
+
+    def measure(self, params=None, accept='application/json'):
+        """Return (payload bytes, render seconds, response) for one uncached list variant."""
+        cache.clear()
+        response = self.client.get(self.url, params or {}, HTTP_ACCEPT=accept)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        renderer = response.accepted_renderer
+        started = time.perf_counter()
+        renderer.render(response.data, response.accepted_media_type, response.renderer_context)
+        return len(response.content), time.perf_counter() - started, response
+
+    def test_lang_narrows_fields_and_columns(self):
+        """Test that ?lang= keeps one script and selects only those columns."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, {'lang': 'kiril'})
+        self.assertEqual(
+            set(response.json()['results'][0]),
+            set(VIDEO_VALUES_FIELDS.values()) - {'word_lat', 'word_ru', 'definition_lat', 'definition_ru'},
+        )
+        self.assertNotIn('description_lat', queries[0]['sql'])
+        self.assertNotIn('title_ru', queries[0]['sql'])
+
+    def test_sparse_fields(self):
+        """Test that ?fields= keeps the named keys and skips the category join."""
+        get_version()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, {'fields': 'word_lat,telegram_file_id'})
+        self.assertEqual(response.json()['results'][0], {'word_lat': "Word 19", 'telegram_file_id': "file_19"})
+        self.assertNotIn('videos_category', queries[0]['sql'])
+
+    def test_invalid_lang_and_fields(self):
+        """Test that unknown languages and fields are rejected."""
+        self.assertEqual(self.client.get(self.url, {'lang': 'en'}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(self.url, {'fields': 'word'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_compact_v2_shape(self):
+        """Test that version 2 sends arrays and each category name once."""
+        response = self.client.get(self.url, {
+            'version': 2, 'fields': 'word_lat,definition_lat,category,telegram_file_id', 'page_size': 4,
+        })
+        results = response.json()['results']
+        self.assertEqual(results['fields'], ['word_lat', 'definition_lat', 'category', 'telegram_file_id'])
+        self.assertEqual(sorted(results['categories'].values()), ["Cat 0", "Cat 1"])
+        word, _, category_id, file_id = results['rows'][0]
+        self.assertEqual((word, file_id), ("Word 19", "file_19"))
+        self.assertEqual(results['categories'][str(category_id)], "Cat 1")
+        self.assertIn('version=2', response.json()['next'])
+        self.assertEqual(self.client.get(self.url, {'version': 3}).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_fast_json_matches_drf_renderer(self):
+        """Test that the orjson renderer produces DRF's bytes."""
+        response = self.client.get(self.url)
+        self.assertEqual(response.content, JSONRenderer().render(response.data))
+
+    @skipIf(renderers.msgpack is None, "msgpack is not installed")
+    def test_msgpack(self):
+        """Test that Accept: application/msgpack returns the same data, cached separately."""
+        response = self.client.get(self.url, HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertIn('Accept', response['Vary'])
+        self.assertEqual(renderers.msgpack.unpackb(response.content), self.client.get(self.url).json())
+        with self.assertNumQueries(0):
+            cached = self.client.get(self.url, HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(cached.content, response.content)
+
+    def test_payload_size_per_variant(self):
+        """Test that every narrower variant is smaller than the full JSON page."""
+        variants = {
+            'full': self.measure(),
+            'lang': self.measure({'lang': 'lat'}),
+            'fields': self.measure({'fields': 'word_lat,telegram_file_id'}),
+            'v2': self.measure({'version': 2}),
+        }
+        if renderers.msgpack is not None:
+            variants['msgpack'] = self.measure(accept='application/msgpack')
+        sizes = {name: size for name, (size, _, _) in variants.items()}
+        for name, size in sizes.items():
+            if name != 'full':
+                self.assertLess(size, sizes['full'], name)
+        self.assertLess(sizes['fields'], sizes['lang'])
+
+def explain(sql, params):
+    """
+    Return (tables scanned in full, whether a sort is done) for one query.
+
+    On Postgres, sequential scans and sorts are disabled for the EXPLAIN, so
+    the planner only picks them when no index can serve the query; on a
+    test database of a few rows it would otherwise always prefer them.
+    SQLite's planner picks indexes without statistics, so its plan is read
+    as is: a SCAN without an index is a full scan, and a temp B-tree is a sort.
+    """
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            details = [row[-1] for row in cursor.fetchall()]
+        scans = {
+            detail.split()[1] for detail in details
+            # FTS lookups show as a scan of the virtual table's index.
+            if detail.startswith('SCAN ') and ' USING ' not in detail and 'VIRTUAL TABLE INDEX' not in detail
+        }
+        return scans, any(detail.startswith('USE TEMP B-TREE') for detail in details)
+
+    if connection.vendor == 'postgresql':
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('SET LOCAL enable_sort = off')
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        scans, sort = set(), False
+        nodes = [plan[0]['Plan']]
+        while nodes:
+            node = nodes.pop()
+            if node['Node Type'] == 'Seq Scan':
+                scans.add(node['Relation Name'])
+            sort = sort or node['Node Type'] in ('Sort', 'Incremental Sort')
+            nodes.extend(node.get('Plans', ()))
+        return scans, sort
+
+    raise SkipTest(f'No query plan checks for {connection.vendor}.')
+
+class QueryPlanMixin:
+    """assertIndexedPlans() fails when a request's queries miss the indexes."""
+
+    def assertIndexedPlans(self, url, allow_scan=(), allow_sort=False):
+        """
+        Run EXPLAIN on every query a GET of url makes and fail on a full scan
+        of a table outside allow_scan, or on a sort unless allow_sort is set.
+        """
+        cache.clear()
+        # Read once per CACHE_VERSION_TTL, not per request
+        get_version()
+        statements = []
+
+        def capture(execute, sql, params, many, context):
+            statements.append((sql, params))
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(capture):
+            response = self.client.get(url)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, url)
+        self.assertTrue(statements, f'{url} made no queries')
+        for sql, params in statements:
+            scans, sort = explain(sql, params)
+            self.assertFalse(set(scans) - set(allow_scan), f'Full scan for {url}:\n{sql}')
+            if not allow_sort:
+                self.assertFalse(sort, f'Sort for {url}:\n{sql}')
+        return response
+
+class QueryPlanTests(QueryPlanMixin, APITestCase):
+    """The API's hot paths are served from indexes, on SQLite and Postgres."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name="Plans")
+        other = Category.objects.create(name="Other")
+        for i in range(12):
+            Video.objects.create(
+                title_lat=f"Salom {i}", title_kiril=f"Салом {i}", category=cls.category if i % 2 else other,
+                telegram_file_id=f"plan_{i}", is_published=i % 5 != 0,
+            )
+        VideoTombstone.objects.create(video_id=999)
+
+    def test_video_lists(self):
+        """Test that every variant of the video list and its next page walk an index."""
+        url = reverse('video-list')
+        response = self.assertIndexedPlans(f'{url}?page_size=3')
+        self.assertIndexedPlans(response.json()['next'])
+        self.assertIndexedPlans(f'{url}?page_size=3&version=2&lang=lat')
+        self.assertIndexedPlans(f'{url}?page_size=3&category={self.category.pk}')
+        self.assertIndexedPlans(f"{reverse('category-videos', args=[self.category.pk])}?page_size=3")
+
+    def test_categories(self):
+        """Test that the category list is read in name order with indexed counts."""
+        self.assertIndexedPlans(reverse('category-list'), allow_scan={'videos_category'})
+
+    def test_search(self):
+        """Test that search finds matches through its index; ranking them needs a sort."""
+        self.assertIndexedPlans(f"{reverse('video-search')}?q=salom", allow_sort=True)
+
+    def test_sync_and_export(self):
+        """Test that sync pages and incremental exports are range scans."""
+        first = self.assertIndexedPlans(f"{reverse('sync')}?limit=3")
+        self.assertIndexedPlans(f"{reverse('sync')}?limit=3&since={first.json()['next']}")
+        self.assertIndexedPlans(f"{reverse('video-export')}?since=2020-01-01T00:00:00")
+
+class CategoryAPITests(APITestCase):
+    def setUp(self):
+        self.animals = Category.objects.create(name="Animals")
+        self.food = Category.objects.create(name="Food")
+        self.empty = Category.objects.create(name="Empty")
+        for i in range(3):
+            Video.objects.create(title_lat=f"Animal {i}", category=self.animals, telegram_file_id=f"a{i}")
+        Video.objects.create(title_lat="Bread", category=self.food, telegram_file_id="f0")
+        Video.objects.create(title_lat="Draft", category=self.food, telegram_file_id="f1", is_published=False)
+
+    def test_categories_with_published_counts_in_one_query(self):
+        """Test that the category list counts only published videos, with one query."""
+        get_version()
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('category-list'))
+        self.assertEqual(response.json()['results'], [
+            {'id': self.animals.id, 'name': "Animals", 'video_count': 3},
+            {'id': self.empty.id, 'name': "Empty", 'video_count': 0},
+            {'id': self.food.id, 'name': "Food", 'video_count': 1},
+        ])
+
+    def test_category_list_cached_until_video_write(self):
+        """Test that counts are served from the cache and refreshed by a video write."""
+        url = reverse('category-list')
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            self.client.get(url)
+        Video.objects.create(title_lat="Soup", category=self.food, telegram_file_id="f2")
+        counts = {row['name']: row['video_count'] for row in self.client.get(url).json()['results']}
+        self.assertEqual(counts['Food'], 2)
+
+    def test_category_filter_on_list(self):
+        """Test that ?category= keeps only that category's videos, across pages."""
+        response = self.client.get(reverse('video-list'), {'category': self.animals.id, 'page_size': 2})
+        words = [item['word_lat'] for item in response.json()['results']]
+        words += [item['word_lat'] for item in self.client.get(response.json()['next']).json()['results']]
+        self.assertEqual(words, ["Animal 2", "Animal 1", "Animal 0"])
+
+    def test_invalid_category_filter(self):
+        """Test that a non-numeric category is rejected."""
+        response = self.client.get(reverse('video-list'), {'category': 'animals'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_category_videos(self):
+        """Test the nested list, and 404 for an unknown category."""
+        response = self.client.get(reverse('category-videos', args=[self.food.id]))
+        self.assertEqual([item['word_lat'] for item in response.json()['results']], ["Bread"])
+        response = self.client.get(reverse('category-videos', args=[self.food.id + 100]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_category_videos_for_category_created_elsewhere(self):
+        """Test that a category missing from the in-process cache is looked up in the database."""
+        categories.all()
+        # bulk_create() sends no signals, like a write from another process.
+        [drinks] = Category.objects.bulk_create([Category(name="Drinks")])
+        Video.objects.bulk_create([Video(title_lat="Tea", category=drinks, telegram_file_id="d1", search_key="tea")])
+        self.assertIsNone(categories.get(drinks.id))
+        response = self.client.get(reverse('category-videos', args=[drinks.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['word_lat'] for item in response.json()['results']], ["Tea"])
+
+class SearchKeyTests(TestCase):
+    def test_scripts_and_apostrophes_fold_together(self):
+        """Test that Latin, Cyrillic and apostrophe variants share one key."""
+        self.assertEqual(tokenize("O‘zbekiston"), ["ozbekiston"])
+        self.assertEqual(tokenize("O'zbekiston"), ["ozbekiston"])
+        self.assertEqual(tokenize("O`zbekiston"), ["ozbekiston"])
+        self.assertEqual(tokenize("Ўзбекистон"), ["ozbekiston"])
+        self.assertEqual(tokenize("Ғишт, қалам!"), ["gisht", "qalam"])
+
+    def test_search_key_kept_current_on_save(self):
+        """Test that saving a video refreshes its search key."""
+        category = Category.objects.create(name="Keys")
+        video = Video.objects.create(title_lat="Olma", title_kiril="Олма", category=category, telegram_file_id="k1")
+        self.assertEqual(video.search_key, "olma")
+        video.title_ru = "Яблоко"
+        video.save(update_fields=['title_ru'])
+        video.refresh_from_db()
+        self.assertEqual(video.search_key, "olma yabloko")
+
+class CorpusTests(TestCase):
+    def test_generated_corpus_is_reproducible_and_searchable(self):
+        """Test that a corpus grown in steps matches one built at once, with working search keys."""
+        generate_corpus(30, 5, seed=3)
+        generate_corpus(60, 5, seed=3)
+        self.assertEqual(Video.objects.count(), 60)
+        self.assertEqual(Category.objects.count(), 5)
+        video = Video.objects.order_by('id')[45]
+        expected = build_video(45, list(Category.objects.order_by('id').values_list('id', flat=True)), seed=3)
+        self.assertEqual((video.title_lat, video.created_at), (expected.title_lat, expected.created_at))
+        # Both scripts of a title fold to the same search tokens.
+        self.assertEqual(tokenize(video.title_lat), tokenize(video.title_kiril))
+        self.assertIn(video.id, search_video_ids(video.title_kiril, 100))
+
+class VideoSearchAPITests(APITestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="Search")
+        self.olma = Video.objects.create(
+            title_lat="Olma", title_kiril="Олма", title_ru="Яблоко",
+            description_lat="Shirin meva", category=self.category, telegram_file_id="s1",
+        )
+        self.uzbek = Video.objects.create(
+            title_lat="O‘zbek", title_kiril="Ўзбек", title_ru="Узбек",
+            description_lat="Olma haqida emas", category=self.category, telegram_file_id="s2",
+        )
+        Video.objects.create(
+            title_lat="Olma yashirin", category=self.category, telegram_file_id="s3", is_published=False,
+        )
+        self.url = reverse('video-search')
+
+    def search(self, q):
+        response = self.client.get(self.url, {'q': q})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item['telegram_file_id'] for item in response.json()['results']]
+
+    def test_matches_across_scripts(self):
+        """Test that a query in any script finds the same video."""
+        self.assertEqual(self.search("o'zbek"), ["s2"])
+        self.assertEqual(self.search("ўзбек"), ["s2"])
+        self.assertEqual(self.search("ЯБЛОКО"), ["s1"])
+
+    def test_prefix_match_and_unpublished_hidden(self):
+        """Test that prefixes match and unpublished videos are excluded."""
+        self.assertEqual(sorted(self.search("olm")), ["s1", "s2"])
+
+    def test_missing_query(self):
+        """Test that an empty query is rejected."""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_rebuild_command_backfills_keys(self):
+        """Test that rebuild_search_index fills keys for rows written without them."""
+        Video.objects.filter(pk=self.olma.pk).update(search_key='')
+        self.assertEqual(self.search("shirin"), [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.search("shirin"), ["s1"])
+
+class SyncAPITests(APITestCase):
+    def setUp(self):
+        # Exact tokens here; the safety window has its own tests below.
+        window = patch.object(sync, 'SAFETY_WINDOW', datetime.timedelta(0))
+        window.start()
+        self.addCleanup(window.stop)
+        self.category = Category.objects.create(name="Sync")
+        self.videos = [
+            Video.objects.create(title_lat=f"Sync {i}", category=self.category, telegram_file_id=f"sync_{i}")
+            for i in range(3)
+        ]
+        self.url = reverse('sync')
+
+    def sync(self, since=None, **params):
+        if since:
+            params['since'] = since
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()
+
+    def test_initial_sync_returns_everything(self):
+        """Test that a sync without a token returns every published video."""
+        data = self.sync()
+        self.assertEqual([item['id'] for item in data['upserts']], [v.id for v in self.videos])
+        self.assertEqual(data['upserts'][0]['word_lat'], "Sync 0")
+        self.assertEqual(data['deletes'], [])
+        self.assertFalse(data['has_more'])
+
+    def test_delta_contains_only_changes(self):
+        """Test that edits, deletes and unpublishing show up after the token."""
+        token = self.sync()['next']
+        self.assertEqual(self.sync(token)['upserts'], [])
+
+        self.videos[0].title_lat = "Edited"
+        self.videos[0].save()
+        deleted_id = self.videos[1].id
+        self.videos[1].delete()
+        self.videos[2].is_published = False
+        self.videos[2].save()
+
+        data = self.sync(token)
+        self.assertEqual([item['word_lat'] for item in data['upserts']], ["Edited"])
+        self.assertEqual(sorted(data['deletes']), sorted([deleted_id, self.videos[2].id]))
+        self.assertEqual(self.sync(data['next'])['upserts'], [])
+
+    def test_category_rename_is_synced(self):
+        """Test that renaming a category re-sends its videos."""
+        token = self.sync()['next']
+        self.category.name = "Renamed"
+        self.category.save()
+        data = self.sync(token)
+        self.assertEqual({item['category'] for item in data['upserts']}, {"Renamed"})
+        self.assertEqual(len(data['upserts']), 3)
+
+    def test_paging_is_bounded(self):
+        """Test that limit bounds each page and has_more walks the backlog."""
+        deleted_id = self.videos[0].id
+        self.videos[0].delete()
+        seen, token = [], None
+        while True:
+            data = self.sync(token, limit=1)
+            self.assertLessEqual(len(data['upserts']) + len(data['deletes']), 1)
+            seen += [('upsert', item['id']) for item in data['upserts']]
+            seen += [('delete', pk) for pk in data['deletes']]
+            token = data['next']
+            if not data['has_more']:
+                break
+        self.assertEqual(len(seen), 3)
+        self.assertIn(('delete', deleted_id), seen)
+
+    def test_caught_up_token_rereads_safety_window(self):
+        """Test that a row committed after a client synced past its timestamp is still sent."""
+        with patch.object(sync, 'SAFETY_WINDOW', datetime.timedelta(minutes=1)):
+            data = self.sync()
+            self.assertLessEqual(decode_token(data['next'])[0], timezone.now() - sync.SAFETY_WINDOW)
+            # Saved before the last synced row, committed only now
+            late = Video.objects.create(title_lat="Late", category=self.category, telegram_file_id="late")
+            Video.objects.filter(pk=late.pk).update(updated_at=self.videos[0].updated_at)
+            data = self.sync(data['next'])
+        self.assertIn(late.id, [item['id'] for item in data['upserts']])
+
+    def test_settled_token_is_exact(self):
+        """Test that a caught-up token stays on the last change once it is older than the window."""
+        Video.objects.update(updated_at=timezone.now() - datetime.timedelta(minutes=5))
+        with patch.object(sync, 'SAFETY_WINDOW', datetime.timedelta(minutes=1)):
+            data = self.sync()
+            self.assertEqual(decode_token(data['next'])[2], self.videos[-1].id)
+            self.assertEqual(self.sync(data['next'])['upserts'], [])
+
+    def test_invalid_token(self):
+        """Test that a malformed token is rejected."""
+        response = self.client.get(self.url, {'since': '!!!'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+class VideoExportTests(APITestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="Export")
+        self.videos = [
+            Video.objects.create(title_lat=f"Word {i}", category=self.category, telegram_file_id=f"file_{i}")
+            for i in range(5)
+        ]
+        Video.objects.create(title_lat="Hidden", category=self.category, telegram_file_id="hidden", is_published=False)
+        self.url = reverse('video-export')
+
+    def read_lines(self, response):
+        content = b''.join(response.streaming_content)
+        if response.get('Content-Encoding') == 'gzip':
+            content = gzip.decompress(content)
+        return [json.loads(line) for line in content.decode('utf-8').splitlines()]
+
+    def test_streams_published_videos_as_ndjson(self):
+        """Test that the export streams one object per published video with its category."""
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+            lines = self.read_lines(response)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        self.assertEqual([line['id'] for line in lines], [video.id for video in self.videos])
+        self.assertEqual(lines[0]['word_lat'], "Word 0")
+        self.assertEqual(lines[0]['category'], "Export")
+
+    def test_gzip_when_accepted(self):
+        """Test that the stream is gzipped for clients that accept it."""
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(len(self.read_lines(response)), 5)
+
+    def test_gzip_only_when_accepted(self):
+        """Test that q-values are honoured: gzip;q=0 is a refusal, not a match."""
+        for header, gzipped in [
+            ('gzip;q=0', False), ('GZIP; q=0.0, br', False), ('identity', False), ('ungzipped', False),
+            ('*;q=0.5', True), ('gzip;q=0, *', False), ('br, gzip;q=0.1', True), ('gzip;q=x', False),
+        ]:
+            with self.subTest(header=header):
+                response = self.client.get(self.url, HTTP_ACCEPT_ENCODING=header)
+                self.assertEqual(response.get('Content-Encoding') == 'gzip', gzipped)
+                self.assertIn('Accept-Encoding', response['Vary'])
+                self.assertEqual(len(self.read_lines(response)), 5)
+
+    def test_chunks_are_bounded(self):
+        """Test that rows are sent in several small chunks rather than one body."""
+        with patch('videos.export.CHUNK_BYTES', 100):
+            response = self.client.get(self.url)
+            chunks = list(response.streaming_content)
+        self.assertGreater(len(chunks), 1)
+
+    def test_since_filter(self):
+        """Test that since limits the export to videos changed after it."""
+        since = self.videos[2].updated_at.isoformat()
+        self.videos[0].save()
+        response = self.client.get(self.url, {'since': since})
+        ids = [line['id'] for line in self.read_lines(response)]
+        self.assertEqual(ids, [self.videos[3].id, self.videos[4].id, self.videos[0].id])
+
+    def test_invalid_since(self):
+        """Test that a malformed since is rejected."""
+        response = self.client.get(self.url, {'since': 'yesterday'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+class SnapshotTests(APITestCase):
+    def setUp(self):
+        self.static_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.static_root)
+        override = override_settings(STATIC_ROOT=self.static_root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        fruit = Category.objects.create(name="Fruit")
+        colour = Category.objects.create(name="Colour")
+        Video.objects.create(title_lat="Olma", category=fruit, telegram_file_id="olma")
+        Video.objects.create(title_lat="Qizil", category=colour, telegram_file_id="qizil")
+        Video.objects.create(title_lat="Nok", category=fruit, telegram_file_id="nok")
+        Video.objects.create(title_lat="Yashirin", category=fruit, telegram_file_id="x", is_published=False)
+
+    def test_bundle_grouped_by_category_with_compressed_variants(self):
+        """Test that the bundle groups published videos and has .gz/.br siblings."""
+        call_command('build_snapshot', stdout=StringIO())
+        pointer = read_pointer()
+        bundle = snapshot_dir() / pointer['path'].split('/')[-1]
+
+        data = json.loads(bundle.read_text(encoding='utf-8'))
+        self.assertEqual(
+            [(c['name'], [v['telegram_file_id'] for v in c['videos']]) for c in data['categories']],
+            [("Colour", ["qizil"]), ("Fruit", ["olma", "nok"])],
+        )
+        self.assertEqual(pointer['videos'], 3)
+        with gzip.open(f"{bundle}.gz") as f:
+            self.assertEqual(f.read(), bundle.read_bytes())
+        if brotli is not None:
+            self.assertEqual(brotli.decompress(open(f"{bundle}.br", 'rb').read()), bundle.read_bytes())
+
+    def test_unchanged_data_reuses_hash(self):
+        """Test that rebuilding unchanged data keeps the same content hash."""
+        first = build_snapshot()
+        self.assertEqual(build_snapshot()['hash'], first['hash'])
+        Video.objects.create(title_lat="Yangi", category=Category.objects.first(), telegram_file_id="new")
+        self.assertNotEqual(build_snapshot()['hash'], first['hash'])
+
+    def test_latest_pointer_and_static_serving(self):
+        """Test that the pointer endpoint and WhiteNoise serve a bundle built after startup."""
+        with patch('videos.views.schedule_rebuild') as rebuild:
+            self.assertEqual(self.client.get(reverse('snapshot-latest')).status_code, status.HTTP_404_NOT_FOUND)
+        rebuild.assert_called_once()
+        build_snapshot()
+
+        response = self.client.get(reverse('snapshot-latest'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        url = response.json()['url']
+        self.assertIn(response.json()['hash'], url)
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('immutable', response['Cache-Control'])
+        response.close()
+
+    def test_stale_pointer_starts_rebuild(self):
+        """Test that the pointer endpoint rebuilds in the web process once the data changed."""
+        build_snapshot()
+        with patch('videos.views.schedule_rebuild') as rebuild:
+            self.assertEqual(self.client.get(reverse('snapshot-latest')).status_code, status.HTTP_200_OK)
+            rebuild.assert_not_called()
+            Video.objects.create(title_lat="Yangi", category=Category.objects.first(), telegram_file_id="new")
+            self.assertEqual(self.client.get(reverse('snapshot-latest')).status_code, status.HTTP_200_OK)
+            rebuild.assert_called_once()
+
+    def test_one_rebuild_at_a_time(self):
+        """Test that schedule_rebuild() starts no second build while one runs."""
+        started, release = threading.Event(), threading.Event()
+
+        def build(keep):
+            started.set()
+            release.wait(5)
+            return {'hash': 'h', 'videos': 0}
+
+        with patch('videos.snapshot.build_snapshot', side_effect=build):
+            self.assertTrue(schedule_rebuild())
+            started.wait(5)
+            self.assertFalse(schedule_rebuild())
+            release.set()
+        for thread in threading.enumerate():
+            if thread.name == 'snapshot-rebuild':
+                thread.join(5)
+
+    def test_pruned_bundle_is_no_longer_served(self):
+        """Test that a bundle pruned after it was served answers 404."""
+        url = f"{settings.STATIC_URL}{build_snapshot(keep=1)['path']}"
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+        Video.objects.create(title_lat="Yangi", category=Category.objects.first(), telegram_file_id="new")
+        build_snapshot(keep=1)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+
+class JsonStreamTests(SimpleTestCase):
+    def records(self, text, **kwargs):
+        """iter_records() over text, checking that every chunk size gives the same result."""
+        expected = list(iter_records(StringIO(text), **kwargs))
+        for chunk_size in range(1, len(text) + 1):
+            self.assertEqual(list(iter_records(StringIO(text), chunk_size=chunk_size, **kwargs)), expected)
+        return expected
+
+    def test_array_and_ndjson_across_chunks(self):
+        """Test that records split anywhere across chunks decode the same."""
+        self.assertEqual(self.records('[{"a": 1}, {"b": [2.5, "x"]}]'), [{'a': 1}, {'b': [2.5, 'x']}])
+        self.assertEqual(self.records('{"a": 1}\n{"b": 2}\n'), [{'a': 1}, {'b': 2}])
+
+    def test_trailing_commas_only_when_tolerated(self):
+        """Test that trailing commas are an error unless asked for."""
+        text = '[{"a": [1, 2,],}, ]'
+        self.assertEqual(self.records(text, tolerate_trailing_commas=True), [{'a': [1, 2]}])
+        with self.assertRaises(json.JSONDecodeError):
+            list(iter_records(StringIO(text)))
+
+    def test_commas_inside_strings_are_kept(self):
+        """Test that the trailing comma rewrite leaves string contents alone."""
+        text = '[{"a": "x, ]", "b": "q\\\\", "c": "\\", }"}]'
+        self.assertEqual(self.records(text, tolerate_trailing_commas=True), [{'a': 'x, ]', 'b': 'q\\', 'c': '", }'}])
+
+class CleanDataTests(SimpleTestCase):
+    RAW = [
+        {'word': ' Olma ', 'category': 'Meva’lar', 'telegram_file_id': 'f1'},
+        {'word': 'olma', 'category': 'Meva', 'telegram_file_id': 'f1'},
+        {'word': '', 'telegram_file_id': 'f2'},
+        'not a record',
+        *({'word': f'So‘z {i}', 'telegram_file_id': f'f{i}'} for i in range(3, 40)),
+        {'word': 'OLMA', 'telegram_file_id': 'f1', 'definition': 'again'},
+        {'word': 'So‘z 3', 'telegram_file_id': 'f3'},
+    ]
+
+    def clean(self, text, output_format='json', workers=1, batch_size=4, max_memory=clean_data.DEFAULT_MAX_MEMORY):
+        counts = {'read': 0, 'kept': 0, 'dropped': 0}
+        out = StringIO()
+        clean_data.write_records(StringIO(text), out, output_format, workers, batch_size, counts, max_memory)
+        return out.getvalue(), counts
+
+    def expected(self):
+        return [
+            {'word': 'Olma', 'category': "Meva'lar", 'telegram_file_id': 'f1', 'definition': ''},
+            *({'word': f'So‘z {i}', 'category': 'Uncategorized', 'telegram_file_id': f'f{i}', 'definition': ''}
+              for i in range(3, 40)),
+        ]
+
+    def test_cleans_and_dedupes(self):
+        """Test that records are normalized, invalid ones dropped and duplicates kept once, in order."""
+        text, counts = self.clean(json.dumps(self.RAW, ensure_ascii=False)[:-1] + ',]')
+        self.assertEqual(json.loads(text), self.expected())
+        self.assertEqual(counts, {'read': 43, 'kept': 38, 'dropped': 5})
+
+    def test_chunked_input(self):
+        """Test that the output does not depend on where the input is split into chunks."""
+        raw = json.dumps(self.RAW, ensure_ascii=False, indent=1)
+        expected, _ = self.clean(raw)
+        for chunk_size in (1, 7, 64):
+            chunked = lambda f, **kwargs: iter_records(f, chunk_size=chunk_size, **kwargs)
+            with self.subTest(chunk_size=chunk_size), patch.object(clean_data, 'iter_records', chunked):
+                self.assertEqual(self.clean(raw)[0], expected)
+
+    def test_dedupe_spills_to_disk(self):
+        """Test that duplicates are found after the in-memory filter has been spilled to disk."""
+        with patch.object(clean_data, 'SPILL_SORT_SIZE', 3):
+            seen = clean_data.FingerprintSet(max_memory=200)
+            try:
+                for value in range(1, 100):
+                    self.assertTrue(seen.add(value * 7919))
+                self.assertIsNotNone(seen.spilled)
+                self.assertLessEqual(len(seen.slots) * 8, 200)
+                for value in range(1, 100):
+                    self.assertFalse(seen.add(value * 7919))
+                self.assertEqual(len(seen), 99)
+                spill_dir = seen.spill_dir
+            finally:
+                seen.close()
+            self.assertFalse(os.path.exists(spill_dir))
+
+            text, counts = self.clean(json.dumps(self.RAW), output_format='ndjson', max_memory=200)
+        self.assertEqual([json.loads(line) for line in text.splitlines()], self.expected())
+        self.assertEqual(counts['kept'], 38)
+
+    def test_worker_processes(self):
+        """Test that the process pool gives the same output as cleaning in-process."""
+        raw = json.dumps(self.RAW)
+        for output_format in ('json', 'ndjson'):
+            with self.subTest(output_format=output_format):
+                self.assertEqual(
+                    self.clean(raw, output_format, workers=2),
+                    self.clean(raw, output_format, workers=1),
+                )
+
+class ImportVideosCommandTests(TestCase):
+    def write_dump(self, text):
+        f = tempfile.NamedTemporaryFile('w', suffix='.json', encoding='utf-8', delete=False)
+        self.addCleanup(os.unlink, f.name)
+        f.write(text)
+        f.close()
+        return f.name
+
+    def test_imports_cleaned_dump_and_upserts(self):
+        """Test that a clean_data.py dump is imported and re-imports update in place."""
+        Category.objects.create(name="Meva")
+        path = self.write_dump(json.dumps([
+            {"word": "Olma", "category": "Meva", "telegram_file_id": "f1", "definition": "Shirin"},
+            {"word": "Qizil", "category": "Rang", "telegram_file_id": "f2", "definition": ""},
+            {"word": "", "category": "Rang", "telegram_file_id": "f3"},
+        ]))
+        call_command('import_videos', path, batch_size=2, stdout=StringIO())
+        self.assertEqual(Video.objects.count(), 2)
+        olma = Video.objects.get(telegram_file_id="f1")
+        self.assertEqual((olma.title_lat, olma.description_lat, olma.category.name), ("Olma", "Shirin", "Meva"))
+        self.assertEqual(olma.search_key, "olma shirin")
+        self.assertTrue(Category.objects.filter(name="Rang").exists())
+
+        path = self.write_dump('{"word": "Olma!", "category": "Meva", "telegram_file_id": "f1"}\n')
+        call_command('import_videos', path, stdout=StringIO())
+        self.assertEqual(Video.objects.count(), 2)
+        self.assertEqual(Video.objects.get(telegram_file_id="f1").title_lat, "Olma!")
+
+    def test_reimport_keeps_fields_missing_from_the_dump(self):
+        """Test that a word/definition dump leaves the other fields and the publication state alone."""
+        olma = Video.objects.create(
+            title_lat="Olma", title_kiril="Олма", title_ru="Яблоко", description_lat="Shirin",
+            category=Category.objects.create(name="Meva"), telegram_file_id="f1", is_published=False,
+        )
+        path = self.write_dump('[{"word": "Olma", "definition": "Qizil meva", "telegram_file_id": "f1"}]')
+        call_command('import_videos', path, stdout=StringIO())
+        olma.refresh_from_db()
+        self.assertEqual(
+            (olma.title_kiril, olma.title_ru, olma.description_lat, olma.category.name, olma.is_published),
+            ("Олма", "Яблоко", "Qizil meva", "Meva", False),
+        )
+        self.assertEqual(olma.search_key, "olma yabloko qizil meva")
+
+    def test_dry_run_writes_nothing(self):
+        """Test that --dry-run validates without touching the database."""
+        path = self.write_dump('[{"word": "Olma", "category": "Yangi", "telegram_file_id": "f1"},]')
+        out = StringIO()
+        call_command('import_videos', path, dry_run=True, allow_trailing_commas=True, stdout=out)
+        self.assertIn('Validated 1 videos', out.getvalue())
+        self.assertFalse(Video.objects.exists())
+        self.assertFalse(Category.objects.exists())
+
+    def test_batches_are_bulk_writes(self):
+        """Test that each batch costs a fixed number of queries, not one per row."""
+        rows = [{"word": f"W{i}", "category": "Bulk", "telegram_file_id": f"b{i}"} for i in range(50)]
+        path = self.write_dump(json.dumps(rows))
+        Category.objects.create(name="Bulk")
+        with self.assertNumQueries(5):
+            call_command('import_videos', path, batch_size=100, stdout=StringIO())
+        self.assertEqual(Video.objects.count(), 50)
+
+class BotVideoBrowserTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name="Bot")
+        self.ids = [
+            Video.objects.create(title_lat=f"V{i}", category=category, telegram_file_id=f"bot_{i}").id
+            for i in range(25)
+        ]
+        self.newest_first = self.ids[::-1]
+
+    def test_keyset_pages(self):
+        """Test that next/prev anchors walk the pages without overlap."""
+        first = load_video_page(1)
+        self.assertEqual([r['id'] for r in first['rows']], self.newest_first[:10])
+        self.assertEqual((first['pages'], first['prev_id']), (3, None))
+
+        second = load_video_page(2, first['next_id'])
+        self.assertEqual([r['id'] for r in second['rows']], self.newest_first[10:20])
+        self.assertEqual(second['prev_id'], self.newest_first[0])
+
+        last = load_video_page(3)
+        self.assertEqual([r['id'] for r in last['rows']], self.newest_first[20:])
+        self.assertIsNone(last['next_id'])
+
+    def test_page_query_count_is_constant(self):
+        """Test that a page costs the same queries wherever it is."""
+        with self.assertNumQueries(4):
+            load_video_page(3)
+
+    def test_bulk_actions_are_single_queries(self):
+        """Test that bulk publish/unpublish/delete touch all selected rows."""
+        selected = set(self.ids[:5])
+        with self.assertNumQueries(1):
+            self.assertEqual(apply_bulk_action('unpublish', selected), 5)
+        self.assertEqual(Video.objects.filter(is_published=False).count(), 5)
+        self.assertEqual(apply_bulk_action('publish', selected), 5)
+        self.assertEqual(apply_bulk_action('delete', selected), 5)
+        self.assertEqual(Video.objects.count(), 20)
+        self.assertEqual(VideoTombstone.objects.count(), 5)
+
+class BotCategoryPickerTests(TestCase):
+    def setUp(self):
+        # Test transactions roll back without signals; start from a cold cache.
+        categories.invalidate()
+        self.addCleanup(categories.invalidate)
+        Category.objects.bulk_create(
+            [Category(name=f"Hayvon {i:02}") for i in range(12)] + [Category(name="Oila a'zolari")]
+        )
+
+    def test_pages_and_prefix_filter(self):
+        """Test that the picker pages and filters by name or word prefix."""
+        first = load_category_page(1)
+        self.assertEqual((first['pages'], len(first['rows'])), (2, CATEGORY_PAGE_SIZE))
+        self.assertEqual(len(load_category_page(9)['rows']), 13 - CATEGORY_PAGE_SIZE)
+        self.assertEqual([c.name for c in load_category_page(1, 'a')['rows']], ["Oila a'zolari"])
+        self.assertEqual(load_category_page(1, 'hayvon 1')['total'], 2)
+
+    def test_cache_is_reused_until_category_write(self):
+        """Test that lookups hit the cache and a Category save invalidates it."""
+        with self.assertNumQueries(1):
+            load_category_page(1)
+        some = categories.all()[0]
+        with self.assertNumQueries(0):
+            self.assertEqual(categories.get(some.id), some)
+            load_category_page(2, 'hay')
+        Category.objects.create(name="Yangi")
+        with self.assertNumQueries(1):
+            self.assertEqual(load_category_page(1, 'yan')['total'], 1)
+
+class FakeTelegramMixin:
+    """Runs the bot against a local fake Bot API server."""
+
+    def setUp(self):
+        self.server = FakeTelegramServer().start()
+        self.addCleanup(self.server.stop)
+        # BOT_DB_THREADS=0 keeps bot queries on the test's connection and transaction.
+        self.settings_override = override_settings(TELEGRAM_API_BASE_URL=self.server.base_url, BOT_DB_THREADS=0)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+class TelegramWebhookTests(FakeTelegramMixin, TestCase):
+    secret = 'test-secret'
+
+    async def django_app(self, scope, receive, send):
+        await send({'type': 'http.response.start', 'status': 204, 'headers': []})
+        await send({'type': 'http.response.body', 'body': b''})
+
+    async def post(self, router, payload, secret):
+        scope = {
+            'type': 'http', 'method': 'POST', 'path': '/tg/hook',
+            'headers': [(b'x-telegram-bot-api-secret-token', secret if isinstance(secret, bytes) else secret.encode())],
+        }
+        body = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+        communicator = ApplicationCommunicator(router, scope)
+        await communicator.send_input({'type': 'http.request', 'body': body})
+        response = await communicator.receive_output(5)
+        await communicator.receive_output(5)
+        return response['status']
+
+    def test_bot_process_idles_in_webhook_mode(self):
+        """Test that run_bot stays up without polling when webhooks are on, so it is not restarted in a loop."""
+        out = StringIO()
+        with override_settings(TELEGRAM_WEBHOOK_URL='https://example.com/tg/hook'), \
+                patch.object(BotCommand, 'idle') as idle, patch.object(BotCommand, 'run_bot') as run_bot:
+            call_command('run_bot', stdout=out)
+        idle.assert_called_once()
+        run_bot.assert_not_called()
+        self.assertIn('Webhook mode is active', out.getvalue())
+
+    def test_gunicorn_runs_one_worker_in_webhook_mode(self):
+        """Test that gunicorn.conf.py ignores WEB_CONCURRENCY when webhooks are on."""
+        path = os.path.join(settings.BASE_DIR, 'gunicorn.conf.py')
+        env = {'SERVER_MODE': 'asgi', 'WEB_CONCURRENCY': '4'}
+        with patch.dict(os.environ, env):
+            self.assertEqual(runpy.run_path(path)['workers'], 4)
+            with patch.dict(os.environ, {'TELEGRAM_WEBHOOK_URL': 'https://example.com/tg/hook'}), \
+                    patch('sys.stderr', StringIO()):
+                self.assertEqual(runpy.run_path(path)['workers'], 1)
+
+    async def test_non_ascii_secret_is_refused(self):
+        """Test that a secret header with non-ASCII bytes gets 403 rather than an error."""
+        router = TelegramWebhookRouter(self.django_app, None, path='/tg/hook', secret_token=self.secret)
+        update = message_update(settings.ADMIN_IDS[0], '/start')
+        self.assertEqual(await self.post(router, update, 'test-secr\xe9t'.encode('latin-1')), 403)
+
+    async def test_malformed_updates_are_refused(self):
+        """Test that a body that is not a JSON object gets 400."""
+        router = TelegramWebhookRouter(self.django_app, None, path='/tg/hook', secret_token=self.secret)
+        for body in (b'not json', b'[]', b'"x"', b'1', b'null'):
+            with self.subTest(body=body):
+                self.assertEqual(await self.post(router, body, self.secret), 400)
+
+    async def test_webhook_round_trip(self):
+        """Test that a signed update reaches the bot and an unsigned one is refused."""
+        router = TelegramWebhookRouter(
+            self.django_app, build_webhook_application(), path='/tg/hook',
+            secret_token=self.secret, webhook_url='https://example.com/tg/hook',
+        )
+        lifespan = ApplicationCommunicator(router, {'type': 'lifespan'})
+        await lifespan.send_input({'type': 'lifespan.startup'})
+        self.assertEqual((await lifespan.receive_output(10))['type'], 'lifespan.startup.complete')
+        try:
+            [webhook] = self.server.calls_to('setWebhook')
+            self.assertEqual(webhook['secret_token'], self.secret)
+
+            self.assertEqual(await self.post(router, message_update(settings.ADMIN_IDS[0], '/start'), 'wrong'), 403)
+            self.assertEqual(await self.post(router, message_update(settings.ADMIN_IDS[0], '/start'), self.secret), 200)
+            [reply] = await asyncio.to_thread(self.server.wait_for, 'sendMessage')
+            self.assertTrue(reply['text'].startswith('👋 Welcome'))
+        finally:
+            await lifespan.send_input({'type': 'lifespan.shutdown'})
+            self.assertEqual((await lifespan.receive_output(10))['type'], 'lifespan.shutdown.complete')
+        self.assertEqual(self.server.calls_to('deleteWebhook'), [])
+
+        # Everything else still reaches Django.
+        communicator = ApplicationCommunicator(router, {'type': 'http', 'method': 'GET', 'path': '/api/', 'headers': []})
+        await communicator.send_input({'type': 'http.request', 'body': b''})
+        self.assertEqual((await communicator.receive_output(5))['status'], 204)
+
+class VideoStreamTests(FakeTelegramMixin, TestCase):
+    content = bytes(range(256)) * 4
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir, ignore_errors=True)
+        override = override_settings(VIDEO_CACHE_DIR=cache_dir)
+        override.enable()
+        self.addCleanup(override.disable)
+        category = Category.objects.create(name="Stream")
+        self.video = Video.objects.create(title_lat="Hello", category=category, telegram_file_id="file_a")
+        self.server.add_file("file_a", self.content)
+        self.url = reverse('video-stream', args=[self.video.id])
+
+    def test_streams_and_caches_file(self):
+        """Test that the file is resolved and downloaded once, then served from disk."""
+        for _ in range(2):
+            response = self.client.get(self.url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(b''.join(response.streaming_content), self.content)
+            self.assertEqual(response['Content-Type'], 'video/mp4')
+            self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(len(self.server.calls_to('getFile')), 1)
+        self.assertEqual(len(self.server.calls_to('download')), 1)
+
+    def test_range_requests(self):
+        """Test partial content and unsatisfiable ranges."""
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.content)}')
+        self.assertEqual(b''.join(response.streaming_content), self.content[10:20])
+        response = self.client.get(self.url, HTTP_RANGE='bytes=5000-')
+        self.assertEqual(response.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+
+    def test_expired_file_path_is_resolved_again(self):
+        """Test that a download 404 refreshes the cached file_path once."""
+        stream.resolve_file_path("file_a")
+        self.server.files["file_a"]['file_path'] = 'videos/moved.mp4'
+        response = self.client.get(self.url)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(len(self.server.calls_to('getFile')), 2)
+
+    def test_missing_video_and_telegram_errors(self):
+        """Test 404 for unknown or unpublished videos and 502 when Telegram fails."""
+        self.assertEqual(self.client.get(reverse('video-stream', args=[self.video.id + 1])).status_code, 404)
+        other = Video.objects.create(title_lat="Gone", category=self.video.category, telegram_file_id="file_b")
+        with self.assertLogs('videos.views', 'WARNING'):
+            self.assertEqual(self.client.get(reverse('video-stream', args=[other.id])).status_code, 502)
+        other.is_published = False
+        other.save()
+        self.assertEqual(self.client.get(reverse('video-stream', args=[other.id])).status_code, 404)
+
+    def test_telegram_errors_do_not_leak_the_token(self):
+        """Test that a failed download answers a fixed message and logs the error with the token masked."""
+        token = settings.TELEGRAM_BOT_TOKEN
+        error = httpx.ConnectError(f"Connection refused: {stream._api_url()}/file/bot{token}/videos/a.mp4")
+        with patch.object(stream, '_fetch', side_effect=error), self.assertLogs('videos.views', 'WARNING') as logs:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_502_BAD_GATEWAY)
+        self.assertEqual(response.json(), {'detail': 'Video temporarily unavailable.'})
+        [message] = logs.output
+        self.assertIn('/file/bot<token>/videos/a.mp4', message)
+        self.assertNotIn(token, message)
+
+    def test_lru_eviction(self):
+        """Test that the least recently served files go first when the cache is full."""
+        Video.objects.create(title_lat="Two", category=self.video.category, telegram_file_id="file_b")
+        Video.objects.create(title_lat="Three", category=self.video.category, telegram_file_id="file_c")
+        for file_id in ("file_b", "file_c"):
+            self.server.add_file(file_id, self.content)
+        with override_settings(VIDEO_CACHE_MAX_BYTES=len(self.content) * 2):
+            first = stream.cached_video_path("file_a")
+            second = stream.cached_video_path("file_b")
+            # Serving file_a again makes file_b the least recently used.
+            os.utime(second, (time.time() - 60, second.stat().st_mtime))
+            stream.cached_video_path("file_a")
+            third = stream.cached_video_path("file_c")
+        self.assertTrue(first.exists())
+        self.assertFalse(second.exists())
+        self.assertTrue(third.exists())
+
+class BotPersistenceTests(FakeTelegramMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user_id = settings.ADMIN_IDS[0]
+
+    async def send(self, application, **kwargs):
+        await application.process_update(Update.de_json(message_update(self.user_id, **kwargs), application.bot))
+
+    async def test_flow_survives_restart(self):
+        """Test that a half-finished add-video flow resumes after a restart, written in one batch."""
+        application = BotCommand(stdout=StringIO()).build_application('123:test', updater=False)
+        await application.initialize()
+        await self.send(application, text='/addvideo')
+        await self.send(application, video='persist_1')
+        await self.send(application, text='Salom')
+        self.assertEqual(await BotState.objects.acount(), 0)
+        await application.shutdown()
+        self.assertEqual(application.persistence.writes, 1)
+        self.assertEqual(await BotState.objects.acount(), 2)
+
+        restarted = BotCommand(stdout=StringIO()).build_application('123:test', updater=False)
+        await restarted.initialize()
+        self.assertEqual(dict(restarted.user_data), {})
+        await self.send(restarted, text='Салом')
+        replies = self.server.calls_to('sendMessage')
+        self.assertTrue(replies[-1]['text'].startswith('3️⃣'))
+        self.assertEqual(restarted.user_data[self.user_id]['title_lat'], 'Salom')
+
+        await self.send(restarted, text='/cancel')
+        await restarted.shutdown()
+        self.assertEqual(await BotState.objects.acount(), 0)
+
+    async def press(self, application, data):
+        await application.process_update(Update.de_json(callback_update(self.user_id, data), application.bot))
+
+    async def test_category_picker_survives_restart(self):
+        """Test that a button pressed after a restart continues the flow instead of reporting it expired."""
+        category = await Category.objects.acreate(name="Persisted")
+        application = BotCommand(stdout=StringIO()).build_application('123:test', updater=False)
+        await application.initialize()
+        await self.send(application, text='/addvideo')
+        await self.send(application, video='persist_2')
+        for text in ('Salom', 'Салом', 'Привет', 'skip', 'skip', 'skip'):
+            await self.send(application, text=text)
+        await application.shutdown()
+
+        restarted = BotCommand(stdout=StringIO()).build_application('123:test', updater=False)
+        await restarted.initialize()
+        await self.press(restarted, f'cat_{category.id}')
+        [*_, confirmation] = self.server.calls_to('editMessageText')
+        self.assertTrue(confirmation['text'].endswith('Save this video?'))
+        self.assertNotIn('Session Expired', confirmation['text'])
+        await self.press(restarted, 'confirm_yes')
+        await restarted.shutdown()
+        video = await Video.objects.aget(telegram_file_id='persist_2')
+        self.assertEqual((video.title_ru, video.category_id), ('Привет', category.id))
+
+class BotConfirmSaveTests(FakeTelegramMixin, TransactionTestCase):
+    """Runs outside a test transaction: SQLite checks foreign keys at commit."""
+
+    async def test_category_deleted_elsewhere(self):
+        """Test that saving into a category deleted by another process says so, not that the video exists."""
+        user_id = settings.ADMIN_IDS[0]
+        category = await Category.objects.acreate(name="Doomed")
+        application = BotCommand(stdout=StringIO()).build_application(
+            '123:test', updater=False, persistence_interval=None, rate_limit=False,
+        )
+        await application.initialize()
+        try:
+            for kwargs in ({'text': '/addvideo'}, {'video': 'doomed_1'}, *({'text': 'skip'} for _ in range(6))):
+                await application.process_update(Update.de_json(message_update(user_id, **kwargs), application.bot))
+            for data in (f'cat_{category.id}', 'confirm_yes'):
+                if data == 'confirm_yes':
+                    # Another process: the categories cache is not told.
+                    await sync_to_async(Category.objects.filter(pk=category.id)._raw_delete)(DEFAULT_DB_ALIAS)
+                await application.process_update(Update.de_json(callback_update(user_id, data), application.bot))
+        finally:
+            await application.shutdown()
+        [*_, reply] = self.server.calls_to('editMessageText')
+        self.assertEqual(reply['text'], "❌ The selected category was deleted. Operation cancelled.")
+        self.assertFalse(await Video.objects.filter(telegram_file_id='doomed_1').aexists())
+        self.assertIsNone(await categories.aget(category.id))
+
+class BotBatchUploadTests(FakeTelegramMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user_id = settings.ADMIN_IDS[0]
+        Category.objects.create(name="Oila")
+        self.videos = [
+            {'file_id': f'album_{i}', 'file_name': f'{name}.mp4', 'message_id': 10 + i}
+            for i, name in enumerate(['ona', 'ota', 'uy'])
+        ]
+
+    async def test_album_and_sheet_saved_with_one_summary(self):
+        """Test that an album plus a CSV sheet is saved in one go with a single reply."""
+        bot = BotCommand(stdout=StringIO())
+        application = bot.build_application('123:test', updater=False, persistence_interval=None)
+        await application.initialize()
+
+        async def send(**kwargs):
+            await application.process_update(Update.de_json(message_update(self.user_id, **kwargs), application.bot))
+
+        await send(text='/batchvideos')
+        for video in self.videos:
+            await send(video=video, media_group_id='album')
+        sheet = (
+            "file_name,title_lat,title_kiril,description_lat,category\n"
+            "uy.mp4,Uy,Уй,Yashash joyi,Joy\n"
+            "ona.mp4,Ona,Она,,Oila\n"
+            "ota.mp4,Ota,Ота,,Oila\n"
+        ).encode('utf-8')
+        self.server.add_file('sheet_1', sheet, file_path='documents/sheet.csv')
+        before = len(self.server.calls_to('sendMessage'))
+        await send(document={'file_id': 'sheet_1', 'file_name': 'sheet.csv', 'file_size': len(sheet)})
+        await application.shutdown()
+
+        replies = self.server.calls_to('sendMessage')[before:]
+        self.assertTrue(replies[0]['text'].startswith('✅ Saved and published 3 videos in 2 categories.'))
+        self.assertEqual(len(replies), 2)  # the summary and the main menu
+        saved = {v.telegram_file_id: v async for v in Video.objects.select_related('category')}
+        self.assertEqual((saved['album_2'].title_lat, saved['album_2'].category.name), ('Uy', 'Joy'))
+        self.assertEqual(saved['album_0'].title_kiril, 'Она')
+        self.assertIn('ona', saved['album_0'].search_key)
+        self.assertEqual((saved['album_0'].file_unique_id, saved['album_0'].width), ('u_album_0', 640))
+
+    def test_invalid_sheet_saves_nothing(self):
+        """Test that any invalid row rejects the whole batch with every error listed."""
+        rows = parse_sheet(b'[{"index": 2, "title_lat": "Ota", "category": "Oila"},'
+                           b' {"index": 7, "title_lat": "X", "category": "Oila"},'
+                           b' {"title_lat": "", "category": "Oila"}]', 'sheet.json')
+        result = ingest_batch(self.videos, rows)
+        self.assertEqual(result['created'], 0)
+        self.assertEqual(result['errors'], [
+            'Row 2: there is no video #7 (received 3).',
+            'Row 3: title_lat is empty.',
+            'Video #1 (ona.mp4) has no row in the sheet.',
+        ])
+        self.assertFalse(Video.objects.exists())
+
+class VideoMetadataTests(FakeTelegramMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user_id = settings.ADMIN_IDS[0]
+        self.category = Category.objects.create(name="Meta")
+
+    async def test_duplicate_upload_rejected_before_fields(self):
+        """Test that a re-upload of a saved file is caught by file_unique_id right away."""
+        await Video.objects.acreate(
+            title_lat="Salom", category=self.category, telegram_file_id="old_id", file_unique_id="u_same",
+        )
+        bot = BotCommand(stdout=StringIO())
+        application = bot.build_application('123:test', updater=False, persistence_interval=None)
+        await application.initialize()
+
+        async def send(**kwargs):
+            await application.process_update(Update.de_json(message_update(self.user_id, **kwargs), application.bot))
+            return self.server.calls_to('sendMessage')[-1]['text']
+
+        await send(text='/addvideo')
+        reply = await send(video={'file_id': 'new_id', 'file_unique_id': 'u_same'})
+        self.assertIn('already in the dictionary as "Salom"', reply)
+        # Still waiting for a video.
+        reply = await send(video={'file_id': 'other_id', 'file_unique_id': 'u_other'})
+        self.assertTrue(reply.startswith('Video received.'))
+        await application.shutdown()
+
+    def test_metadata_in_api(self):
+        """Test that the list exposes the stored metadata."""
+        Video.objects.create(
+            title_lat="Hi", category=self.category, telegram_file_id="f1", file_unique_id="u1",
+            duration=4, width=720, height=1280, file_size=1234, mime_type="video/mp4", thumbnail_file_id="t1",
+        )
+        item = self.client.get(reverse('video-list')).json()['results'][0]
+        self.assertEqual(
+            {key: item[key] for key in ('file_unique_id', 'duration', 'width', 'height', 'file_size', 'thumbnail_file_id')},
+            {'file_unique_id': "u1", 'duration': 4, 'width': 720, 'height': 1280, 'file_size': 1234, 'thumbnail_file_id': "t1"},
+        )
+
+    def test_backfill_needs_a_chat(self):
+        """Test that backfill refuses to run without an explicit --chat-id."""
+        with self.assertRaisesMessage(CommandError, '--chat-id'):
+            call_command('backfill_video_metadata', stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(self.server.calls_to('sendVideo'), [])
+
+    def test_backfill_command(self):
+        """Test that backfill fills metadata via sendVideo, deletes the copies and skips duplicates."""
+        first = Video.objects.create(title_lat="A", category=self.category, telegram_file_id="fa")
+        second = Video.objects.create(title_lat="B", category=self.category, telegram_file_id="fb")
+        copy = Video.objects.create(title_lat="C", category=self.category, telegram_file_id="fc")
+        self.server.add_file("fa", b"x" * 10, duration=7, width=360, height=640, thumbnail_file_id="thumb_a")
+        self.server.add_file("fb", b"y" * 20)
+        self.server.add_file("fc", b"x" * 10, file_unique_id="u_fa")
+
+        out = StringIO()
+        call_command('backfill_video_metadata', chat_id=self.user_id, stdout=out, stderr=StringIO())
+        self.assertIn('Backfilled 2 of 3 videos; 1 failed.', out.getvalue())
+        first.refresh_from_db()
+        self.assertEqual(
+            (first.file_unique_id, first.duration, first.width, first.height, first.file_size, first.thumbnail_file_id),
+            ("u_fa", 7, 360, 640, 10, "thumb_a"),
+        )
+        self.assertEqual(Video.objects.get(pk=second.pk).file_size, 20)
+        self.assertIsNone(Video.objects.get(pk=copy.pk).file_unique_id)
+        self.assertEqual(len(self.server.calls_to('sendVideo')), 3)
+        self.assertEqual(len(self.server.calls_to('deleteMessage')), 3)
+
+class MetricsTests(FakeTelegramMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        category = Category.objects.create(name="Metrics")
+        Video.objects.create(title_lat="Salom", category=category, telegram_file_id="f1")
+
+    def test_server_timing_and_histograms(self):
+        """Test that a request gets a Server-Timing header and lands in /metrics."""
+        requests = REQUEST_DURATION.count('video-list')
+        response = self.client.get(reverse('video-list'))
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'^app;dur=[\d.]+, db;dur=[\d.]+;desc="\d+ queries", render;dur=[\d.]+$')
+        self.assertNotIn('desc="0 queries"', timing)
+        self.assertEqual(REQUEST_DURATION.count('video-list'), requests + 1)
+        self.assertEqual(DB_QUERIES.count('video-list'), requests + 1)
+
+        metrics = self.client.get('/metrics')
+        self.assertEqual(metrics['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        body = metrics.content.decode()
+        self.assertIn('# TYPE http_request_duration_seconds histogram', body)
+        self.assertIn('http_request_duration_seconds_bucket{view="video-list",le="+Inf"}', body)
+        self.assertIn('http_responses_total{view="video-list",status="2xx"}', body)
+        self.assertIn('http_response_size_bytes_count{view="video-list"}', body)
+
+    async def test_asgi_requests_run_without_adaptation(self):
+        """Test that under ASGI the middleware runs on the event loop and still measures queries and render."""
+        # Django logs "Asynchronous handler adapted for middleware ..." when
+        # it has to wrap one.
+        with self.assertNoLogs('django.request', 'DEBUG'):
+            ASGIHandler()
+
+        async def get_response(request):
+            pass
+
+        middleware = RequestMetricsMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+        self.assertTrue(iscoroutinefunction(middleware.process_template_response))
+        # The test database connection was opened before any middleware.
+        await sync_to_async(install_query_timing)()
+
+        requests = REQUEST_DURATION.count('category-list')
+        response = await self.async_client.get(reverse('category-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('desc="0 queries"', response['Server-Timing'])
+        self.assertNotIn('render;dur=0.0', response['Server-Timing'])
+        self.assertEqual(REQUEST_DURATION.count('category-list'), requests + 1)
+
+    @override_settings(METRICS_SAMPLE_RATE=0)
+    def test_unsampled_requests_are_not_measured(self):
+        """Test that requests outside the sample skip the instrumentation."""
+        requests = REQUEST_DURATION.count('video-list')
+        response = self.client.get(reverse('video-list'))
+        self.assertFalse(response.has_header('Server-Timing'))
+        self.assertEqual(REQUEST_DURATION.count('video-list'), requests)
+
+    async def test_bot_handlers_are_instrumented(self):
+        """Test that handler latency, DB queries, Bot API calls and errors are recorded by state."""
+        user_id = settings.ADMIN_IDS[0]
+        application = BotCommand(stdout=StringIO()).build_application(
+            '123:test', updater=False, persistence_interval=None, rate_limit=False,
+        )
+        await application.initialize()
+        runs = HANDLER_DURATION.count('list_videos', 'none')
+        sends = TELEGRAM_DURATION.count('sendMessage')
+        errors = HANDLER_ERRORS.value('receive_title_lat', 'TITLE_LAT')
+
+        await application.process_update(Update.de_json(message_update(user_id, '/listvideos'), application.bot))
+        self.assertEqual(HANDLER_DURATION.count('list_videos', 'none'), runs + 1)
+        self.assertEqual(HANDLER_DB_QUERIES.count('list_videos', 'none'), runs + 1)
+        self.assertEqual(TELEGRAM_DURATION.count('sendMessage'), sends + 1)
+
+        await application.process_update(Update.de_json(message_update(user_id, '/addvideo'), application.bot))
+        await application.process_update(Update.de_json(message_update(user_id, video='f2'), application.bot))
+        with patch.object(BotCommand, 'check_if_menu_command', side_effect=RuntimeError), \
+                self.assertLogs('telegram.ext', 'ERROR'):
+            await application.process_update(Update.de_json(message_update(user_id, 'Salom'), application.bot))
+        self.assertEqual(HANDLER_ERRORS.value('receive_title_lat', 'TITLE_LAT'), errors + 1)
+        await application.shutdown()
+
+class DatabaseSettingsTests(TestCase):
+    @skipIf(connection.vendor != 'sqlite' or not settings.SQLITE_TUNED, 'SQLite profile only')
+    def test_sqlite_profile(self):
+        """Test that SQLite connections get the tuned pragmas and write-locking transactions."""
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA cache_size')
+            self.assertEqual(cursor.fetchone()[0], -16000)
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 20000)
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
+
+    @skipIf(connection.vendor != 'sqlite', 'SQLite only')
+    def test_sqlite_wal(self):
+        """Test that SQLITE_WAL's pragmas switch a database file to WAL."""
+        # A file database of its own: WAL is opt-in and needs a file.
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir, ignore_errors=True)
+        options = {**settings.SQLITE_TUNED_OPTIONS}
+        options['init_command'] = settings.SQLITE_WAL_INIT_COMMAND + options['init_command']
+        wal = type(connections['default'])(
+            {**connection.settings_dict, 'NAME': os.path.join(tmp_dir, 'wal.sqlite3'), 'OPTIONS': options},
+            alias='wal',
+        )
+        try:
+            with wal.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode')
+                self.assertEqual(cursor.fetchone()[0], 'wal')
+                cursor.execute('PRAGMA synchronous')
+                self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+        finally:
+            wal.close()
+
+    def test_pool_stats_in_metrics(self):
+        """Test that connection pool statistics are exported with /metrics."""
+        class Pool:
+            def get_stats(self):
+                return {'pool_size': 3, 'pool_available': 1, 'requests_num': 40, 'requests_wait_ms': 1500}
+
+        with patch.object(connection, 'pool', Pool(), create=True):
+            body = self.client.get('/metrics').content.decode()
+        self.assertIn('db_pool_size{alias="default"} 3', body)
+        self.assertIn('db_pool_requests_total{alias="default"} 40', body)
+        self.assertIn('db_pool_wait_seconds_total{alias="default"} 1.5', body)
+        self.assertIn('db_pool_request_errors_total{alias="default"} 0', body)
+
+class BotConcurrencyTests(SimpleTestCase):
+    async def test_updates_run_concurrently_but_in_order_per_user(self):
+        """Test that one user's slow update delays only that user's next update."""
+        processor = PerUserUpdateProcessor(8)
+        log = []
+
+        async def handle(name, delay):
+            log.append(f'{name} start')
+            await asyncio.sleep(delay)
+            log.append(f'{name} end')
+
+        updates = [
+            (Update.de_json(message_update(1, 'a1'), None), handle('a1', 0.05)),
+            (Update.de_json(message_update(1, 'a2'), None), handle('a2', 0)),
+            (Update.de_json(message_update(2, 'b1'), None), handle('b1', 0)),
+        ]
+        await asyncio.gather(*(processor.process_update(u, c) for u, c in updates))
+        self.assertLess(log.index('b1 end'), log.index('a1 end'))
+        self.assertLess(log.index('a1 end'), log.index('a2 start'))
+        self.assertEqual(processor.stats()['users_busy'], 0)
+
+    async def test_rate_limiter_spaces_and_coalesces(self):
+        """Test per-chat spacing, edit coalescing and 429 retries."""
+        limiter = TelegramRateLimiter(private_rate=20, private_burst=1)
+        sent = []
+
+        async def call(name):
+            sent.append(name)
+            return name
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await asyncio.gather(*(
+            limiter.process_request(call, (f'm{i}',), {}, 'sendMessage', {'chat_id': 5}, None)
+            for i in range(3)
+        ))
+        self.assertGreaterEqual(loop.time() - started, 0.09)
+        self.assertEqual(sent, ['m0', 'm1', 'm2'])
+
+        edit = {'chat_id': 5, 'message_id': 9}
+        results = await asyncio.gather(*(
+            limiter.process_request(call, (f'e{i}',), {}, 'editMessageText', edit, None)
+            for i in range(4)
+        ))
+        # All four queue behind the earlier messages; only the last is sent.
+        self.assertEqual(sent[3:], ['e3'])
+        self.assertEqual(results, ['e3'] * 4)
+
+        attempts = []
+
+        async def flooded():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise RetryAfter(0)
+            return True
+
+        self.assertTrue(await limiter.process_request(flooded, (), {}, 'sendMessage', {'chat_id': 6}, None))
+        stats = limiter.stats()
+        self.assertEqual((stats['sent'], stats['coalesced'], stats['retries'], stats['queued']), (5, 3, 1, 0))
+        self.assertGreater(stats['wait_max_ms'], 0)
@@ -0,0 +1,71 @@
+"""
+Concurrent update processing for the admin bot, in order per user.
+
+Conversation state is per user, so two updates from one admin must not
+interleave: the second could run against the state from before the first.
+Updates from different admins run concurrently, up to the Application's
+limit.
+"""
+import asyncio
+
+from telegram.ext import BaseUpdateProcessor
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    def __init__(self, max_concurrent_updates):
+        super().__init__(max_concurrent_updates)
+        # key -> [lock, updates holding or waiting for it]
+        self._locks = {}
+        self.waits = 0
+        self.wait_total = self.wait_max = 0.0
+
+    @staticmethod
+    def ordering_key(update):
+        user = getattr(update, 'effective_user', None)
+        if user is not None:
+            return ('user', user.id)
+        chat = getattr(update, 'effective_chat', None)
+        if chat is not None:
+            return ('chat', chat.id)
+        return None
+
+    async def process_update(self, update, coroutine):
+        key = self.ordering_key(update)
+        if key is None:
+            return await super().process_update(update, coroutine)
+        entry = self._locks.setdefault(key, [asyncio.Lock(), 0])
+        entry[1] += 1
+        arrived = asyncio.get_running_loop().time()
+        try:
+            # Take the user's turn before a concurrency slot, so a backlog
+            # from one user doesn't hold slots other users could use.
+            async with entry[0]:
+                self._record_wait(asyncio.get_running_loop().time() - arrived)
+                await super().process_update(update, coroutine)
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[key]
+
+    async def do_process_update(self, update, coroutine):
+        await coroutine
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def _record_wait(self, seconds):
+        self.waits += 1
+        self.wait_total += seconds
+        self.wait_max = max(self.wait_max, seconds)
+
+    def stats(self):
+        return {
+            'in_progress': self.current_concurrent_updates,
+            'users_busy': len(self._locks),
+            'queued': sum(count for _, count in self._locks.values()) - len(self._locks),
+            'wait_mean_ms': self.wait_total / max(self.waits, 1) * 1000,
+            'wait_max_ms': self.wait_max * 1000,
+        }
@@ -1,6 +1,20 @@
+from django.conf import settings
 from django.urls import path
-from .views import VideoListView
+from .views import (
+    CategoryListView, CategoryVideoListView, SnapshotLatestView, SyncView, VideoExportView,
+    VideoListAsyncView, VideoListView, VideoSearchView, VideoStreamView,
+)
+
+# Under an ASGI server the list, the busiest endpoint, runs without a thread hop.
+video_list = VideoListAsyncView if settings.SERVER_MODE == 'asgi' else VideoListView
 
 urlpatterns = [
-    path('videos/', VideoListView.as_view(), name='video-list'),
+    path('videos/', video_list.as_view(), name='video-list'),
+    path('videos/search', VideoSearchView.as_view(), name='video-search'),
+    path('videos/export.ndjson', VideoExportView.as_view(), name='video-export'),
+    path('videos/<int:pk>/stream', VideoStreamView.as_view(), name='video-stream'),
+    path('categories/', CategoryListView.as_view(), name='category-list'),
+    path('categories/<int:pk>/videos/', CategoryVideoListView.as_view(), name='category-videos'),
+    path('sync', SyncView.as_view(), name='sync'),
+    path('snapshot/latest', SnapshotLatestView.as_view(), name='snapshot-latest'),
 ]
@@ -1,7 +1,324 @@
+import logging
+import time
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.dateparse import parse_datetime
+from django.utils import timezone
+from django.utils.http import http_date, quote_etag
+from django.views import View
 from rest_framework import generics
-from .models import Video
-from .serializers import VideoSerializer
+from whitenoise.responders import StaticFile
+from rest_framework.exceptions import APIException, NotFound, ValidationError
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.pagination import _positive_int
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.versioning import QueryParameterVersioning
+from rest_framework.views import APIView
+from ishoratech_backend.middleware import note_render
+from .cache import PAYLOAD_TIMEOUT, CachedResponseMixin, aget_version, categories, response_cache_key
+from .export import accepts_gzip, aiter_chunks, export_rows, gzip_chunks, iter_ndjson
+from .models import Category, Video
+from .pagination import VideoCursorPagination
+from .renderers import video_list_renderers
+from .search import search_video_ids
+from .serializers import (
+    VIDEO_VALUES_FIELDS, CategorySerializer, VideoSerializer, select_video_fields, serialize_video_values,
+    serialize_video_values_compact,
+)
+from .snapshot import SnapshotWhiteNoiseMiddleware, is_stale, read_pointer, schedule_rebuild
+from .stream import VIDEO_CONTENT_TYPE, TelegramFileError, cached_video_path
+from .sync import InvalidToken, decode_token, encode_token, get_changes
+
+logger = logging.getLogger(__name__)
+
+def filter_by_category(queryset, category):
+    """Apply the ?category=<id> filter of the video lists."""
+    if not category:
+        return queryset
+    try:
+        category_id = int(category)
+    except ValueError:
+        raise ValidationError({'category': 'Expected a category id.'})
+    return queryset.filter(category_id=category_id)
+
+class VideoListVersioning(QueryParameterVersioning):
+    """?version=2 selects the compact list shape; see serialize_video_values_compact()."""
+    default_version = '1'
+    allowed_versions = ('1', '2')
+
+def project_video_list(queryset, params, version):
+    """
+    Select only the columns a list request needs (?lang=, ?fields=, plus the
+    pagination keys). Returns the values() queryset and the function that
+    turns a page of its rows into the response shape for `version`.
+    """
+    fields = select_video_fields(params)
+    columns = ['id', 'created_at', *fields]
+    if version == '2':
+        if 'category__name' in fields:
+            columns.append('category_id')
+        return queryset.values(*columns), partial(serialize_video_values_compact, fields=fields)
+    return queryset.values(*columns), partial(serialize_video_values, fields=fields)
 
-class VideoListView(generics.ListAPIView):
-    queryset = Video.objects.filter(is_published=True).order_by('-created_at')
+class VideoListView(CachedResponseMixin, generics.ListAPIView):
+    queryset = Video.objects.filter(is_published=True).select_related('category').order_by('-created_at', '-id')
     serializer_class = VideoSerializer
+    pagination_class = VideoCursorPagination
+    versioning_class = VideoListVersioning
+    renderer_classes = video_list_renderers()
+    cacheable_formats = ('json', 'msgpack')
+
+    def filter_queryset(self, queryset):
+        return filter_by_category(queryset, self.request.query_params.get('category'))
+
+    def list(self, request, *args, **kwargs):
+        # Fast path: project only the requested columns (plus the pagination
+        # keys) and map them straight to the response shape, skipping model
+        # instances and serializer fields entirely.
+        queryset, serialize = project_video_list(
+            self.filter_queryset(self.get_queryset()), request.query_params, request.version,
+        )
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(serialize(page))
+        return Response(serialize(list(queryset)))
+
+class VideoListAsyncView(View):
+    """
+    VideoListView as a native async view, routed in its place when
+    SERVER_MODE is 'asgi' (see gunicorn.conf.py).
+
+    Cache reads and queries are awaited, so one worker's event loop keeps
+    accepting requests while they are in flight. It takes the same query
+    parameters and Accept header, and shares VideoListView's cache entries
+    and ETags. Only the cacheable formats are offered: the browsable API
+    needs a DRF view, so browsers get JSON.
+    """
+    http_method_names = ['get', 'head', 'options']
+    queryset = VideoListView.queryset
+    pagination_class = VideoCursorPagination
+    versioning_class = VideoListVersioning
+    renderer_classes = [r for r in VideoListView.renderer_classes if r.format in VideoListView.cacheable_formats]
+    content_negotiation_class = DefaultContentNegotiation
+
+    async def get(self, request, *args, **kwargs):
+        # The pagination class reads DRF's query_params.
+        api_request = Request(request)
+        try:
+            renderer, media_type = self.content_negotiation_class().select_renderer(
+                api_request, [renderer_class() for renderer_class in self.renderer_classes],
+            )
+        except Http404 as e:
+            # An unknown ?format=
+            return JsonResponse({'detail': str(e)}, status=404)
+        except APIException as e:
+            return JsonResponse({'detail': e.detail}, status=e.status_code)
+        version = await aget_version()
+        key = response_cache_key(request, media_type, version)
+        etag = quote_etag(key.rsplit(':', 1)[-1])
+        last_modified = version // 10 ** 9
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            cached = await cache.aget(key)
+            if cached is not None:
+                content, content_type = cached
+                response = HttpResponse(content, content_type=content_type)
+            else:
+                try:
+                    response = await self.render_page(api_request, renderer, media_type)
+                except APIException as e:
+                    return JsonResponse({'detail': e.detail}, status=e.status_code)
+                await cache.aset(key, (response.content, response['Content-Type']), PAYLOAD_TIMEOUT)
+
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        patch_vary_headers(response, ['Accept'])
+        return response
+
+    async def render_page(self, request, renderer, media_type):
+        queryset, serialize = project_video_list(
+            filter_by_category(self.queryset, request.query_params.get('category')),
+            request.query_params,
+            self.versioning_class().determine_version(request),
+        )
+        paginator = self.pagination_class()
+        page = await paginator.apaginate_queryset(queryset, request)
+        data = paginator.get_paginated_data(serialize(page))
+        started = time.perf_counter()
+        content = renderer.render(data, media_type)
+        note_render(request, time.perf_counter() - started)
+        return HttpResponse(content, content_type=renderer.media_type)
+
+class CategoryListView(CachedResponseMixin, generics.ListAPIView):
+    """Every category with its number of published videos, by name."""
+    # Names are unique, so the name index gives the order without a sort.
+    queryset = Category.objects.order_by('name')
+    serializer_class = CategorySerializer
+    pagination_class = None
+
+    def list(self, request, *args, **kwargs):
+        # A count per category from the partial index on (category, ...)
+        # for published rows, instead of a join that reads every video row
+        # to check is_published.
+        published = (
+            Video.objects.filter(category=OuterRef('pk'), is_published=True)
+            .order_by().values('category').annotate(count=Count('*')).values('count')
+        )
+        rows = self.get_queryset().annotate(
+            video_count=Coalesce(Subquery(published), 0),
+        ).values('id', 'name', 'video_count')
+        return Response({'results': self.get_serializer(rows, many=True).data})
+
+class CategoryVideoListView(VideoListView):
+    """The published videos of one category, paged like VideoListView."""
+
+    def filter_queryset(self, queryset):
+        # The in-process category cache answers without a query; it can be
+        # behind a category another process just created, so a miss is
+        # checked against the database.
+        pk = self.kwargs['pk']
+        if categories.get(pk) is None and not Category.objects.filter(pk=pk).exists():
+            raise NotFound('No such category.')
+        return queryset.filter(category_id=self.kwargs['pk'])
+
+class VideoSearchView(CachedResponseMixin, generics.ListAPIView):
+    queryset = Video.objects.filter(is_published=True)
+    serializer_class = VideoSerializer
+    default_limit = 20
+    max_limit = 100
+
+    def list(self, request, *args, **kwargs):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            raise ValidationError({'q': 'This query parameter is required.'})
+        try:
+            limit = _positive_int(request.query_params['limit'], strict=True, cutoff=self.max_limit)
+        except (KeyError, ValueError):
+            limit = self.default_limit
+
+        ids = search_video_ids(query, limit)
+        rows = self.get_queryset().filter(id__in=ids).values('id', *VIDEO_VALUES_FIELDS)
+        rows_by_id = {row['id']: row for row in rows}
+        ranked = [rows_by_id[pk] for pk in ids if pk in rows_by_id]
+        return Response({'results': serialize_video_values(ranked)})
+
+class SyncView(CachedResponseMixin, generics.ListAPIView):
+    queryset = Video.objects.all()
+    serializer_class = VideoSerializer
+    default_limit = 500
+    max_limit = 1000
+
+    def list(self, request, *args, **kwargs):
+        since = request.query_params.get('since')
+        try:
+            position = decode_token(since) if since else None
+        except InvalidToken:
+            raise ValidationError({'since': 'Invalid sync token.'})
+        try:
+            limit = _positive_int(request.query_params['limit'], strict=True, cutoff=self.max_limit)
+        except (KeyError, ValueError):
+            limit = self.default_limit
+
+        upserts, deletes, position, has_more = get_changes(position, limit)
+        return Response({
+            'upserts': upserts,
+            'deletes': deletes,
+            'next': encode_token(position) if position else since,
+            'has_more': has_more,
+        })
+
+class VideoExportView(APIView):
+    """
+    Every published video as NDJSON, streamed; see videos/export.py.
+
+    `since` (an ISO 8601 timestamp) limits the export to videos changed after
+    it. Deletions are not reported here; clients that need them use /api/sync.
+    """
+    def get(self, request, *args, **kwargs):
+        since = request.query_params.get('since')
+        if since:
+            since = parse_datetime(since)
+            if since is None:
+                raise ValidationError({'since': 'Expected an ISO 8601 timestamp.'})
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since)
+
+        chunks = iter_ndjson(export_rows(since or None))
+        compress = accepts_gzip(request.headers.get('Accept-Encoding', ''))
+        if compress:
+            chunks = gzip_chunks(chunks)
+        if isinstance(request._request, ASGIRequest):
+            chunks = aiter_chunks(chunks)
+
+        response = StreamingHttpResponse(chunks, content_type='application/x-ndjson; charset=utf-8')
+        if compress:
+            response['Content-Encoding'] = 'gzip'
+        patch_vary_headers(response, ['Accept-Encoding'])
+        response['Content-Disposition'] = 'inline; filename="videos.ndjson"'
+        return response
+
+class VideoStreamView(View):
+    """
+    The bytes of a published video, proxied from Telegram through the disk
+    cache in videos/stream.py.
+
+    WhiteNoise's file responder answers Range, HEAD and conditional requests.
+    Whole files go out through the server's sendfile; a plain Django View
+    keeps DRF's content negotiation from rejecting Accept: video/*.
+    """
+    http_method_names = ['get', 'head', 'options']
+
+    def get(self, request, pk):
+        row = (
+            Video.objects.filter(pk=pk, is_published=True)
+            .values_list('telegram_file_id', 'mime_type').first()
+        )
+        if row is None:
+            return JsonResponse({'detail': 'No such video.'}, status=404)
+        file_id, mime_type = row
+        try:
+            path = cached_video_path(file_id)
+        except TelegramFileError as e:
+            # The cause stays in the log; clients get no details of the Bot API.
+            logger.warning('Fetching video %s from Telegram failed: %s', pk, e)
+            return JsonResponse({'detail': 'Video temporarily unavailable.'}, status=502)
+
+        static_file = StaticFile(str(path), [
+            ('Content-Type', mime_type or VIDEO_CONTENT_TYPE),
+            ('Accept-Ranges', 'bytes'),
+            ('Cache-Control', 'public, max-age=86400'),
+        ])
+        response = SnapshotWhiteNoiseMiddleware.serve(static_file, request)
+        if isinstance(request, ASGIRequest) and response.streaming:
+            # Django would read a sync file iterator to the end before sending.
+            response.streaming_content = aiter_chunks(iter(response.streaming_content))
+        return response
+
+class SnapshotLatestView(APIView):
+    """
+    Where to download the current dictionary snapshot. A snapshot older than
+    the data is still answered while its replacement builds in the background.
+    """
+    def get(self, request, *args, **kwargs):
+        pointer = read_pointer()
+        if is_stale(pointer):
+            schedule_rebuild()
+        if pointer is None:
+            raise NotFound('No snapshot has been built yet; try again shortly.')
+        return Response({
+            'hash': pointer['hash'],
+            'url': request.build_absolute_uri(f"{settings.STATIC_URL}{pointer['path']}"),
+            'size': pointer['size'],
+            'videos': pointer['videos'],
+            'generated_at': pointer['generated_at'],
+        }, headers={'Cache-Control': 'no-cache'})
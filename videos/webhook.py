@@ -0,0 +1,118 @@
+"""
+ASGI routing for Telegram webhook mode.
+
+TelegramWebhookRouter wraps the Django ASGI application. It takes POSTs on
+the webhook path, checks Telegram's secret-token header, and queues the
+update on the bot Application. Everything else goes to Django. The bot is
+started from the ASGI lifespan startup event, or lazily on the first update
+when the server does not send lifespan events.
+"""
+import asyncio
+import hmac
+import json
+import logging
+
+from telegram import Update
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = b'x-telegram-bot-api-secret-token'
+MAX_UPDATE_SIZE = 1 << 20
+
+
+class TelegramWebhookRouter:
+    def __init__(self, django_app, bot_application, path, secret_token, webhook_url=None):
+        self.django_app = django_app
+        self.bot_application = bot_application
+        self.path = path
+        self.secret_token = secret_token
+        self.webhook_url = webhook_url
+        self._started = False
+        self._start_lock = asyncio.Lock()
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] == 'http' and scope['path'] == self.path:
+            return await self.handle_update(scope, receive, send)
+        return await self.django_app(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    await self.start()
+                except Exception as e:
+                    logger.exception("Bot startup failed")
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.stop()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def start(self):
+        async with self._start_lock:
+            if self._started:
+                return
+            await self.bot_application.initialize()
+            await self.bot_application.start()
+            if self.webhook_url:
+                await self.bot_application.bot.set_webhook(
+                    self.webhook_url,
+                    secret_token=self.secret_token,
+                    allowed_updates=Update.ALL_TYPES,
+                )
+            self._started = True
+
+    async def stop(self):
+        # The webhook stays registered: Telegram keeps retrying deliveries
+        # while the process restarts.
+        async with self._start_lock:
+            if not self._started:
+                return
+            await self.bot_application.stop()
+            await self.bot_application.shutdown()
+            self._started = False
+
+    async def handle_update(self, scope, receive, send):
+        if scope['method'] != 'POST':
+            return await self.respond(send, 405)
+        headers = dict(scope['headers'])
+        # Bytes: compare_digest() raises on a str with non-ASCII characters.
+        if not hmac.compare_digest(headers.get(SECRET_HEADER, b''), self.secret_token.encode()):
+            return await self.respond(send, 403)
+
+        body = b''
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get('body', b'')
+            more_body = message.get('more_body', False)
+            if len(body) > MAX_UPDATE_SIZE:
+                return await self.respond(send, 413)
+
+        try:
+            data = json.loads(body)
+        except ValueError:
+            return await self.respond(send, 400)
+        if not isinstance(data, dict):
+            # Update.de_json() only takes an object.
+            return await self.respond(send, 400)
+
+        await self.start()
+        update = Update.de_json(data, self.bot_application.bot)
+        # Handlers run on the Application's own update fetcher; answer
+        # Telegram right away so slow handlers never trigger redelivery.
+        await self.bot_application.update_queue.put(update)
+        await self.respond(send, 200)
+
+    async def respond(self, send, status):
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', b'text/plain'), (b'content-length', b'0')],
+        })
+        await send({'type': 'http.response.body', 'body': b''})